@@ -0,0 +1,72 @@
+"""
+Micro-benchmark for decoding Sonar responses
+
+Compares the former dumps/loads round trip through from_json against the
+schema-directed decode on synthetic branch and project payloads.
+
+    python -m benchmarks.decoder --items 5000 --repeat 5
+"""
+import argparse
+import json
+import timeit
+
+from lib.response import Branch, Component
+from lib.utils import decode, from_json
+
+# Items as returned by the project search and the branch list
+COMPONENT_PAYLOAD = {
+    'organization': 'my-org',
+    'key': 'my-org_project',
+    'name': 'project',
+    'qualifier': 'TRK',
+    'visibility': 'private',
+    'lastAnalysisDate': '2022-10-10T22:31:50+0200',
+    'revision': 'c658d235b686d8e5b67d7991006ff8f874cb8e7e'
+}
+BRANCH_PAYLOAD = {
+    'name': 'main',
+    'isMain': True,
+    'type': 'LONG',
+    'status': {
+        'bugs': 0,
+        'vulnerabilities': 0,
+        'codeSmells': 0
+    },
+    'analysisDate': '2022-10-10T22:31:50+0200',
+    'commit': {
+        'sha': 'c658d235b686d8e5b67d7991006ff8f874cb8e7e',
+        'author': {
+            'name': 'Name', 'login': 'name@github', 'avatar': 'fb1a30fc483b5001f294c686f70d460c'
+        },
+        'date': '2022-10-10T20:51:08+0200',
+        'message': 'build: Add Pylint pre-commit'
+    }
+}
+
+
+def round_trip(payload):
+    """ Former decoding path """
+    return json.loads(json.dumps(payload), object_hook=from_json)
+
+
+def main():
+    """ Entry Point """
+    parser = argparse.ArgumentParser(description='Benchmark the response decoders')
+    parser.add_argument('--items', dest='items', action='store', type=int, default=5000)
+    parser.add_argument('--repeat', dest='repeat', action='store', type=int, default=5)
+    args = parser.parse_args()
+
+    cases = {
+        'branches': ([BRANCH_PAYLOAD] * args.items, Branch),
+        'projects': ([COMPONENT_PAYLOAD] * args.items, Component),
+    }
+
+    for name, (payload, schema) in cases.items():
+        legacy = min(timeit.repeat(lambda: round_trip(payload), number=1, repeat=args.repeat))
+        direct = min(timeit.repeat(lambda: decode(payload, schema), number=1, repeat=args.repeat))
+        print(f'{name:<10} items={args.items} from_json={legacy * 1000:.2f}ms '
+              f'decode={direct * 1000:.2f}ms speedup={legacy / direct:.1f}x')
+
+
+if __name__ == "__main__":
+    main()
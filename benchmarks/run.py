@@ -0,0 +1,157 @@
+"""
+End-to-end benchmark against a local stand-in Sonar server
+
+Serves a synthetic organization, runs the same audit and remediation as main()
+and writes throughput, peak memory and request counts to a JSON file so runs of
+different commits can be compared.
+
+    python -m benchmarks.run --projects 1000 --branches 5 --workers 8 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from argparse import Namespace
+
+from lib.async_handler import AsyncSonarHandler
+from lib.audit import audit_projects_async, set_main_branch_async
+from lib.runner import audit_organization
+from lib.tests.stub_server import StubSonarServer
+
+CLIENTS = ('sync', 'async')
+
+
+def revision() -> str:
+    """ Commit being benchmarked """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_sync(settings: Namespace) -> dict:
+    """ Audit through SonarHandler, exactly as main() does """
+    return audit_organization(settings)
+
+
+def run_async(settings: Namespace) -> dict:
+    """ Audit through AsyncSonarHandler """
+    async def run():
+        report = {'audited': 0, 'compliant': 0, 'non_compliant': 0, 'failed': 0}
+        async with AsyncSonarHandler(settings) as handler:
+            async for result in audit_projects_async(handler.iter_projects(), handler):
+                report['audited'] += 1
+                if result.failed:
+                    report['failed'] += 1
+                elif result.compliant:
+                    report['compliant'] += 1
+                else:
+                    report['non_compliant'] += 1
+                    if not settings.dry_run:
+                        await set_main_branch_async(result.rule, handler)
+        return report
+
+    return asyncio.run(run())
+
+
+def benchmark(args: Namespace) -> dict:
+    """ Run a single scenario """
+    stub = StubSonarServer(projects=args.projects, branches=args.branches,
+                           latency=args.latency, error_rate=args.error_rate,
+                           throttle_rate=args.throttle_rate, page_size=args.page_size)
+    settings = Namespace(platform='sonarqube', host='127.0.0.1', port=None,
+                         workers=args.workers, concurrency=args.workers, dry_run=args.dry_run,
+                         rate_limit=0, prefetch_pages=args.prefetch_pages,
+                         record=args.record, replay=args.replay)
+
+    with stub:
+        settings.port = stub.port
+        if args.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        report = (run_async if args.client == 'async' else run_sync)(settings)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+        if args.trace_memory:
+            tracemalloc.stop()
+
+    return {
+        'revision': revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': sys.version.split()[0],
+        'scenario': {
+            'client': args.client,
+            'projects': args.projects,
+            'branches': args.branches,
+            'workers': args.workers,
+            'latency': args.latency,
+            'error_rate': args.error_rate,
+            'throttle_rate': args.throttle_rate,
+            'page_size': args.page_size,
+            'prefetch_pages': args.prefetch_pages,
+            'dry_run': args.dry_run,
+            'cassette': 'replay' if args.replay else 'record' if args.record else None,
+        },
+        'results': {
+            'elapsed': round(elapsed, 4),
+            'projects_per_second': round(report['audited'] / elapsed, 2) if elapsed else None,
+            'audited': report['audited'],
+            'non_compliant': report['non_compliant'],
+            'failed': report['failed'],
+            'requests': dict(stub.requests),
+            'total_requests': sum(stub.requests.values()),
+            'traced_peak_bytes': peak,
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        },
+    }
+
+
+def main():
+    """ Entry Point """
+    parser = argparse.ArgumentParser(description='Benchmark the audit against a local Sonar stub')
+    parser.add_argument('--client', dest='client', action='store', default='sync', choices=CLIENTS)
+    parser.add_argument('--projects', dest='projects', action='store', type=int, default=100)
+    parser.add_argument('--branches', dest='branches', action='store', type=int, default=3)
+    parser.add_argument('--workers', dest='workers', action='store', type=int, default=8)
+    parser.add_argument('--latency', dest='latency', action='store', type=float, default=0.0,
+                        help='Seconds added to every response')
+    parser.add_argument('--error-rate', dest='error_rate', action='store', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', dest='throttle_rate', action='store', type=float,
+                        default=0.0)
+    parser.add_argument('--page-size', dest='page_size', action='store', type=int, default=500)
+    parser.add_argument('--prefetch-pages', dest='prefetch_pages', action='store', type=int,
+                        default=0, help='Pages of the project search fetched concurrently')
+    parser.add_argument('--dry-run', dest='dry_run', action='store_true')
+    parser.add_argument('--record', dest='record', action='store',
+                        help='Cassette file where the responses of the sync client are recorded')
+    parser.add_argument('--replay', dest='replay', action='store',
+                        help='Cassette file answering the calls of the sync client')
+    parser.add_argument('--trace-memory', dest='trace_memory', action='store_true',
+                        help='Measure the peak of Python allocations, slowing the run down')
+    parser.add_argument('--output', dest='output', action='store', default='bench_output.json',
+                        help='JSON file the result is appended to')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    result = benchmark(args)
+
+    results = []
+    if os.path.exists(args.output):
+        with open(args.output, encoding='utf-8') as file:
+            results = json.load(file)
+    results.append(result)
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+
+    print(json.dumps(result['results'], indent=2))
+
+
+if __name__ == "__main__":
+    main()
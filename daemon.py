@@ -0,0 +1,87 @@
+"""
+Sonar Webhook Daemon
+
+Keeps an authenticated connection with Sonar and audits a project each time one of
+its analyses completes, instead of scanning the whole organization on a schedule.
+Point a Sonar webhook to http://<host>:<port>/webhook
+"""
+import argparse
+import logging
+import os
+import signal
+
+from lib.audit import DEFAULT_WORKERS
+from lib.handler import SonarHandler
+from lib.ratelimit import DEFAULT_RATE, DEFAULT_RETRIES
+from lib.rules import RULES, MainBranchRule, RuleEngine
+from lib.webhook import DEFAULT_DEBOUNCE, DEFAULT_WEBHOOK_PORT, WebhookServer
+from main import SONAR_PLATFORMS, setup_logger, validate
+
+
+def terminate(*_):
+    """ Stop on SIGTERM as on Ctrl+C """
+    raise KeyboardInterrupt
+
+
+def main():
+    """ Entry Point """
+    parser = argparse.ArgumentParser(description='Audit Sonar projects as their analyses complete')
+    parser.add_argument('--platform', dest='platform', action='store', default='sonarcloud',
+                        choices=SONAR_PLATFORMS)
+    parser.add_argument('--organization', dest='organization', action='store', nargs=1)
+    parser.add_argument('--workers', dest='workers', action='store', type=int,
+                        default=DEFAULT_WORKERS, help='Number of projects audited concurrently')
+    parser.add_argument('--rules', dest='rules', action='store', nargs='+',
+                        default=[MainBranchRule.name], choices=sorted(RULES),
+                        help='Compliance rules evaluated over every project')
+    parser.add_argument('--dry-run', dest='dry_run', action='store_true',
+                        help='Log the remediation without applying it')
+    parser.add_argument('--rate-limit', dest='rate_limit', action='store', type=float,
+                        default=DEFAULT_RATE, help='Maximum requests per second, 0 to disable')
+    parser.add_argument('--retries', dest='retries', action='store', type=int,
+                        default=DEFAULT_RETRIES, help='Retries of throttled or failed requests')
+    parser.add_argument('--cache', dest='cache', action='store_true',
+                        help='Cache the responses of read endpoints')
+    parser.add_argument('--bind', dest='bind', action='store', default='127.0.0.1',
+                        help='Interface the webhook endpoint listens on')
+    parser.add_argument('--listen-port', dest='listen_port', action='store', type=int,
+                        default=DEFAULT_WEBHOOK_PORT)
+    parser.add_argument('--debounce', dest='debounce', action='store', type=float,
+                        default=DEFAULT_DEBOUNCE,
+                        help='Seconds without webhooks for a project before auditing it')
+    parser.add_argument('--secret-env', dest='secret_env', action='store',
+                        default='SONAR_WEBHOOK_SECRET',
+                        help='Environment variable holding the webhook secret')
+    args = parser.parse_args()
+
+    # Start Loggers
+    setup_logger()
+
+    # Validate inputs
+    validate(args)
+
+    with SonarHandler(args) as sonar:
+        if not sonar.authenticated:
+            logging.warning('Authentication is not set')
+            return
+
+        secret = os.environ.get(args.secret_env)
+        if not secret:
+            logging.warning("%s is not set, webhooks are not authenticated", args.secret_env)
+
+        server = WebhookServer(sonar, RuleEngine(sonar, args.rules), args.bind, args.listen_port,
+                               secret, args.debounce, args.workers, args.dry_run)
+        signal.signal(signal.SIGTERM, terminate)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logging.info("Shutting down, letting the running audits finish")
+        finally:
+            server.stop()
+
+    # Happy ending
+    logging.info("Finish")
+
+
+if __name__ == "__main__":
+    main()
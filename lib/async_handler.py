@@ -0,0 +1,264 @@
+""" Asynchronous Sonar Handler """
+import asyncio
+import json
+import logging
+import os
+from argparse import Namespace
+
+import aiohttp
+from sonarqube.utils.exceptions import (AuthError, ClientError, NotFoundError, ServerError,
+                                        ValidationError)
+
+from lib.handler import SonarException
+from lib.metrics import Metrics
+from lib.ratelimit import DEFAULT_RETRIES, backoff, parse_retry_after
+from lib.response import Branch, Component, Validate
+from lib.transport import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, THROTTLED_STATUS
+from lib.utils import SONARCLOUD_URL, SonarPlatform, decode
+
+DEFAULT_CONCURRENCY = 50
+PAGE_SIZE = 500
+
+# Web API routes behind the dotted names used by SonarHandler.call
+ENDPOINTS = {
+    'auth.check_credentials': ('GET', 'api/authentication/validate'),
+    'auth.logout_user': ('POST', 'api/authentication/logout'),
+    'projects.search_projects': ('GET', 'api/projects/search'),
+    'project_branches.search_project_branches': ('GET', 'api/project_branches/list'),
+    'project_branches.delete_project_branch': ('POST', 'api/project_branches/delete'),
+    'project_branches.rename_project_branch': ('POST', 'api/project_branches/rename'),
+}
+
+
+class AsyncSonarHandler:
+    """ Connector with Sonar running every request as a coroutine """
+
+    def __init__(self, attrs: Namespace) -> None:
+        # Unpack configuration
+        self._platform = getattr(attrs, 'platform', SonarPlatform.SONARQUBE)
+        self.host = getattr(attrs, 'host', None)
+        self.port = getattr(attrs, 'port', None)
+
+        organization = getattr(attrs, 'organization', None)
+        self._organization = organization[-1] if isinstance(
+            organization, list) else organization
+
+        self.concurrency = getattr(attrs, 'concurrency', None) or DEFAULT_CONCURRENCY
+        self.retries = getattr(attrs, 'retries', DEFAULT_RETRIES)
+        self.timeout = aiohttp.ClientTimeout(
+            connect=getattr(attrs, 'connect_timeout', None) or DEFAULT_CONNECT_TIMEOUT,
+            sock_read=getattr(attrs, 'read_timeout', None) or DEFAULT_READ_TIMEOUT)
+
+        # Init the logger
+        self.logger = logging.getLogger(__name__)
+        self.metrics = Metrics()
+
+        # Resolve the server early so an invalid platform fails on construction
+        self.base_url = self.__get_base_url()
+
+        self.session = None
+        self._semaphore = None
+        self._tasks = set()
+        self._authenticated = None
+
+    @property
+    def authenticated(self):
+        """ Getter """
+        return bool(self._authenticated and self._authenticated.valid)
+
+    @property
+    def platform(self):
+        """ Getter """
+        return self._platform
+
+    @property
+    def url(self):
+        """ Getter """
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def organization(self):
+        """ Getter """
+        return self._organization
+
+    # Privates
+    def __get_base_url(self):
+        if self.platform == SonarPlatform.SONARQUBE.value:
+            return self.url if (self.host and self.port) else "http://localhost:9000"
+        if self.platform == SonarPlatform.SONARCLOUD.value:
+            return SONARCLOUD_URL
+        raise TypeError(f'Platform not supported {self.platform}')
+
+    async def __validate(self):
+        """ Check credentials. """
+        return_value = None
+        func = 'auth.check_credentials'
+        result = await self.call(func)
+        if result:
+            return_value = decode(result, Validate)
+
+        return return_value
+
+    # Project endpoint
+    async def list_projects(self):
+        """ Retrieves all projects within an organization """
+        return [project async for project in self.iter_projects()]
+
+    async def iter_projects(self):
+        """ Streams the projects within an organization page by page """
+        func = 'projects.search_projects'
+
+        kargs = {'ps': PAGE_SIZE}
+        if self.platform == SonarPlatform.SONARCLOUD.value:
+            if not self.organization:
+                msg = "Organization cannot be empty in Sonar Cloud"
+                logging.error(msg)
+                raise SonarException(msg)
+            kargs['organization'] = self.organization
+
+        page = 1
+        while True:
+            response = await self.call(func, p=page, **kargs)
+            components = (response or {}).get('components', [])
+            for project in components:
+                yield decode(project, Component)
+
+            # Servers may cap the page size below the requested one, and may not tell
+            # the total: a short page is then the last one
+            paging = (response or {}).get('paging', {})
+            size = paging.get('pageSize') or PAGE_SIZE
+            total = paging.get('total')
+            if len(components) < size or (total is not None and page * size >= total):
+                return
+            page += 1
+
+    async def list_project_branches(self, project_key):
+        """ List the branches of a project. """
+        return_value = None
+        func = 'project_branches.search_project_branches'
+
+        branches = await self.call(func, project=project_key)
+        if branches:
+            return_value = decode(branches['branches'], Branch)
+
+        return return_value
+
+    async def delete_branch(self, project_key, main_branch):
+        """ Delete a non-main branch of a project """
+        func = 'project_branches.delete_project_branch'
+        return await self.call(func, project=project_key, branch=main_branch)
+
+    async def rename_main_branch(self, project_key, main_branch):
+        """ Rename the main branch of a project """
+        func = 'project_branches.rename_project_branch'
+        return await self.call(func, project=project_key, name=main_branch)
+
+    async def call(self, func, **kargs):
+        """ Issue a request to the endpoint behind a dotted name """
+        if func not in ENDPOINTS:
+            logging.warning("Method '%s' not found", func)
+            return None
+
+        if self._semaphore is None:
+            raise SonarException(f"{func} called outside of 'async with' the handler")
+
+        method, path = ENDPOINTS[func]
+        logging.info("%s(%s)", func, kargs, extra={'endpoint': func})
+        async with self._semaphore:
+            return await self.__request(func, method, path, kargs)
+
+    async def __request(self, func, method, path, kargs):
+        """ Send a request retrying the failures safe to retry
+
+        Reads are retried after throttling, server errors, connection errors and timeouts.
+        Writes only when the server did not process them: throttled with a 429 or never
+        sent because the connection could not be established.
+        """
+        params = kargs if method == 'GET' else None
+        data = kargs if method != 'GET' else None
+        delays = backoff(self.retries)
+        while True:
+            try:
+                # Every attempt is timed on its own, without the backoff waits
+                with self.metrics.track(func):
+                    async with self.session.request(method, f"{self.base_url}/{path}",
+                                                    params=params, data=data) as response:
+                        body = await response.read()
+                self.metrics.record_bytes(len(body), func)
+                if response.status < 300:
+                    if body and response.content_type == 'application/json':
+                        return json.loads(body)
+                    return body.decode('utf-8')
+                self.metrics.record_error(func)
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                error = self.__error(response.status, body)
+                transient = response.status == 429 or \
+                    (method == 'GET' and isinstance(error, ServerError))
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as exc:
+                retry_after = None
+                error = exc
+                transient = method == 'GET' or isinstance(exc, aiohttp.ClientConnectorError)
+
+            delay = next(delays, None)
+            if not transient or delay is None:
+                raise error
+            logging.warning("%s failed with %s, retrying in %.2fs", func, error, delay)
+            await asyncio.sleep(retry_after if retry_after is not None else delay)
+
+    @staticmethod
+    def __error(status, body):
+        """ Client exception matching a failed response """
+        msg = f"Error in request [{status}]: {body.decode('utf-8', 'replace')}"
+        if status in THROTTLED_STATUS or status >= 500:
+            return ServerError(msg)
+        if status == 400:
+            return ValidationError(msg)
+        if status in (401, 403):
+            return AuthError(msg)
+        if status == 404:
+            return NotFoundError(msg)
+        return ClientError(msg)
+
+    def create_task(self, coro):
+        """ Schedule a coroutine which is cancelled if still running on exit """
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def logout(self):
+        """ Logout a user """
+        func = 'auth.logout_user'
+        return await self.call(func)
+
+    async def __aenter__(self):
+        token = os.getenv('SONAR_TOKEN')
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self.session = aiohttp.ClientSession(
+            auth=aiohttp.BasicAuth(token, '') if token else None,
+            connector=aiohttp.TCPConnector(limit=self.concurrency),
+            timeout=self.timeout)
+        try:
+            self._authenticated = await self.__validate()
+        except (ClientError, ServerError) as error:
+            logging.error("Unable to check credentials: %s", error)
+        except BaseException:
+            # __aexit__ is not called when entering fails
+            await self.session.close()
+            raise
+        if not self.authenticated:
+            self.logger.warning('The Client is not authenticated')
+        return self
+
+    async def __aexit__(self, typ, val, tra):
+        # Cancel whatever is still in flight before closing the connections
+        pending = [task for task in self._tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        try:
+            await self.logout()
+        except (ClientError, ServerError, aiohttp.ClientError) as error:
+            logging.warning("Unable to logout: %s", error)
+        finally:
+            await self.session.close()
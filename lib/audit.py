@@ -0,0 +1,171 @@
+""" Concurrent Auditing of Projects """
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, Optional, Union
+
+from lib.handler import SonarHandler
+from lib.inventory import Inventory
+from lib.response import Component
+from lib.remediation import Action
+from lib.rules import ProjectBranchCompliant, RuleEngine
+
+DEFAULT_WORKERS = 1
+
+
+class AuditResult:
+    """ Outcome of auditing a single project """
+    def __init__(self, project: Component, rule: Optional[ProjectBranchCompliant] = None,
+                 compliant: Optional[bool] = None, error: Optional[Exception] = None,
+                 violations: Optional[list[str]] = None, actions: Optional[list[Action]] = None,
+                 elapsed: Optional[float] = None):
+        self.project = project
+        self.rule = rule
+        self.compliant = compliant
+        self.error = error
+        self.violations = violations or []
+        self.elapsed = elapsed
+        self._actions = actions
+
+    @property
+    def main_branch(self) -> Optional[str]:
+        """ Name of the main branch, if known """
+        if self.rule is None or self.rule.main_branch is None:
+            return None
+        return self.rule.main_branch.name
+
+    @property
+    def failed(self) -> bool:
+        """ Getter """
+        return self.error is not None
+
+    @property
+    def actions(self) -> list[Action]:
+        """ Mutations making the project compliant """
+        if self._actions is None:
+            self._actions = self.rule.remediation() if self.rule and not self.compliant else []
+        return self._actions
+
+
+def audit_project(project: Component, handler: SonarHandler,
+                  inventory: Optional[Inventory] = None,
+                  engine: Optional[RuleEngine] = None) -> AuditResult:
+    """ Fetch the data of a project once and evaluate every rule over it
+
+    Any error is captured in the result so a single project cannot abort the run.
+
+    Args:
+        project: Sonar Component
+        handler: Sonar Connector
+        inventory: Store where the project and its branches are recorded, if any
+        engine: Rules to evaluate, defaults to the main branch rule
+    """
+    start = time.perf_counter()
+    try:
+        evaluation = (engine or RuleEngine(handler)).evaluate(project)
+        branches = evaluation.snapshot.branches
+        rule = evaluation.snapshot.branch_compliance
+        if inventory is not None:
+            inventory.add_project(project)
+            if branches is not None:
+                inventory.add_branches(project.key, branches)
+        return AuditResult(project, rule, evaluation.compliant,
+                           violations=evaluation.violations, actions=evaluation.actions,
+                           elapsed=time.perf_counter() - start)
+    except Exception as error:  # pylint: disable=broad-except
+        logging.error("Unable to audit project %s: %s", project.key, error)
+        return AuditResult(project, error=error, elapsed=time.perf_counter() - start)
+
+
+def audit_projects(projects: Iterable[Component], handler: SonarHandler,
+                   workers: int = DEFAULT_WORKERS,
+                   inventory: Optional[Inventory] = None,
+                   engine: Optional[RuleEngine] = None) -> Iterator[AuditResult]:
+    """ Audit projects with a bounded pool of workers
+
+    Projects are consumed lazily and at most a small window of them is in flight
+    at any time, so the memory footprint does not depend on the number of projects.
+    Results are yielded in the same order as the input projects.
+
+    Args:
+        projects: Sonar Components to audit
+        handler: Sonar Connector
+        workers: Maximum number of concurrent audits
+        inventory: Store where the audited projects and branches are recorded, if any
+        engine: Rules to evaluate, defaults to the main branch rule
+    """
+    engine = engine or RuleEngine(handler)
+    if workers <= 1:
+        for project in projects:
+            yield audit_project(project, handler, inventory, engine)
+        return
+
+    window = workers * 2
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='audit') as executor:
+        pending = deque()
+        for project in projects:
+            pending.append(executor.submit(audit_project, project, handler, inventory, engine))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+async def audit_project_async(project: Component, handler) -> AuditResult:
+    """ Asynchronous version of audit_project
+
+    Args:
+        project: Sonar Component
+        handler: AsyncSonarHandler
+    """
+    start = time.perf_counter()
+    try:
+        branches = await handler.list_project_branches(project.key)
+        rule = ProjectBranchCompliant(project, handler, branches or [])
+        return AuditResult(project, rule, rule.is_branch_compliant,
+                           elapsed=time.perf_counter() - start)
+    except asyncio.CancelledError:
+        raise
+    except Exception as error:  # pylint: disable=broad-except
+        logging.error("Unable to audit project %s: %s", project.key, error)
+        return AuditResult(project, error=error, elapsed=time.perf_counter() - start)
+
+
+async def audit_projects_async(projects: Union[Iterable[Component], AsyncIterable[Component]],
+                               handler, window: int = 100) -> AsyncIterator[AuditResult]:
+    """ Asynchronous version of audit_projects
+
+    Up to `window` audits overlap while the handler bounds the requests in flight.
+    Results are yielded in the same order as the input projects.
+
+    Args:
+        projects: Sonar Components to audit
+        handler: AsyncSonarHandler
+        window: Maximum number of projects audited at once
+    """
+    if not hasattr(projects, '__aiter__'):
+        projects = _aiter(projects)
+
+    pending = deque()
+    async for project in projects:
+        pending.append(handler.create_task(audit_project_async(project, handler)))
+        if len(pending) >= window:
+            yield await pending.popleft()
+
+    while pending:
+        yield await pending.popleft()
+
+
+async def set_main_branch_async(rule: ProjectBranchCompliant, handler):
+    """ Asynchronous version of ProjectBranchCompliant.set_main_branch """
+    for action in rule.remediation():
+        await action.apply(handler)
+
+
+async def _aiter(items: Iterable):
+    """ Adapt a regular iterable """
+    for item in items:
+        yield item
@@ -0,0 +1,218 @@
+""" Response Cache for Read Endpoints """
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from types import GeneratorType
+from typing import Optional
+
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_DISK_SIZE = 256 * 1024 * 1024
+DEFAULT_TTLS = {
+    'auth.check_credentials': 300,
+    'projects.search_projects': 600,
+    'project_branches.search_project_branches': 600,
+}
+MUTATIONS = (
+    'project_branches.delete_project_branch',
+    'project_branches.rename_project_branch',
+)
+# Mutations changing the listings, not only the entries of a project
+LISTING_MUTATIONS = (
+    'projects.create_project',
+    'projects.update_project_visibility',
+)
+MISS = object()
+
+
+def _digest(value: str) -> str:
+    """ Stable file name friendly digest """
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+class ResponseCache:
+    """ Two tier cache of read responses keyed on the endpoint and its arguments
+
+    Entries live in an in-memory LRU and, optionally, in a size bounded directory
+    shared across runs. Each endpoint has its own time to live and mutating calls
+    drop every entry of the affected project.
+    """
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE, directory: Optional[str] = None,
+                 max_bytes: int = DEFAULT_DISK_SIZE, ttls: Optional[dict] = None,
+                 namespace: str = ''):
+        """ Constructor
+
+        Args:
+            max_entries: Entries kept in memory before evicting the least recently used
+            directory: Folder of the on-disk tier, disabled when empty
+            max_bytes: Size of the on-disk tier before evicting the oldest entries
+            ttls: Seconds each cacheable endpoint is kept, by dotted endpoint name
+            namespace: Scope of the entries, such as the server and credentials they belong to
+        """
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = 0
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self._disk_bytes = sum(os.path.getsize(path) for path in self._disk_entries())
+
+    def key(self, func: str, kargs: dict) -> str:
+        """ Canonical key of a call """
+        return json.dumps([func, kargs, self.namespace], sort_keys=True, default=str)
+
+    def get(self, func: str, kargs: dict):
+        """ Cached response of a call, MISS when absent or expired """
+        if func not in self.ttls:
+            return MISS
+
+        key = self.key(func, kargs)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._memory[key]
+
+        value = self._read(func, kargs, key, now)
+        with self._lock:
+            if value is MISS:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def store(self, func: str, kargs: dict, response):
+        """ Keep the response of a read call, or invalidate after a mutation
+
+        Generators are cached once they have been fully consumed, so responses keep
+        streaming to the caller.
+        """
+        if func in MUTATIONS:
+            self.invalidate(kargs.get('project'))
+            return response
+        if func in LISTING_MUTATIONS:
+            self.invalidate()
+            return response
+        if func not in self.ttls or response is None:
+            return response
+        if isinstance(response, GeneratorType):
+            return self._record(func, kargs, response)
+
+        self._write(func, kargs, response)
+        return response
+
+    def invalidate(self, project: Optional[str] = None):
+        """ Drop the entries of a project, or every entry when no project is given """
+        with self._lock:
+            if project is None:
+                self._memory.clear()
+            else:
+                for key in [k for k in self._memory if json.loads(k)[1].get('project') == project]:
+                    del self._memory[key]
+
+        prefix = '' if project is None else _digest(project)[:16]
+        for path in self._disk_entries():
+            if os.path.basename(path).startswith(prefix):
+                self._remove(path)
+
+    # Privates
+    def _record(self, func, kargs, response):
+        """ Stream a generator while collecting its items """
+        items = []
+        for item in response:
+            items.append(item)
+            yield item
+        self._write(func, kargs, items)
+
+    def _write(self, func, kargs, value):
+        """ Add a value to both tiers """
+        key = self.key(func, kargs)
+        expires = time.time() + self.ttls[func]
+        with self._lock:
+            self._memory[key] = (expires, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+        if not self.directory:
+            return
+        try:
+            payload = json.dumps({'expires': expires, 'value': value}).encode('utf-8')
+        except TypeError:
+            return
+        path = self._path(kargs, key)
+        try:
+            previous = os.path.getsize(path)
+        except OSError:
+            previous = 0
+        with open(path, 'wb') as file:
+            file.write(payload)
+        with self._lock:
+            self._disk_bytes += len(payload) - previous
+        self._evict()
+
+    def _read(self, func, kargs, key, now):
+        """ Value from the on-disk tier, promoted to memory """
+        if not self.directory:
+            return MISS
+        path = self._path(kargs, key)
+        try:
+            with open(path, encoding='utf-8') as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return MISS
+        if entry['expires'] <= now:
+            self._remove(path)
+            return MISS
+
+        with self._lock:
+            self._memory[key] = (entry['expires'], entry['value'])
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+        logging.debug("%s(%s) served from disk cache", func, kargs)
+        return entry['value']
+
+    def _path(self, kargs, key):
+        """ File of an entry, prefixed by its project for invalidation """
+        project = _digest(str(kargs.get('project', '')))[:16]
+        return os.path.join(self.directory, f'{project}-{_digest(key)}.json')
+
+    def _disk_entries(self):
+        """ Files of the on-disk tier """
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        return [entry.path for entry in os.scandir(self.directory) if entry.name.endswith('.json')]
+
+    def _remove(self, path):
+        """ Delete a file of the on-disk tier """
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._disk_bytes -= size
+
+    def _evict(self):
+        """ Remove the oldest files until the on-disk tier fits its size """
+        if self._disk_bytes <= self.max_bytes:
+            return
+        paths = sorted(self._disk_entries(), key=os.path.getmtime)
+        for path in paths:
+            if self._disk_bytes <= self.max_bytes:
+                break
+            self._remove(path)
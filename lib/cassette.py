@@ -0,0 +1,139 @@
+""" Record and Replay of the Responses of Sonar """
+import gzip
+import json
+import logging
+import threading
+from types import GeneratorType
+
+from lib.cache import LISTING_MUTATIONS, MUTATIONS
+
+RECORD = 'record'
+REPLAY = 'replay'
+CASSETTE_MODES = (RECORD, REPLAY)
+# Calls changing Sonar, never recorded and acknowledged without effect on replay
+WRITES = frozenset(MUTATIONS + LISTING_MUTATIONS + ('auth.logout_user',))
+
+
+class CassetteMiss(LookupError):
+    """ Call absent from the cassette being replayed """
+
+
+class Cassette:
+    """ Gzipped JSON lines of the read responses, one per distinct call
+
+    Recording appends every read response as soon as it is known. Streamed responses
+    are kept until the cassette is closed, with the items consumed so far when a stream
+    is abandoned, and the longest stream of a call is the one recorded. Replaying loads the whole cassette in memory and answers
+    every call from it, so audits run without network, deterministically.
+    """
+    def __init__(self, path: str, mode: str = REPLAY):
+        """ Constructor
+
+        Args:
+            path: Cassette file, truncated when recording
+            mode: One of CASSETTE_MODES
+        """
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f'Unknown cassette mode {mode}')
+        self.path = path
+        self.mode = mode
+        self.recorded = 0
+        self.replayed = 0
+        self._responses = {}
+        self._streams = {}
+        self._streamed = {}
+        self._lock = threading.Lock()
+        self._file = None
+        if mode == RECORD:
+            self._file = gzip.open(path, 'wt', encoding='utf-8')  # pylint: disable=consider-using-with
+        else:
+            self._load()
+
+    @property
+    def replaying(self) -> bool:
+        """ Whether calls are answered from the cassette """
+        return self.mode == REPLAY
+
+    @staticmethod
+    def key(func: str, kargs: dict) -> str:
+        """ Canonical key of a call """
+        return json.dumps([func, kargs], sort_keys=True, default=str)
+
+    def _load(self):
+        """ Index every response of the cassette """
+        with gzip.open(self.path, 'rt', encoding='utf-8') as file:
+            for line in file:
+                entry = json.loads(line)
+                self._responses[self.key(entry['func'], entry['kargs'])] = entry['response']
+        logging.info("Replaying %s responses from %s", len(self._responses), self.path)
+
+    def replay(self, func: str, kargs: dict):
+        """ Recorded response of a call """
+        key = self.key(func, kargs)
+        if key in self._responses:
+            self.replayed += 1
+            return self._responses[key]
+        if func in WRITES:
+            logging.info("%s(%s) not applied while replaying", func, kargs)
+            return None
+        raise CassetteMiss(f'{func}({kargs}) is not in {self.path}')
+
+    def record(self, func: str, kargs: dict, response):
+        """ Append the response of a read call, returning the response to the caller """
+        if self.mode != RECORD or func in WRITES or response is None:
+            return response
+        if isinstance(response, GeneratorType):
+            return self._stream(func, kargs, response)
+        self._write(func, kargs, response)
+        return response
+
+    def close(self):
+        """ Flush the recording, streams still open included """
+        with self._lock:
+            for func, kargs, items in list(self._streams.values()):
+                self._keep(func, kargs, items)
+            streamed = list(self._streamed.values())
+            self._streamed.clear()
+        for func, kargs, items in streamed:
+            self._write(func, kargs, items)
+        with self._lock:
+            if self._file and not self._file.closed:
+                self._file.close()
+        if self.mode == RECORD:
+            logging.info("Recorded %s responses to %s", self.recorded, self.path)
+
+    # Privates
+    def _stream(self, func, kargs, response):
+        """ Stream a generator while collecting its items, recorded however far it went """
+        items = []
+        with self._lock:
+            self._streams[id(items)] = (func, kargs, items)
+        try:
+            for item in response:
+                items.append(item)
+                yield item
+        finally:
+            with self._lock:
+                if self._streams.pop(id(items), None):
+                    self._keep(func, kargs, items)
+
+    def _keep(self, func, kargs, items):
+        """ Hold the longest stream of a call until closing, under the lock """
+        key = self.key(func, kargs)
+        if len(items) >= len(self._streamed.get(key, (None, None, []))[2]):
+            self._streamed[key] = (func, kargs, items)
+
+    def _write(self, func, kargs, response):
+        """ Append a response once per distinct call """
+        key = self.key(func, kargs)
+        try:
+            line = json.dumps({'func': func, 'kargs': kargs, 'response': response})
+        except TypeError:
+            logging.debug("Not recording %s, its response is not JSON", func)
+            return
+        with self._lock:
+            if key in self._responses or self._file.closed:
+                return
+            self._responses[key] = None
+            self._file.write(line + '\n')
+            self.recorded += 1
@@ -0,0 +1,197 @@
+""" Checkpoints of Long Audit and Remediation Runs """
+import json
+import logging
+import os
+import threading
+import time
+from typing import Iterable, Iterator, Optional
+
+from lib.remediation import SUCCEEDED, Action, ActionResult
+from lib.response import Component
+
+DEFAULT_CHECKPOINT_INTERVAL = 30.0
+
+
+class Checkpoint:
+    """ Progress of a run, stored periodically so a later run can resume it
+
+    Tracks the projects already audited with the actions planned for them, the
+    mutations already applied and how far the project listing went. Applied
+    mutations are also appended to a journal next to the checkpoint as soon as
+    they succeed, so they are never lost between two saves.
+    """
+    def __init__(self, path: str, interval: float = DEFAULT_CHECKPOINT_INTERVAL,
+                 audited: dict = None, applied: Iterable = (), cursor: int = 0):
+        """ Constructor
+
+        Args:
+            path: JSON file holding the checkpoint
+            interval: Minimum seconds between two saves
+            audited: Planned actions, as (kind, branch) pairs, by audited project key
+            applied: Mutations that succeeded, as (project_key, kind, branch) triplets
+            cursor: Number of leading projects of the listing already handled
+        """
+        self.path = path
+        self.interval = interval
+        self.audited = audited or {}
+        self.applied = {tuple(mutation) for mutation in applied}
+        self.cursor = cursor
+        self.resumed = 0
+        self.finished = False
+        # Position in the listing of the projects in flight and of those handled out of order
+        self._listed = cursor
+        self._sequence = {}
+        self._done = set()
+        self._lock = threading.Lock()
+        self._saved = time.monotonic()
+        self._journal = None
+
+    @property
+    def journal_path(self) -> str:
+        """ Append-only file of the applied mutations """
+        return f'{self.path}.applied'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # Whatever stopped the run, keep the progress made so far
+        if not self.finished:
+            self.save()
+            if self._journal is not None:
+                self._journal.close()
+
+    @classmethod
+    def start(cls, path: str, interval: float = DEFAULT_CHECKPOINT_INTERVAL) -> 'Checkpoint':
+        """ Empty checkpoint, discarding the one left by a previous run """
+        checkpoint = cls(path, interval)
+        for leftover in (path, checkpoint.journal_path):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        return checkpoint
+
+    @classmethod
+    def load(cls, path: str, interval: float = DEFAULT_CHECKPOINT_INTERVAL) -> 'Checkpoint':
+        """ Checkpoint left by an unfinished run, empty if there is none """
+        data = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as file:
+                    data = json.load(file)
+            except (OSError, ValueError) as error:
+                logging.warning("Ignoring unreadable checkpoint %s: %s", path, error)
+
+        checkpoint = cls(path, interval, data.get('audited'), data.get('applied', ()),
+                         data.get('cursor', 0))
+        checkpoint.applied.update(cls._read_journal(checkpoint.journal_path))
+        if not checkpoint.audited and not checkpoint.applied:
+            logging.info("No checkpoint found at %s, starting over", path)
+        else:
+            logging.info("Resuming after %s audited projects and %s applied mutations",
+                         len(checkpoint.audited), len(checkpoint.applied))
+        return checkpoint
+
+    @staticmethod
+    def _read_journal(path: str) -> set[tuple]:
+        """ Mutations of the journal, ignoring a line cut short by a crash """
+        applied = set()
+        if not os.path.exists(path):
+            return applied
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    applied.add(tuple(json.loads(line)))
+                except ValueError:
+                    logging.warning("Ignoring truncated entry of %s", path)
+        return applied
+
+    def select(self, projects: Iterable[Component]) -> Iterator[Component]:
+        """ Stream the projects not audited yet
+
+        The projects are expected to be listed from the cursor onwards.
+        """
+        for project in projects:
+            with self._lock:
+                sequence = self._listed
+                self._listed += 1
+                audited = project.key in self.audited
+                if audited:
+                    self.resumed += 1
+                    self._complete(sequence)
+                else:
+                    self._sequence[project.key] = sequence
+            if not audited:
+                yield project
+
+    def _complete(self, sequence: Optional[int]):
+        """ Move the cursor past every leading project handled, lock held """
+        if sequence is None:
+            return
+        self._done.add(sequence)
+        while self.cursor in self._done:
+            self._done.remove(self.cursor)
+            self.cursor += 1
+
+    def record_skipped(self, project: Component):
+        """ Remember a project needed no audit """
+        with self._lock:
+            self._complete(self._sequence.pop(project.key, None))
+
+    def pending(self) -> list[Action]:
+        """ Actions planned by the previous runs and not applied yet """
+        with self._lock:
+            actions = [Action(key, kind, branch)
+                       for key, planned in self.audited.items() for kind, branch in planned]
+        return self.unapplied(actions)
+
+    def unapplied(self, actions: Iterable[Action]) -> list[Action]:
+        """ Drop the mutations that already succeeded """
+        with self._lock:
+            return [a for a in actions if (a.project_key, a.kind, a.branch) not in self.applied]
+
+    def record_audit(self, project_key: str, actions: Iterable[Action]):
+        """ Remember a project was audited and the actions planned for it """
+        with self._lock:
+            self.audited[project_key] = [[a.kind, a.branch] for a in actions]
+            self._complete(self._sequence.pop(project_key, None))
+        self.save(force=False)
+
+    def record_results(self, results: Iterable[ActionResult]):
+        """ Remember the mutations that succeeded, journaling them right away """
+        with self._lock:
+            if self._journal is None:
+                self._journal = open(self.journal_path, 'a', encoding='utf-8')  # pylint: disable=consider-using-with
+            for result in results:
+                if result.status == SUCCEEDED:
+                    mutation = (result.action.project_key, result.action.kind, result.action.branch)
+                    self.applied.add(mutation)
+                    self._journal.write(json.dumps(mutation) + '\n')
+            self._journal.flush()
+        self.save(force=False)
+
+    def save(self, force: bool = True):
+        """ Store the checkpoint, at most once per interval unless forced """
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._saved < self.interval:
+                return
+            self._saved = now
+            data = {
+                'cursor': self.cursor,
+                'audited': self.audited,
+                'applied': sorted(self.applied),
+            }
+            temporary = f'{self.path}.tmp'
+            with open(temporary, 'w', encoding='utf-8') as file:
+                json.dump(data, file)
+            os.replace(temporary, self.path)
+
+    def finish(self):
+        """ Drop the checkpoint once the run completed """
+        with self._lock:
+            self.finished = True
+            if self._journal is not None:
+                self._journal.close()
+            for path in (self.path, self.journal_path):
+                if os.path.exists(path):
+                    os.remove(path)
@@ -0,0 +1,75 @@
+""" Cache of Credential Validations """
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from lib.response import Validate
+
+DEFAULT_CREDENTIALS_TTL = 3600
+
+# Validations shared by every handler of the process
+_VALIDATIONS = {}
+_LOCK = threading.Lock()
+
+
+class CredentialCache:
+    """ Successful credential checks keyed by a fingerprint of the server and token
+
+    Entries are kept for the process and, when a path is given, in a file reused
+    by later runs. Only a digest of the token is ever stored.
+    """
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = None):
+        """ Constructor
+
+        Args:
+            path: JSON file persisting the validations across runs, if any
+            ttl: Seconds a validation is trusted
+        """
+        self.path = path
+        self.ttl = DEFAULT_CREDENTIALS_TTL if ttl is None else ttl
+
+    def get(self, fingerprint: str) -> Optional[Validate]:
+        """ Recent validation of a fingerprint, if any """
+        checked = _VALIDATIONS.get(fingerprint)
+        if checked is None:
+            checked = self._load().get(fingerprint)
+        if checked is None or time.time() - checked > self.ttl:
+            return None
+        logging.debug("Reusing the credential validation from %.0fs ago", time.time() - checked)
+        return Validate({'valid': True})
+
+    def put(self, fingerprint: str, validation: Validate):
+        """ Remember a successful validation """
+        if not validation or not validation.valid:
+            return
+        now = time.time()
+        with _LOCK:
+            _VALIDATIONS[fingerprint] = now
+            if not self.path:
+                return
+            entries = {k: v for k, v in self._load().items() if now - v <= self.ttl}
+            entries[fingerprint] = now
+            try:
+                with open(self.path, 'w', encoding='utf-8') as file:
+                    json.dump(entries, file)
+            except OSError as error:
+                logging.warning("Unable to store the credential cache: %s", error)
+
+    def _load(self) -> dict:
+        """ Validations persisted by previous runs """
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+
+def clear():
+    """ Forget the validations of the process """
+    with _LOCK:
+        _VALIDATIONS.clear()
@@ -1,13 +1,35 @@
 """ Sonar Handler """
-import json
+import hashlib
 import logging
 import os
+import threading
+import time
 from argparse import Namespace
-
-from sonarqube import SonarCloudClient
-from sonarqube.utils.exceptions import ValidationError
-
-from lib.utils import SONARCLOUD_URL, SonarPlatform, from_json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+
+_IMPORT_START = time.perf_counter()
+# pylint: disable=wrong-import-position
+from sonarqube.utils.exceptions import ClientError, ServerError, ValidationError
+IMPORT_TIME = time.perf_counter() - _IMPORT_START
+
+from lib.cache import DEFAULT_CACHE_SIZE, MISS, ResponseCache
+from lib.cassette import RECORD, REPLAY, Cassette
+from lib.credentials import CredentialCache
+from lib.metrics import Metrics
+from lib.ratelimit import DEFAULT_RATE, DEFAULT_RETRIES, RateLimiter
+from lib.response import Branch, Component, Validate
+from lib.transport import (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, DEFAULT_POOL_SIZE,
+                           PooledTransport)
+from lib.utils import SONARCLOUD_URL, SonarPlatform, decode
+
+# Web API path and item list of the endpoints that can be fetched page by page
+PAGED_ENDPOINTS = {
+    'projects.search_projects': ('api/projects/search', 'components'),
+}
+PAGE_SIZE = 500
 
 
 class SonarHandler:
@@ -20,17 +42,74 @@ class SonarHandler:
         self.port = getattr(attrs, 'port', None)
 
         organization = getattr(attrs, 'organization', None)
-        self._organization = organization.pop() if isinstance(
+        self._organization = organization[-1] if isinstance(
             organization, list) else organization
 
         # Init the logger
         self.logger = logging.getLogger(__name__)
 
+        # Every request goes through a single rate limiter, disabled with a rate of 0
+        rate = getattr(attrs, 'rate_limit', DEFAULT_RATE)
+        self.retries = getattr(attrs, 'retries', DEFAULT_RETRIES)
+        self.limiter = RateLimiter(rate) if rate else None
+
+        # Statistics of every call
+        self.metrics = Metrics()
+
+        # Pages of the project search fetched concurrently, serially when 0
+        self.prefetch_pages = getattr(attrs, 'prefetch_pages', 0) or 0
+
+        # Share a pool of keep-alive connections sized after the concurrency, the workers
+        # and the prefetched pages hold connections at the same time
+        pool_size = getattr(attrs, 'pool_size', None) or \
+            (getattr(attrs, 'workers', None) or DEFAULT_POOL_SIZE) + self.prefetch_pages
+        self.transport = PooledTransport(
+            pool_size=pool_size,
+            connect_timeout=getattr(attrs, 'connect_timeout', None) or DEFAULT_CONNECT_TIMEOUT,
+            read_timeout=getattr(attrs, 'read_timeout', None) or DEFAULT_READ_TIMEOUT,
+            limiter=self.limiter, retries=self.retries, metrics=self.metrics)
+
+        # Opt-in cache of read responses
+        self.cache = None
+        if getattr(attrs, 'cache', False):
+            self.cache = ResponseCache(
+                max_entries=getattr(attrs, 'cache_size', None) or DEFAULT_CACHE_SIZE,
+                directory=getattr(attrs, 'cache_dir', None),
+                namespace=self.__fingerprint())
+
+        # Responses recorded to, or replayed from, a local cassette
+        self.cassette = None
+        if getattr(attrs, 'replay', None):
+            self.cassette = Cassette(attrs.replay, REPLAY)
+        elif getattr(attrs, 'record', None):
+            self.cassette = Cassette(attrs.record, RECORD)
+
+        # Fast start defers the client until its first use and reuses recent validations
+        start = time.perf_counter()
+        self.startup = {'import': IMPORT_TIME}
+        self.fast_start = getattr(attrs, 'fast_start', False)
+        logout = getattr(attrs, 'logout', None)
+        self.logout_on_exit = not self.fast_start if logout is None else logout
+        self.credentials = CredentialCache(
+            path=getattr(attrs, 'credentials_cache', None),
+            ttl=getattr(attrs, 'credentials_ttl', None))
+
         # Generate the client connection
-        self.client = self.__get_client()
+        self._client = None
+        self._client_lock = threading.Lock()
+        self.__client_settings()
+        if not self.fast_start:
+            self._client = self.__get_client()
 
         # Store auth values
-        self._authenticated = self.__validate()
+        self._authenticated = self.credentials.get(self.__fingerprint()) if self.fast_start else None
+        if self._authenticated is None:
+            self._authenticated = self.__validate()
+            if self.fast_start and self._authenticated and self._authenticated.valid:
+                self.credentials.put(self.__fingerprint(), self._authenticated)
+
+        self.startup['total'] = time.perf_counter() - start
+        self.logger.info("Startup timings: %s", {k: round(v, 4) for k, v in self.startup.items()})
 
     @property
     def authenticated(self):
@@ -52,10 +131,24 @@ class SonarHandler:
         """ Getter """
         return self._organization
 
-    # Privates
-    def __get_client(self):
-        module = __import__('sonarqube')
+    @property
+    def client(self):
+        """ Client connection, built on first use """
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self.__get_client()
+        return self._client
 
+    # Privates
+    def __fingerprint(self):
+        """ Identity of the server, organization and credentials in use """
+        token = os.getenv('SONAR_TOKEN') or ''
+        identity = f"{self.platform}|{self.url}|{self.organization}|{token}"
+        return hashlib.sha256(identity.encode()).hexdigest()
+
+    def __client_settings(self):
+        """ Name and arguments of the client for the platform """
         kargs = {
             'token': os.getenv('SONAR_TOKEN')
         }
@@ -70,39 +163,157 @@ class SonarHandler:
         else:
             raise TypeError(f'Platform not supported {self.platform}')
 
-        return getattr(module, client)(**kargs)
+        return client, kargs
+
+    def __get_client(self):
+        start = time.perf_counter()
+        module = __import__('sonarqube')
+
+        client, kargs = self.__client_settings()
+        client = getattr(module, client)(**kargs)
+        self.startup['client'] = time.perf_counter() - start
+
+        session = getattr(client, 'session', None)
+        if session is not None:
+            self.transport.mount(session)
+        else:
+            self.logger.warning('The Client does not expose a session, connections are not pooled')
+
+        return client
 
     # Authentication endpoints
     def __validate(self):
         """ Check credentials. """
         return_value = None
         func = 'auth.check_credentials'
+        start = time.perf_counter()
         result = self.call(func)
         if result:
-            return_value = json.loads(result, object_hook=from_json)
+            return_value = decode(result, Validate)
+        self.startup['validate'] = time.perf_counter() - start
 
         return return_value
 
     # Project endpoint
     def list_projects(self):
         """ Retrieves all projects within an organization """
-        return_value = None
+        return list(self.iter_projects())
+
+    def iter_projects(self, start: int = 0, keys=None):
+        """ Streams the projects within an organization as pages are retrieved
+
+        Args:
+            start: Number of leading projects to skip, avoiding their pages when prefetching
+            keys: Only search these project keys
+        """
         func = 'projects.search_projects'
 
         kargs = {}
-        if isinstance(self.client, SonarCloudClient):
+        if keys:
+            kargs['projects'] = ','.join(keys)
+        if self.platform == SonarPlatform.SONARCLOUD.value:
             if not self.organization:
                 msg = "Organization cannot be empty in Sonar Cloud"
                 logging.error(msg)
                 raise SonarException(msg)
             kargs['organization'] = self.organization
 
-        projects = self.call(func, **kargs)
-        if projects:
-            projects = json.dumps(list(projects))
-            return_value = json.loads(projects, object_hook=from_json)
+        if self.prefetch_pages:
+            return self.__prefetch(func, start, **kargs)
+        return islice(self.__stream(func, **kargs), start, None)
+
+    def __stream(self, func, **kargs):
+        """ Decode every item of a paginated response one at a time """
+        projects = iter(self.call(func, **kargs) or ())
+        while True:
+            # Pages of a streamed response are requested as it is consumed
+            with self.metrics.attribute(func):
+                project = next(projects, None)
+            if project is None:
+                return
+            yield decode(project, Component)
+
+    def __prefetch(self, func, start=0, **kargs):
+        """ Decode every item of a paginated response, fetching the pages concurrently
+
+        The first page tells the total, the following ones are fetched within a window
+        of `prefetch_pages` requests and still yielded in order. Without a total the
+        pages are fetched one after another until an empty or short one.
+        """
+        _, items = PAGED_ENDPOINTS[func]
+        page, skip = divmod(start, PAGE_SIZE)
+        page += 1
+
+        first = self.fetch_page(func, page, **kargs)
+        # Servers may cap the page size below the requested one
+        size = first.get('paging', {}).get('pageSize') or PAGE_SIZE
+        if size != PAGE_SIZE and start:
+            page, skip = divmod(start, size)
+            page += 1
+            first = self.fetch_page(func, page, **kargs)
+        for item in first[items][skip:]:
+            yield decode(item, Component)
+
+        total = first.get('paging', {}).get('total')
+        if total is None:
+            while len(first[items]) == size:
+                page += 1
+                first = self.fetch_page(func, page, **kargs)
+                for item in first[items]:
+                    yield decode(item, Component)
+            return
+
+        last = -(-total // size)
+        with ThreadPoolExecutor(max_workers=self.prefetch_pages,
+                                thread_name_prefix='pages') as executor:
+            pending = deque()
+            while page < last or pending:
+                while page < last and len(pending) < self.prefetch_pages:
+                    page += 1
+                    pending.append(executor.submit(self.fetch_page, func, page, **kargs))
+                for item in pending.popleft().result()[items]:
+                    yield decode(item, Component)
+
+    def fetch_page(self, func, page, **kargs):
+        """ Single page of a paginated endpoint, paging information included
+
+        Args:
+            func: Dotted name of the endpoint, one of PAGED_ENDPOINTS
+            page: Index of the page, starting at 1
+        """
+        path, _ = PAGED_ENDPOINTS[func]
+        kargs = dict(kargs, p=page, ps=PAGE_SIZE)
+        return self.__invoke(partial(self.__get, path), func, kargs)
+
+    def __get(self, path, **params):
+        """ Raw GET through the session of the client, raising as the client does """
+        url = '/'.join(s.strip('/') for s in (self.client.base_url, path))
+        response = self.client.session.get(url, params=params)
+        if response.status_code >= 500:
+            raise ServerError(f'Server error [{response.status_code}] on {path}: {response.reason}')
+        if response.status_code >= 400:
+            raise ClientError(f'Client error [{response.status_code}] on {path}: {response.text}')
+        return response.json()
+
+    def create_project(self, project_key, name, visibility=None):
+        """ Create a project """
+        func = 'projects.create_project'
+        kargs = dict(project=project_key, name=name)
+        if visibility:
+            kargs['visibility'] = visibility
+        if self.platform == SonarPlatform.SONARCLOUD.value:
+            kargs['organization'] = self.organization
+        response = self.call(func, **kargs)
 
-        return return_value
+        return response
+
+    def update_visibility(self, project_key, visibility):
+        """ Make a project public or private """
+        func = 'projects.update_project_visibility'
+        kargs = dict(project=project_key, visibility=visibility)
+        response = self.call(func, **kargs)
+
+        return response
 
     def list_project_branches(self, project_key):
         """ List the branches of a project. """
@@ -113,8 +324,7 @@ class SonarHandler:
 
         branches = self.call(func, **kargs)
         if branches:
-            branches = json.dumps(branches['branches'])
-            return_value = json.loads(branches, object_hook=from_json)
+            return_value = decode(branches['branches'], Branch)
 
         return return_value
 
@@ -148,11 +358,41 @@ class SonarHandler:
                 logging.warning("Method '%s' not found", attr)
 
         if caller:
-            logging.info("%s(%s)", func, kargs)
-            response = caller(**kargs)
+            response = self.__invoke(caller, func, kargs)
 
         return response
 
+    def __invoke(self, caller, func, kargs):
+        """ Serve a call from the cache or issue it, tracking its metrics """
+        if self.cache:
+            response = self.cache.get(func, kargs)
+            if response is not MISS:
+                logging.debug("%s(%s) served from cache", func, kargs)
+                self.metrics.record_cached(func)
+                return response
+
+        arguments = kargs
+        if self.cassette and self.cassette.replaying:
+            # Answered from memory, the client is never reached
+            caller = partial(self.cassette.replay, func, kargs)
+            arguments = {}
+
+        logging.info("%s(%s)", func, kargs, extra={'endpoint': func})
+        # The transport times every request the call issues on this thread
+        with self.metrics.attribute(func):
+            response = caller(**arguments)
+
+        if self.cassette:
+            response = self.cassette.record(func, kargs, response)
+        if self.cache:
+            response = self.cache.store(func, kargs, response)
+
+        return response
+
+    def pool_stats(self):
+        """ Statistics of the pooled transport """
+        return self.transport.stats()
+
     def logout(self):
         """ Logout a user """
         func = 'auth.logout_user'
@@ -164,7 +404,10 @@ class SonarHandler:
         return self
 
     def __exit__(self, typ, val, tra):
-        self.logout()
+        if self.logout_on_exit:
+            self.logout()
+        if self.cassette:
+            self.cassette.close()
         return typ, val, tra
 
 
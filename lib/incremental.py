@@ -0,0 +1,128 @@
+""" Incremental Audits driven by the Last Analysis of the Projects """
+import json
+import logging
+import os
+import time
+from typing import Callable, Iterable, Iterator, Optional
+
+from lib.response import Component
+
+DEFAULT_FULL_SCAN_AGE = 7 * 24 * 3600
+
+
+class AuditState:
+    """ Per-project state of the previous audits
+
+    A project is audited again only when it is new, when its lastAnalysisDate or
+    revision moved since it was last audited, or when it was not compliant. Every
+    project is audited again when the rules changed since the last full audit.
+    """
+    def __init__(self, path: str, full_scan_at: Optional[float] = None,
+                 projects: Optional[dict] = None, rules: Optional[str] = None):
+        """ Constructor
+
+        Args:
+            path: JSON file holding the state
+            full_scan_at: Time the last full audit started
+            projects: Last seen lastAnalysisDate, revision and compliance by project key
+            rules: Fingerprint of the rules of the last full audit
+        """
+        self.path = path
+        self.full_scan_at = full_scan_at
+        self.projects = projects or {}
+        self.rules = rules
+        self.started = time.time()
+        self.full_scan = False
+        self._active_rules = None
+        self.unchanged = 0
+        self._seen = set()
+
+    @classmethod
+    def load(cls, path: str) -> 'AuditState':
+        """ State stored by the previous run, empty on the first run """
+        if not os.path.exists(path):
+            return cls(path)
+        try:
+            with open(path, encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError) as error:
+            logging.warning("Ignoring unreadable audit state %s: %s", path, error)
+            return cls(path)
+        return cls(path, data.get('full_scan_at'), data.get('projects'), data.get('rules'))
+
+    def needs_full_scan(self, forced: bool = False, max_age: float = DEFAULT_FULL_SCAN_AGE,
+                        rules: Optional[str] = None) -> bool:
+        """ Whether every project must be audited in this run
+
+        Args:
+            forced: Full scan requested
+            max_age: Seconds after which a full scan is due
+            rules: Fingerprint of the rules of this run, compliance under others is not trusted
+        """
+        self._active_rules = rules
+        rules_changed = rules is not None and rules != self.rules
+        if rules_changed and self.full_scan_at is not None:
+            logging.info("The rules changed since the last full audit")
+        self.full_scan = (forced or rules_changed or self.full_scan_at is None
+                          or self.started - self.full_scan_at > max_age)
+        return self.full_scan
+
+    def changed(self, project: Component) -> bool:
+        """ Whether a project must be audited """
+        previous = self.projects.get(project.key)
+        return (previous is None
+                or not previous.get('compliant')
+                or previous.get('lastAnalysisDate') != project.lastAnalysisDate
+                or previous.get('revision') != project.revision)
+
+    def select(self, projects: Iterable[Component],
+               skipped: Optional[Callable[[Component], None]] = None) -> Iterator[Component]:
+        """ Stream the projects to audit, skipping unchanged ones unless scanning everything
+
+        Args:
+            projects: Listed projects
+            skipped: Called with every unchanged project
+        """
+        for project in projects:
+            self._seen.add(project.key)
+            if self.full_scan or self.changed(project):
+                yield project
+            else:
+                self.unchanged += 1
+                if skipped:
+                    skipped(project)
+
+    def record(self, project: Component, compliant: bool):
+        """ Remember the audit of a project """
+        self.projects[project.key] = {
+            'lastAnalysisDate': project.lastAnalysisDate,
+            'revision': project.revision,
+            'compliant': compliant,
+        }
+
+    def mark_compliant(self, project_key: str):
+        """ Remember a project was remediated """
+        if project_key in self.projects:
+            self.projects[project_key]['compliant'] = True
+
+    def save(self, complete: bool = True):
+        """ Store the state for the next run
+
+        Args:
+            complete: Whether every project was listed, so the missing ones can be dropped
+        """
+        if complete:
+            self.projects = {k: v for k, v in self.projects.items() if k in self._seen}
+            if self.full_scan:
+                self.full_scan_at = self.started
+                self.rules = self._active_rules or self.rules
+
+        data = {
+            'full_scan_at': self.full_scan_at,
+            'rules': self.rules,
+            'projects': self.projects,
+        }
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump(data, file)
+        os.replace(temporary, self.path)
@@ -0,0 +1,200 @@
+""" Compact, Indexed Inventory of Projects and Branches """
+# pylint: disable=too-few-public-methods
+# pylint: disable=invalid-name
+import json
+import sys
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, Optional
+
+from lib.response import Branch, Component
+
+SONAR_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S%z'
+
+
+def to_timestamp(value: Optional[str]) -> Optional[float]:
+    """ Convert a Sonar date into a POSIX timestamp """
+    if not value:
+        return None
+    return datetime.strptime(value, SONAR_DATE_FORMAT).timestamp()
+
+
+def to_date(value: Optional[float]) -> Optional[str]:
+    """ Convert a POSIX timestamp back into a Sonar date """
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value, timezone.utc).strftime(SONAR_DATE_FORMAT)
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    """ Share the storage of highly repeated strings """
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class ProjectRecord:
+    """ Compact Record for a Project """
+    __slots__ = ('key', 'name', 'organization', 'qualifier', 'visibility',
+                 'lastAnalysisDate', 'revision')
+
+    def __init__(self, project: Component):
+        self.key = project.key
+        self.name = project.name
+        self.organization = _intern(project.organization)
+        self.qualifier = _intern(project.qualifier)
+        self.visibility = _intern(project.visibility)
+        self.lastAnalysisDate = to_timestamp(project.lastAnalysisDate)
+        self.revision = project.revision
+
+
+class BranchRecord:
+    """ Compact Record for a Branch of a Project """
+    __slots__ = ('project', 'name', 'isMain', 'type', 'analysisDate', 'commit')
+
+    def __init__(self, project_key: str, branch: Branch):
+        self.project = project_key
+        self.name = _intern(branch.name)
+        self.isMain = bool(branch.isMain)
+        self.type = _intern(branch.type)
+        self.analysisDate = to_timestamp(branch.analysisDate)
+        # Only the revision is kept out of the commit details
+        commit = branch.commit
+        self.commit = commit.get('sha') if isinstance(commit, dict) else commit
+
+
+class Inventory:
+    """ In-memory store of projects and branches with precomputed indexes
+
+    Every lookup by key, branch name, main branch or visibility is a dictionary
+    access, and range queries over the last analysis date use a sorted index.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._projects = {}
+        self._branches = {}
+        self._main_branches = {}
+        self._by_visibility = {}
+        self._by_analysis = []
+
+    def __len__(self) -> int:
+        return len(self._projects)
+
+    def __contains__(self, project_key: str) -> bool:
+        return project_key in self._projects
+
+    def __iter__(self) -> Iterator[ProjectRecord]:
+        return iter(list(self._projects.values()))
+
+    # Writers
+    def add_project(self, project: Component) -> ProjectRecord:
+        """ Store or replace a project """
+        record = ProjectRecord(project)
+        with self._lock:
+            self._unindex(record.key)
+            self._projects[record.key] = record
+            self._by_visibility.setdefault(record.visibility, {})[record.key] = record
+            if record.lastAnalysisDate is not None:
+                insort(self._by_analysis, (record.lastAnalysisDate, record.key))
+        return record
+
+    def add_branches(self, project_key: str, branches: Iterable[Branch]):
+        """ Store or replace the branches of a project """
+        records = {}
+        main = None
+        for branch in branches:
+            record = BranchRecord(project_key, branch)
+            records[record.name] = record
+            if record.isMain:
+                main = record
+
+        with self._lock:
+            self._branches[project_key] = records
+            if main is None:
+                self._main_branches.pop(project_key, None)
+            else:
+                self._main_branches[project_key] = main
+
+    def remove_project(self, project_key: str):
+        """ Drop a project and its branches """
+        with self._lock:
+            self._unindex(project_key)
+            self._projects.pop(project_key, None)
+            self._branches.pop(project_key, None)
+            self._main_branches.pop(project_key, None)
+
+    def _unindex(self, project_key: str):
+        """ Remove a project from the secondary indexes """
+        previous = self._projects.get(project_key)
+        if previous is None:
+            return
+        self._by_visibility.get(previous.visibility, {}).pop(project_key, None)
+        if previous.lastAnalysisDate is not None:
+            entry = (previous.lastAnalysisDate, project_key)
+            index = bisect_left(self._by_analysis, entry)
+            if index < len(self._by_analysis) and self._by_analysis[index] == entry:
+                del self._by_analysis[index]
+
+    # Queries
+    def project(self, project_key: str) -> Optional[ProjectRecord]:
+        """ Project by key """
+        return self._projects.get(project_key)
+
+    def branches(self, project_key: str) -> list[BranchRecord]:
+        """ Branches of a project """
+        return list(self._branches.get(project_key, {}).values())
+
+    def branch(self, project_key: str, name: str) -> Optional[BranchRecord]:
+        """ Branch of a project by name """
+        return self._branches.get(project_key, {}).get(name)
+
+    def main_branch(self, project_key: str) -> Optional[BranchRecord]:
+        """ Main branch of a project """
+        return self._main_branches.get(project_key)
+
+    def by_visibility(self, visibility: str) -> list[ProjectRecord]:
+        """ Projects with a given visibility """
+        return list(self._by_visibility.get(visibility, {}).values())
+
+    def analyzed_between(self, start: Optional[str] = None,
+                         end: Optional[str] = None) -> list[ProjectRecord]:
+        """ Projects whose last analysis falls within [start, end]
+
+        Args:
+            start: Sonar date of the lower bound, unbounded when empty
+            end: Sonar date of the upper bound, unbounded when empty
+        """
+        with self._lock:
+            low = 0 if not start else bisect_left(self._by_analysis, (to_timestamp(start),))
+            high = len(self._by_analysis) if not end else bisect_right(
+                self._by_analysis, (to_timestamp(end), chr(sys.maxunicode)))
+            keys = [key for _, key in self._by_analysis[low:high]]
+        return [self._projects[key] for key in keys]
+
+    # Export
+    def snapshot(self) -> dict:
+        """ Plain representation of the projects by last analysis, then the never analyzed ones """
+        analyzed = self.analyzed_between()
+        seen = {record.key for record in analyzed}
+        projects = []
+        for record in analyzed + [p for p in self if p.key not in seen]:
+            main = self.main_branch(record.key)
+            projects.append({
+                'key': record.key,
+                'name': record.name,
+                'visibility': record.visibility,
+                'lastAnalysisDate': to_date(record.lastAnalysisDate),
+                'main_branch': main.name if main else None,
+                'branches': sorted(b.name for b in self.branches(record.key)),
+            })
+        visibility = {name: len(self.by_visibility(name))
+                      for name in sorted(filter(None, self._by_visibility))}
+        return {'projects': projects, 'visibility': visibility}
+
+    def dump(self, path: str):
+        """ Write the snapshot of the inventory to a JSON file
+
+        Args:
+            path: Destination file
+        """
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.snapshot(), file, indent=2)
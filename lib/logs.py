@@ -0,0 +1,170 @@
+""" Non-Blocking Structured Logging """
+import atexit
+import json
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+LOG_FORMATS = ('text', 'json')
+# Attributes of every LogRecord, anything else was passed through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message'}
+
+
+class JsonFormatter(logging.Formatter):
+    """ Formats records as single line JSON documents """
+    def format(self, record: logging.LogRecord) -> str:
+        document = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                document[key] = value
+        if record.exc_info:
+            document['exception'] = self.formatException(record.exc_info)
+        return json.dumps(document, default=str)
+
+
+class EndpointSampler(logging.Filter):
+    """ Thins out the per-call records, those carrying an `endpoint` attribute
+
+    Other records always pass.
+    """
+    def __init__(self, sample: int = 1, rate: Optional[float] = None):
+        """ Constructor
+
+        Args:
+            sample: Keep one out of this many records of each endpoint
+            rate: Maximum records per second of each endpoint, unlimited when empty
+        """
+        super().__init__()
+        self.sample = max(1, sample)
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._windows = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        endpoint = getattr(record, 'endpoint', None)
+        if endpoint is None:
+            return True
+
+        with self._lock:
+            count = self._counts.get(endpoint, 0)
+            self._counts[endpoint] = count + 1
+            if count % self.sample:
+                return False
+
+            if self.rate:
+                second = int(time.monotonic())
+                window, emitted = self._windows.get(endpoint, (second, 0))
+                if window != second:
+                    window, emitted = second, 0
+                if emitted >= self.rate:
+                    return False
+                self._windows[endpoint] = (window, emitted + 1)
+        return True
+
+
+class StoppableQueueListener(QueueListener):
+    """ QueueListener which can be stopped more than once """
+    def stop(self):
+        if self._thread:
+            super().stop()
+
+
+class DeferredQueueHandler(QueueHandler):
+    """ Queues records untouched so formatting happens in the listener thread """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def install_async_logging(logger: logging.Logger, handlers: list[logging.Handler],
+                          sampler: Optional[logging.Filter] = None) -> StoppableQueueListener:
+    """ Route the records of a logger through a queue drained by a background thread
+
+    Args:
+        logger: Logger whose records are queued, usually the root logger
+        handlers: Handlers doing the actual, possibly blocking, output
+        sampler: Filter applied before a record is queued, if any
+
+    Returns:
+        The running listener, stopped and flushed automatically on exit
+    """
+    records = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(records)
+    if sampler:
+        queue_handler.addFilter(sampler)
+    logger.addHandler(queue_handler)
+
+    listener = StoppableQueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+
+def install_logging(logger: logging.Logger, handlers: list[logging.Handler], sample: int = 1,
+                    rate: Optional[float] = None,
+                    async_logging: bool = False) -> Optional[StoppableQueueListener]:
+    """ Attach the output handlers to a logger, sampling every record once
+
+    Args:
+        logger: Logger whose records are written, usually the root logger
+        handlers: Handlers doing the actual output
+        sample: Keep one out of this many per-call records of each endpoint
+        rate: Maximum per-call records per second of each endpoint
+        async_logging: Write records from a background thread instead of the caller
+
+    Returns:
+        The running listener with async logging, None otherwise
+    """
+    sampled = sample > 1 or rate
+    if async_logging:
+        # A single sampler in front of the queue
+        return install_async_logging(logger, handlers,
+                                     EndpointSampler(sample, rate) if sampled else None)
+
+    for handler in handlers:
+        if sampled:
+            # Samplers count the records they see, a shared one would split them
+            handler.addFilter(EndpointSampler(sample, rate))
+        logger.addHandler(handler)
+    return None
+
+class RootForwarder(logging.Handler):
+    """ Hands records over to the handlers of the root logger of this process """
+    def emit(self, record: logging.LogRecord) -> None:
+        logging.getLogger().handle(record)
+
+
+def collect_worker_logging() -> tuple[multiprocessing.Queue, StoppableQueueListener]:
+    """ Queue where worker processes send their records, and the listener logging them here
+
+    Returns:
+        The queue to hand over to `forward_logging` and the running listener
+    """
+    records = multiprocessing.Queue()
+    listener = StoppableQueueListener(records, RootForwarder())
+    listener.start()
+    return records, listener
+
+
+def forward_logging(records: multiprocessing.Queue) -> None:
+    """ Pool initializer sending every record of a worker process to its parent
+
+    Args:
+        records: Queue drained by the listener of `collect_worker_logging`
+    """
+    logger = logging.getLogger()
+    # Inherited handlers write to the files of the parent or to a queue nobody drains
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(QueueHandler(records))
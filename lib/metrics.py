@@ -0,0 +1,197 @@
+""" Per-Endpoint Latency and Throughput Metrics """
+import json
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Optional
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RESERVOIR_SIZE = 4096
+PERCENTILES = (50, 95, 99)
+METRICS_FORMATS = ('json', 'prometheus')
+
+
+class EndpointStats:
+    """ Counters and latency distribution of a single endpoint """
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.cached = 0
+        self.bytes = 0
+        self.latency_sum = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.samples = []
+
+    def observe(self, latency: float):
+        """ Record the latency of a call """
+        self.calls += 1
+        self.latency_sum += latency
+        self.buckets[bisect_left(LATENCY_BUCKETS, latency)] += 1
+        # Keep a uniform sample of the latencies with a bounded footprint
+        if len(self.samples) < RESERVOIR_SIZE:
+            self.samples.append(latency)
+        else:
+            index = random.randrange(self.calls)
+            if index < RESERVOIR_SIZE:
+                self.samples[index] = latency
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """ Latency below which the given percentage of the calls fall """
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def snapshot(self) -> dict:
+        """ Plain representation of the statistics """
+        values = {
+            'calls': self.calls,
+            'errors': self.errors,
+            'cached': self.cached,
+            'bytes': self.bytes,
+            'latency_sum': round(self.latency_sum, 6),
+        }
+        for percent in PERCENTILES:
+            latency = self.percentile(percent)
+            values[f'p{percent}'] = None if latency is None else round(latency, 6)
+        return values
+
+
+class Metrics:
+    """ Registry of the statistics of every endpoint called through a SonarHandler """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._endpoints = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _stats(self, endpoint: str) -> EndpointStats:
+        """ Statistics of an endpoint, created on first use. Must hold the lock """
+        stats = self._endpoints.get(endpoint)
+        if stats is None:
+            stats = self._endpoints[endpoint] = EndpointStats()
+        return stats
+
+    @property
+    def current(self) -> Optional[str]:
+        """ Endpoint being called by the current thread """
+        return getattr(self._local, 'endpoint', None)
+
+    @contextmanager
+    def attribute(self, endpoint: str):
+        """ Attribute the requests issued by the current thread to an endpoint """
+        previous = self.current
+        self._local.endpoint = endpoint
+        try:
+            yield
+        finally:
+            self._local.endpoint = previous
+
+    @contextmanager
+    def track(self, endpoint: str):
+        """ Measure a single request to an endpoint """
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except Exception:
+            failed = True
+            raise
+        finally:
+            latency = time.perf_counter() - start
+            with self._lock:
+                self.in_flight -= 1
+                stats = self._stats(endpoint)
+                stats.observe(latency)
+                if failed:
+                    stats.errors += 1
+
+    def mean(self, endpoint: Optional[str] = None) -> Optional[float]:
+        """ Mean latency of an endpoint, or of every endpoint, None before any call """
+        with self._lock:
+            if endpoint is None:
+                stats = list(self._endpoints.values())
+            else:
+                stats = [self._endpoints[endpoint]] if endpoint in self._endpoints else []
+            calls = sum(s.calls for s in stats)
+            return sum(s.latency_sum for s in stats) / calls if calls else None
+
+    def record_cached(self, endpoint: str):
+        """ Count a call answered by the cache """
+        with self._lock:
+            self._stats(endpoint).cached += 1
+
+    def record_error(self, endpoint: str):
+        """ Count a request answered with an error status """
+        with self._lock:
+            self._stats(endpoint).errors += 1
+
+    def record_bytes(self, size: int, endpoint: Optional[str] = None):
+        """ Add the size of a response to the endpoint being called """
+        endpoint = endpoint or self.current
+        if not endpoint:
+            return
+        with self._lock:
+            self._stats(endpoint).bytes += size
+
+    def snapshot(self) -> dict:
+        """ Plain representation of every statistic """
+        with self._lock:
+            return {
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'endpoints': {name: stats.snapshot()
+                              for name, stats in sorted(self._endpoints.items())},
+            }
+
+    def to_json(self) -> str:
+        """ JSON document of the statistics """
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """ Statistics in the Prometheus text exposition format """
+        lines = [
+            '# TYPE sonar_requests_in_flight_max gauge',
+            f'sonar_requests_in_flight_max {self.max_in_flight}',
+        ]
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            counters = ('calls', 'errors', 'cached', 'bytes')
+            for counter in counters:
+                lines.append(f'# TYPE sonar_endpoint_{counter}_total counter')
+                for name, stats in endpoints:
+                    lines.append(
+                        f'sonar_endpoint_{counter}_total{{endpoint="{name}"}} {getattr(stats, counter)}')
+
+            lines.append('# TYPE sonar_endpoint_latency_seconds histogram')
+            for name, stats in endpoints:
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), stats.buckets):
+                    cumulative += count
+                    lines.append(f'sonar_endpoint_latency_seconds_bucket'
+                                 f'{{endpoint="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'sonar_endpoint_latency_seconds_sum{{endpoint="{name}"}} '
+                             f'{stats.latency_sum:.6f}')
+                lines.append(f'sonar_endpoint_latency_seconds_count{{endpoint="{name}"}} {stats.calls}')
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path: str, fmt: str = 'json'):
+        """ Write the statistics to a file
+
+        Args:
+            path: Destination file, such as a node exporter textfile
+            fmt: Either 'json' or 'prometheus'
+        """
+        if fmt not in METRICS_FORMATS:
+            raise ValueError(f'Metrics format not supported {fmt}')
+        content = self.to_json() if fmt == 'json' else self.to_prometheus()
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
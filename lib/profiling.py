@@ -0,0 +1,212 @@
+""" Per-Phase Timers, CPU Profiles and Memory Snapshots of a Run """
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+
+import lib.handler
+
+DEFAULT_PROFILE_DIR = 'profile'
+# Handler methods timed as a phase of their own
+HANDLER_PHASES = {
+    'iter_projects': 'listing',
+    'list_project_branches': 'branches',
+    'delete_branch': 'mutation',
+    'rename_main_branch': 'mutation',
+    'update_visibility': 'mutation',
+    'create_project': 'mutation',
+}
+TOP_ALLOCATIONS = 10
+
+
+class PhaseStats:
+    """ Calls and durations of a phase """
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.memory = None
+
+    def observe(self, elapsed: float):
+        """ Record a call """
+        self.calls += 1
+        self.total += elapsed
+        self.maximum = max(self.maximum, elapsed)
+
+    def snapshot(self) -> dict:
+        """ Plain representation of the statistics """
+        return {
+            'calls': self.calls,
+            'total': round(self.total, 6),
+            'mean': round(self.total / self.calls, 6) if self.calls else None,
+            'max': round(self.maximum, 6),
+            'memory': self.memory,
+        }
+
+
+class Profiler:
+    """ Times the phases of a run and optionally profiles them
+
+    The phases of the run itself, entered one after another from the main thread,
+    can also be captured with cProfile and tracemalloc. The finer phases, such as
+    fetching branches or decoding responses, run within them and in worker threads
+    and are only timed. Nothing is instrumented unless a Profiler is created.
+    """
+    def __init__(self, directory: str = DEFAULT_PROFILE_DIR, cpu: bool = False,
+                 memory: bool = False):
+        """ Constructor
+
+        Args:
+            directory: Folder the summary and the raw profiles are written to
+            cpu: Capture a cProfile of every phase of the run
+            memory: Capture a tracemalloc snapshot at the end of every phase of the run
+        """
+        self.directory = directory
+        self.cpu = cpu
+        self.memory = memory
+        self.phases = {}
+        self._profiles = {}
+        self._snapshots = {}
+        self._patches = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.restore()
+        self.dump()
+
+    def _stack(self) -> list:
+        """ Phases entered by the current thread """
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def phase(self, name: str):
+        """ Measure a phase """
+        stack = self._stack()
+        # Only the outermost phases of the main thread run one at a time
+        outermost = not stack and threading.current_thread() is threading.main_thread()
+        profile = self._start_profile(name) if self.cpu and outermost else None
+        if self.memory and outermost:
+            tracemalloc.reset_peak()
+        stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            if profile:
+                profile.disable()
+            with self._lock:
+                stats = self.phases.setdefault(name, PhaseStats())
+                stats.observe(elapsed)
+                if self.memory and outermost:
+                    current, peak = tracemalloc.get_traced_memory()
+                    stats.memory = {'current': current, 'peak': peak}
+                    self._snapshots[name] = tracemalloc.take_snapshot()
+
+    def _start_profile(self, name: str):
+        """ Enable the cProfile of a phase, None if another profiler is active """
+        with self._lock:
+            profile = self._profiles.setdefault(name, cProfile.Profile())
+        try:
+            profile.enable()
+        except ValueError as error:
+            logging.warning("Unable to profile %s: %s", name, error)
+            return None
+        return profile
+
+    def timed(self, func, name: str):
+        """ Wrap a function so every call is measured as a phase """
+        @wraps(func)
+        def wrapper(*args, **kargs):
+            with self.phase(name):
+                return func(*args, **kargs)
+        return wrapper
+
+    def timed_iterator(self, func, name: str):
+        """ Wrap a function returning an iterator so every item is measured as a phase """
+        @wraps(func)
+        def wrapper(*args, **kargs):
+            with self.phase(name):
+                iterator = iter(func(*args, **kargs))
+            while True:
+                with self.phase(name):
+                    item = next(iterator, StopIteration)
+                if item is StopIteration:
+                    return
+                yield item
+        return wrapper
+
+    def instrument(self, handler):
+        """ Time the calls of a SonarHandler and the decoding of its responses """
+        for method, name in HANDLER_PHASES.items():
+            func = getattr(handler, method)
+            wrapper = self.timed_iterator(func, name) if method == 'iter_projects' \
+                else self.timed(func, name)
+            setattr(handler, method, wrapper)
+            self._patches.append((handler, method, None))
+        self._patches.append((lib.handler, 'decode', lib.handler.decode))
+        lib.handler.decode = self.timed(lib.handler.decode, 'decode')
+
+    def restore(self):
+        """ Undo the instrumentation """
+        for target, attribute, original in reversed(self._patches):
+            if original is None:
+                delattr(target, attribute)
+            else:
+                setattr(target, attribute, original)
+        self._patches.clear()
+
+    def summary(self) -> str:
+        """ Table of the phases """
+        lines = [f'{"phase":<12} {"calls":>8} {"total s":>10} {"mean s":>10} {"max s":>10}'
+                 f' {"peak MiB":>9}']
+        with self._lock:
+            phases = {name: stats.snapshot() for name, stats in self.phases.items()}
+        for name, stats in phases.items():
+            peak = f'{stats["memory"]["peak"] / 2 ** 20:.1f}' if stats['memory'] else '-'
+            lines.append(f'{name:<12} {stats["calls"]:>8} {stats["total"]:>10.4f}'
+                         f' {stats["mean"]:>10.6f} {stats["max"]:>10.4f} {peak:>9}')
+        return '\n'.join(lines)
+
+    def dump(self):
+        """ Write the summary and the raw profiles """
+        os.makedirs(self.directory, exist_ok=True)
+        summary = self.summary()
+        logging.info("Profile of the run:\n%s", summary)
+
+        with self._lock:
+            phases = {name: stats.snapshot() for name, stats in self.phases.items()}
+        with open(os.path.join(self.directory, 'summary.txt'), 'w', encoding='utf-8') as file:
+            file.write(summary + '\n')
+            for name, profile in self._profiles.items():
+                output = io.StringIO()
+                pstats.Stats(profile, stream=output).sort_stats('cumulative').print_stats(20)
+                file.write(f'\n== cProfile of {name} ==\n{output.getvalue()}')
+            for name, snapshot in self._snapshots.items():
+                file.write(f'\n== Top allocations after {name} ==\n')
+                for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+                    file.write(f'{stat}\n')
+        with open(os.path.join(self.directory, 'summary.json'), 'w', encoding='utf-8') as file:
+            json.dump(phases, file, indent=2)
+
+        # Raw files for offline analysis with pstats, snakeviz or tracemalloc
+        for name, profile in self._profiles.items():
+            profile.dump_stats(os.path.join(self.directory, f'{name}.pstats'))
+        for name, snapshot in self._snapshots.items():
+            snapshot.dump(os.path.join(self.directory, f'{name}.tracemalloc'))
@@ -0,0 +1,178 @@
+""" Bulk Provisioning of Projects from a Manifest """
+import json
+import logging
+import time
+from argparse import Namespace
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from lib.handler import SonarException, SonarHandler
+
+VISIBILITIES = ('public', 'private')
+MANIFEST_FIELDS = ('key', 'name', 'visibility', 'main_branch')
+
+CREATED = 'created'
+# Created, but its main branch could not be set
+PARTIAL = 'partial'
+# Already existing, its main branch set after the manifest
+UPDATED = 'updated'
+EXISTING = 'skipped'
+FAILED = 'failed'
+STATUSES = (CREATED, PARTIAL, UPDATED, EXISTING, FAILED)
+
+
+def load_manifest(path: str) -> list[dict]:
+    """ Read the projects to provision
+
+    The file holds a JSON list of objects with a 'key' and optionally a 'name', which
+    defaults to the key, a 'visibility', one of VISIBILITIES, and a 'main_branch'.
+    """
+    with open(path, encoding='utf-8') as file:
+        projects = json.load(file)
+
+    if not isinstance(projects, list) or not all(isinstance(p, dict) for p in projects):
+        raise ValueError(f'{path} must contain a list of projects')
+    keys = set()
+    for project in projects:
+        if not project.get('key'):
+            raise ValueError(f'Project without key in {path}: {project}')
+        if project['key'] in keys:
+            raise ValueError(f'Duplicated project {project["key"]} in {path}')
+        keys.add(project['key'])
+        unknown = set(project) - set(MANIFEST_FIELDS)
+        if unknown:
+            raise ValueError(f'Unknown fields {sorted(unknown)} of {project["key"]} in {path}')
+        if project.get('visibility') not in (None, *VISIBILITIES):
+            raise ValueError(f'Unknown visibility of {project["key"]} in {path}: '
+                             f'{project["visibility"]}')
+    return projects
+
+
+class ProvisionResult:
+    """ Outcome of the provisioning of a project """
+    def __init__(self, key: str, status: str, error: Optional[Exception] = None,
+                 elapsed: float = 0.0):
+        self.key = key
+        self.status = status
+        self.error = error
+        self.elapsed = elapsed
+
+
+def provision_project(project: dict, handler: SonarHandler) -> ProvisionResult:
+    """ Create a project of the manifest and set its main branch, never raising """
+    start = time.perf_counter()
+    try:
+        handler.create_project(project['key'], project.get('name') or project['key'],
+                               project.get('visibility'))
+    except Exception as error:  # pylint: disable=broad-except
+        logging.error("Unable to provision %s: %s", project['key'], error)
+        return ProvisionResult(project['key'], FAILED, error, time.perf_counter() - start)
+
+    try:
+        if project.get('main_branch'):
+            handler.rename_main_branch(project['key'], project['main_branch'])
+    except Exception as error:  # pylint: disable=broad-except
+        # The next run finds the project and sets its main branch again
+        logging.error("Project %s created, unable to set its main branch: %s",
+                      project['key'], error)
+        return ProvisionResult(project['key'], PARTIAL, error, time.perf_counter() - start)
+    logging.info("Project %s created", project['key'])
+    return ProvisionResult(project['key'], CREATED, elapsed=time.perf_counter() - start)
+
+
+def complete_project(project: dict, handler: SonarHandler) -> ProvisionResult:
+    """ Set the main branch of an existing project as in the manifest, never raising """
+    start = time.perf_counter()
+    try:
+        branches = handler.list_project_branches(project['key']) or []
+        main = next((b for b in branches if b.isMain), None)
+        if main is not None and main.name == project['main_branch']:
+            return ProvisionResult(project['key'], EXISTING, elapsed=time.perf_counter() - start)
+        handler.rename_main_branch(project['key'], project['main_branch'])
+    except Exception as error:  # pylint: disable=broad-except
+        logging.error("Unable to set the main branch of %s: %s", project['key'], error)
+        return ProvisionResult(project['key'], FAILED, error, time.perf_counter() - start)
+    logging.info("Main branch of project %s set to %s", project['key'], project['main_branch'])
+    return ProvisionResult(project['key'], UPDATED, elapsed=time.perf_counter() - start)
+
+
+def provision(projects: list[dict], handler: SonarHandler, workers: int = 1,
+              on_project: Optional[Callable[[ProvisionResult], None]] = None
+              ) -> list[ProvisionResult]:
+    """ Create the projects of a manifest missing from Sonar
+
+    The existing projects are listed once up front. Existing keys cost no request,
+    unless the manifest gives their main branch, which is then verified and set.
+
+    Args:
+        projects: Projects as read by load_manifest
+        handler: Sonar Connector
+        workers: Maximum number of projects created concurrently
+        on_project: Called with the result of each project as soon as it is known
+
+    Returns:
+        The result of every project, in manifest order
+    """
+    existing = {project.key for project in handler.iter_projects()}
+
+    def create(project: dict) -> ProvisionResult:
+        if project['key'] in existing and project.get('main_branch'):
+            result = complete_project(project, handler)
+        elif project['key'] in existing:
+            result = ProvisionResult(project['key'], EXISTING)
+        else:
+            result = provision_project(project, handler)
+        if on_project:
+            on_project(result)
+        return result
+
+    if workers <= 1:
+        return [create(project) for project in projects]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='provision') as executor:
+        return list(executor.map(create, projects))
+
+
+def summarize(results: list[ProvisionResult]) -> dict:
+    """ Count the results by status """
+    counter = Counter(result.status for result in results)
+    return {status: counter[status] for status in STATUSES}
+
+
+def provision_organization(args: Namespace) -> dict:
+    """ Provision the projects of a manifest in a single organization
+
+    Args:
+        args: Settings of the target, 'provision' names the manifest
+
+    Returns:
+        Report with the count of every status
+    """
+    projects = load_manifest(args.provision)
+    report = dict(summarize([]), error=None)
+
+    with SonarHandler(args) as sonar:
+        if not sonar.authenticated:
+            logging.warning('Authentication is not set')
+            report['error'] = 'Authentication is not set'
+            return report
+
+        try:
+            if getattr(args, 'dry_run', False):
+                existing = {project.key for project in sonar.iter_projects()}
+                missing = [p['key'] for p in projects if p['key'] not in existing]
+                logging.info("Provisioning plan: %s projects to create\n%s", len(missing),
+                             '\n'.join(f'  {key}' for key in missing))
+                report['skipped'] = len(projects) - len(missing)
+                return report
+            results = provision(projects, sonar, getattr(args, 'workers', None) or 1)
+        except SonarException as error:
+            logging.error("Unable to calculate Projects in %s", sonar.organization)
+            report['error'] = str(error)
+            return report
+
+        summary = summarize(results)
+        logging.info("Provisioning summary: %s", summary)
+        report.update(summary)
+
+    return report
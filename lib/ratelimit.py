@@ -0,0 +1,101 @@
+""" Adaptive Rate Limiting and Backoff """
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Iterator, Optional
+
+DEFAULT_RATE = 20.0
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF = 0.5
+MAX_BACKOFF = 30.0
+MIN_RATE = 0.5
+
+
+class RateLimiter:
+    """ Token bucket shared by every request, adapting its rate to throttling
+
+    The rate is halved whenever the server throttles and grows back slowly after
+    successful requests, converging to the highest sustainable rate.
+    """
+    def __init__(self, rate: float = DEFAULT_RATE, burst: Optional[float] = None):
+        """ Constructor
+
+        Args:
+            rate: Maximum requests per second
+            burst: Maximum requests sent at once, defaults to one second worth of requests
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst or max(rate, 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        """ Add the tokens accrued since the last update """
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """ Block until a request may be sent """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._resume_at and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._resume_at - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """ Slow down after the server throttled a request
+
+        Args:
+            retry_after: Seconds the server asked to wait before sending more requests
+        """
+        with self._lock:
+            self.rate = max(MIN_RATE, self.rate / 2)
+            self._tokens = min(self._tokens, 0)
+            if retry_after:
+                self._resume_at = max(self._resume_at, time.monotonic() + retry_after)
+
+    def on_success(self):
+        """ Speed up gradually after a successful request """
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + MIN_RATE / self.rate)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """ Seconds to wait according to a Retry-After header, either in seconds or as a date """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        # Dates in -0000 or without a zone are in UTC
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff(retries: int = DEFAULT_RETRIES, base: float = DEFAULT_BACKOFF,
+            cap: float = MAX_BACKOFF) -> Iterator[float]:
+    """ Delays of an exponential backoff with full jitter
+
+    Args:
+        retries: Number of delays to generate
+        base: Delay of the first retry
+        cap: Maximum delay
+    """
+    for attempt in range(retries):
+        yield random.uniform(0, min(cap, base * 2 ** attempt))
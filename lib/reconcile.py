@@ -0,0 +1,313 @@
+""" Reconciliation of Project Settings with a Desired State """
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+from lib.handler import SonarException, SonarHandler
+from lib.incremental import DEFAULT_FULL_SCAN_AGE
+from lib.remediation import (SUCCEEDED, UPDATE_VISIBILITY, Action, RemediationPlan, execute,
+                             summarize)
+from lib.response import Component
+from lib.rules import BRANCHES, PROJECT, ProjectBranchCompliant, Snapshot
+
+# Project keys searched per request
+SEARCH_BATCH = 100
+
+
+class Setting(ABC):
+    """ Parent Class for the settings reconciled with the desired state """
+    name = None
+    requires = (PROJECT,)
+
+    @abstractmethod
+    def current(self, snapshot: Snapshot):
+        """ Value of the setting in Sonar """
+
+    @abstractmethod
+    def actions(self, snapshot: Snapshot, desired) -> list[Action]:
+        """ Mutations setting the desired value """
+
+
+SETTINGS = {}
+
+
+def register_setting(setting: type[Setting]) -> type[Setting]:
+    """ Make a setting available to the desired state by its name """
+    SETTINGS[setting.name] = setting
+    return setting
+
+
+@register_setting
+class VisibilitySetting(Setting):
+    """ Public or private project """
+    name = 'visibility'
+
+    def current(self, snapshot: Snapshot):
+        return snapshot.project.visibility
+
+    def actions(self, snapshot: Snapshot, desired) -> list[Action]:
+        return [Action(snapshot.project.key, UPDATE_VISIBILITY, desired)]
+
+
+@register_setting
+class MainBranchSetting(Setting):
+    """ Name of the main branch """
+    name = 'main_branch'
+    requires = (PROJECT, BRANCHES)
+
+    def current(self, snapshot: Snapshot):
+        main = next((b for b in snapshot.branches if b.isMain), None)
+        return main.name if main else None
+
+    def actions(self, snapshot: Snapshot, desired) -> list[Action]:
+        rule = ProjectBranchCompliant(snapshot.project, snapshot.handler, snapshot.branches)
+        rule.default_branch = desired
+        return rule.remediation()
+
+
+def fingerprint(settings: dict) -> str:
+    """ Digest of the desired settings of a project """
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+
+def load_desired_state(path: str) -> dict[str, dict]:
+    """ Read the desired settings of every project
+
+    The file holds a JSON object with 'projects', mapping each project key to its
+    settings, and optional 'defaults' applied to every project. Settings are named
+    after SETTINGS.
+
+    Returns:
+        Desired settings by project key
+    """
+    with open(path, encoding='utf-8') as file:
+        data = json.load(file)
+
+    if not isinstance(data, dict) or not isinstance(data.get('projects'), dict):
+        raise ValueError(f'{path} must contain an object with the projects')
+    defaults = data.get('defaults') or {}
+    desired = {}
+    for key, settings in data['projects'].items():
+        settings = dict(defaults, **(settings or {}))
+        unknown = set(settings) - set(SETTINGS)
+        if unknown:
+            raise ValueError(f'Unknown settings {sorted(unknown)} of {key} in {path}')
+        desired[key] = settings
+    return desired
+
+
+class ReconcileState:
+    """ Fingerprint of the settings last applied to each project
+
+    A project whose desired settings did not change since they were applied or
+    verified is skipped without reading it, until the fingerprint gets older than
+    the maximum age and the project is verified again for drift.
+    """
+    def __init__(self, path: Optional[str] = None, projects: Optional[dict] = None):
+        """ Constructor
+
+        Args:
+            path: JSON file holding the state, kept in memory only when missing
+            projects: Fingerprint and verification time by project key
+        """
+        self.path = path
+        self.projects = projects or {}
+
+    @classmethod
+    def load(cls, path: Optional[str]) -> 'ReconcileState':
+        """ State stored by the previous run, empty on the first run """
+        if not path or not os.path.exists(path):
+            return cls(path)
+        try:
+            with open(path, encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError) as error:
+            logging.warning("Ignoring unreadable reconciliation state %s: %s", path, error)
+            return cls(path)
+        return cls(path, data.get('projects'))
+
+    def changed(self, project_key: str, digest: str,
+                max_age: float = DEFAULT_FULL_SCAN_AGE) -> bool:
+        """ Whether a project must be read and compared """
+        previous = self.projects.get(project_key)
+        return (previous is None
+                or previous.get('fingerprint') != digest
+                or time.time() - previous.get('verified_at', 0) > max_age)
+
+    def record(self, project_key: str, digest: str):
+        """ Remember a project matches its desired settings """
+        self.projects[project_key] = {'fingerprint': digest, 'verified_at': time.time()}
+
+    def forget(self, project_key: str):
+        """ Read the project again next time """
+        self.projects.pop(project_key, None)
+
+    def save(self):
+        """ Store the state for the next run """
+        if not self.path:
+            return
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump({'projects': self.projects}, file)
+        os.replace(temporary, self.path)
+
+
+class Reconciler:
+    """ Issues the mutations a project needs to match its desired settings, and no more
+
+    Settings already matching are left alone, and a project is only read when its
+    desired settings changed or were not verified recently. Steady-state runs read
+    nothing and write nothing.
+    """
+    def __init__(self, handler: SonarHandler, desired: dict[str, dict],
+                 state: Optional[ReconcileState] = None, max_age: float = DEFAULT_FULL_SCAN_AGE):
+        """ Constructor
+
+        Args:
+            handler: Sonar Connector
+            desired: Desired settings by project key
+            state: Fingerprints of the previous runs
+            max_age: Seconds after which a project is verified again
+        """
+        self.handler = handler
+        self.desired = desired
+        self.state = state or ReconcileState()
+        self.max_age = max_age
+        self.fingerprints = {key: fingerprint(settings) for key, settings in desired.items()}
+
+    def pending(self, forced: bool = False) -> list[str]:
+        """ Keys of the projects to read and compare
+
+        Args:
+            forced: Compare every project, ignoring the fingerprints
+        """
+        return [key for key in self.desired
+                if forced or self.state.changed(key, self.fingerprints[key], self.max_age)]
+
+    def fetch(self, keys: list[str]) -> Iterable[Component]:
+        """ Stream the components of the projects, searched in batches """
+        for index in range(0, len(keys), SEARCH_BATCH):
+            yield from self.handler.iter_projects(keys=keys[index:index + SEARCH_BATCH])
+
+    def diff(self, project: Component) -> list[Action]:
+        """ Mutations bringing a project to its desired settings """
+        desired = self.desired[project.key]
+        settings = [SETTINGS[name]() for name in desired]
+        resources = sorted({resource for setting in settings for resource in setting.requires})
+        snapshot = Snapshot(project, self.handler, resources)
+        actions = []
+        for setting in settings:
+            if setting.current(snapshot) != desired[setting.name]:
+                actions.extend(setting.actions(snapshot, desired[setting.name]))
+        return actions
+
+    def reconcile(self, workers: int = 1, forced: bool = False, dry_run: bool = False) -> dict:
+        """ Bring every project to its desired settings
+
+        Args:
+            workers: Maximum number of projects read and updated concurrently
+            forced: Compare every project, ignoring the fingerprints
+            dry_run: Only log the mutations
+
+        Returns:
+            Counts of the projects unchanged, in sync, updated, failed and missing
+        """
+        report = {'unchanged': 0, 'in_sync': 0, 'updated': 0, 'failed': 0, 'missing': 0,
+                  'mutations': {}}
+        pending = self.pending(forced)
+        report['unchanged'] = len(self.desired) - len(pending)
+        if not pending:
+            return report
+
+        def diff(project: Component):
+            try:
+                return project, self.diff(project), None
+            except Exception as error:  # pylint: disable=broad-except
+                logging.error("Unable to read %s: %s", project.key, error)
+                return project, None, error
+
+        plan = RemediationPlan()
+        found = set()
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='reconcile') \
+                as executor:
+            for project, actions, error in executor.map(diff, self.fetch(pending)):
+                found.add(project.key)
+                if error:
+                    report['failed'] += 1
+                elif actions:
+                    plan.add(actions)
+                else:
+                    report['in_sync'] += 1
+                    self.state.record(project.key, self.fingerprints[project.key])
+
+        for key in set(pending) - found:
+            logging.warning("Project %s of the desired state does not exist", key)
+            self.state.forget(key)
+            report['missing'] += 1
+
+        logging.info(plan.describe())
+        if dry_run or not len(plan):
+            return report
+
+        lock = threading.Lock()
+
+        def on_project(results):
+            project_key = results[0].action.project_key
+            with lock:
+                if all(result.status == SUCCEEDED for result in results):
+                    report['updated'] += 1
+                    self.state.record(project_key, self.fingerprints[project_key])
+                else:
+                    report['failed'] += 1
+                    self.state.forget(project_key)
+
+        report['mutations'] = summarize(execute(plan, self.handler, workers, on_project))
+        return report
+
+
+def reconcile_organization(args: Namespace) -> dict:
+    """ Reconcile the projects of a single organization with a desired-state file
+
+    Args:
+        args: Settings of the target, 'reconcile' names the desired-state file
+
+    Returns:
+        Report with the counts of the reconciliation
+    """
+    desired = load_desired_state(args.reconcile)
+    state = ReconcileState.load(getattr(args, 'reconcile_state', None))
+    max_age = getattr(args, 'full_scan_after', None) or DEFAULT_FULL_SCAN_AGE
+    report = {'error': None}
+
+    with SonarHandler(args) as sonar:
+        if not sonar.authenticated:
+            logging.warning('Authentication is not set')
+            report['error'] = 'Authentication is not set'
+            return report
+
+        reconciler = Reconciler(sonar, desired, state, max_age)
+        try:
+            report.update(reconciler.reconcile(getattr(args, 'workers', None) or 1,
+                                               getattr(args, 'full_scan', False),
+                                               getattr(args, 'dry_run', False)))
+        except SonarException as error:
+            logging.error("Unable to calculate Projects in %s", sonar.organization)
+            report['error'] = str(error)
+            return report
+        finally:
+            if not getattr(args, 'dry_run', False):
+                state.save()
+
+        logging.info("Reconciliation summary: %s", report)
+        metrics_file = getattr(args, 'metrics_file', None)
+        if metrics_file:
+            sonar.metrics.dump(metrics_file, getattr(args, 'metrics_format', 'json'))
+
+    return report
@@ -0,0 +1,231 @@
+""" Planned Remediation of Non-Compliant Projects """
+import logging
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
+
+from lib.handler import SonarHandler
+
+DELETE_BRANCH = 'delete_branch'
+RENAME_MAIN_BRANCH = 'rename_main_branch'
+UPDATE_VISIBILITY = 'update_visibility'
+
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+class Action:
+    """ Single mutation of a project """
+    def __init__(self, project_key: str, kind: str, branch: str):
+        """ Constructor
+
+        Args:
+            project_key: Key of the mutated project
+            kind: Name of the SonarHandler method applying the mutation
+            branch: Branch the mutation is about, or the value it sets
+        """
+        self.project_key = project_key
+        self.kind = kind
+        self.branch = branch
+
+    def __str__(self) -> str:
+        return f'{self.project_key}: {self.kind}({self.branch})'
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Action) and vars(self) == vars(other)
+
+    def __hash__(self) -> int:
+        return hash((self.project_key, self.kind, self.branch))
+
+    def apply(self, handler: SonarHandler):
+        """ Issue the mutation through the handler """
+        return getattr(handler, self.kind)(self.project_key, self.branch)
+
+
+class ActionResult:
+    """ Outcome of an Action """
+    def __init__(self, action: Action, status: str, error: Optional[Exception] = None,
+                 elapsed: float = 0.0):
+        self.action = action
+        self.status = status
+        self.error = error
+        self.elapsed = elapsed
+
+
+class RemediationPlan:
+    """ Ordered mutations grouped by project
+
+    Actions of a project run sequentially in the order they were added, while
+    different projects are independent from each other.
+    """
+    def __init__(self):
+        self._projects = {}
+
+    def __len__(self) -> int:
+        return sum(len(actions) for actions in self._projects.values())
+
+    def __iter__(self):
+        for actions in self._projects.values():
+            yield from actions
+
+    @property
+    def projects(self) -> list[str]:
+        """ Keys of the projects with pending actions """
+        return list(self._projects)
+
+    def add(self, actions: Iterable[Action]):
+        """ Append actions to the plan """
+        for action in actions:
+            self._projects.setdefault(action.project_key, []).append(action)
+
+    def actions(self, project_key: str) -> list[Action]:
+        """ Actions of a project, in execution order """
+        return list(self._projects.get(project_key, []))
+
+    def describe(self) -> str:
+        """ Human readable plan """
+        lines = [f'Remediation plan: {len(self)} actions over {len(self._projects)} projects']
+        lines.extend(f'  {action}' for action in self)
+        return '\n'.join(lines)
+
+
+def _apply_project(actions: list[Action], handler: SonarHandler) -> list[ActionResult]:
+    """ Apply the actions of a project, skipping the rest after a failure """
+    results = []
+    failed = False
+    for action in actions:
+        if failed:
+            results.append(ActionResult(action, SKIPPED))
+            continue
+        start = time.perf_counter()
+        try:
+            action.apply(handler)
+            results.append(ActionResult(action, SUCCEEDED, elapsed=time.perf_counter() - start))
+        except Exception as error:  # pylint: disable=broad-except
+            logging.error("Unable to apply %s: %s", action, error)
+            results.append(ActionResult(action, FAILED, error, time.perf_counter() - start))
+            failed = True
+    return results
+
+
+def execute(plan: RemediationPlan, handler: SonarHandler, workers: int = 1,
+            on_project: Optional[Callable[[list[ActionResult]], None]] = None,
+            admit: Optional[Callable[[list[Action]], bool]] = None) -> list[ActionResult]:
+    """ Apply a plan, running different projects concurrently
+
+    Args:
+        plan: Mutations to apply
+        handler: Sonar Connector
+        workers: Maximum number of projects remediated concurrently
+        on_project: Called with the results of each project as soon as it is remediated
+        admit: Decides whether the actions of a project start, skipping them otherwise
+
+    Returns:
+        The result of every action, in plan order
+    """
+    def remediate(actions: list[Action]) -> list[ActionResult]:
+        if admit and not admit(actions):
+            results = [ActionResult(action, SKIPPED) for action in actions]
+        else:
+            results = _apply_project(actions, handler)
+        if on_project:
+            on_project(results)
+        return results
+
+    groups = [plan.actions(project_key) for project_key in plan.projects]
+    if workers <= 1:
+        outcomes = [remediate(actions) for actions in groups]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='remediate') as executor:
+            outcomes = list(executor.map(remediate, groups))
+
+    return [result for outcome in outcomes for result in outcome]
+
+
+class Remediator:
+    """ Applies the actions of each project as soon as they are known
+
+    Projects run concurrently on a bounded pool, and submitting blocks while a window
+    of projects is in flight, so projects are remediated while later ones are still
+    audited and only counters are kept about the finished ones.
+    """
+    def __init__(self, handler: SonarHandler, workers: int = 1,
+                 admit: Optional[Callable[[list[Action]], bool]] = None):
+        """ Constructor
+
+        Args:
+            handler: Sonar Connector
+            workers: Maximum number of projects remediated concurrently
+            admit: Decides whether the actions of a project start, skipping them otherwise
+        """
+        self.handler = handler
+        self.admit = admit
+        self.window = workers * 2
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='remediate') \
+            if workers > 1 else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, val, tra):
+        self.close()
+
+    def _remediate(self, actions: list[Action],
+                   on_project: Optional[Callable[[list[ActionResult]], None]]):
+        """ Apply the actions of a project and report them """
+        if self.admit and not self.admit(actions):
+            results = [ActionResult(action, SKIPPED) for action in actions]
+        else:
+            results = _apply_project(actions, self.handler)
+        with self._lock:
+            self.counts.update((r.action.kind, r.status) for r in results)
+        if on_project:
+            on_project(results)
+
+    def submit(self, actions: list[Action],
+               on_project: Optional[Callable[[list[ActionResult]], None]] = None):
+        """ Remediate a project, waiting for the oldest one when the window is full
+
+        Args:
+            actions: Actions of a single project, in execution order
+            on_project: Called with the results of the project once remediated
+        """
+        if not actions:
+            return
+        if self._executor is None:
+            self._remediate(actions, on_project)
+            return
+        if len(self._pending) >= self.window:
+            self._pending.popleft().result()
+        self._pending.append(self._executor.submit(self._remediate, actions, on_project))
+
+    def close(self):
+        """ Wait for every submitted project """
+        while self._pending:
+            self._pending.popleft().result()
+        if self._executor:
+            self._executor.shutdown()
+
+    def summary(self) -> dict:
+        """ Count of the applied actions by kind and status """
+        with self._lock:
+            return _summary(self.counts)
+
+
+def summarize(results: Iterable[ActionResult]) -> dict:
+    """ Count the results by action kind and status """
+    return _summary(Counter((r.action.kind, r.status) for r in results))
+
+
+def _summary(counter: Counter) -> dict:
+    """ Counts by action kind and status, as nested dictionaries """
+    summary = {}
+    for (kind, status), count in sorted(counter.items()):
+        summary.setdefault(kind, {SUCCEEDED: 0, FAILED: 0, SKIPPED: 0})[status] = count
+    return summary
@@ -0,0 +1,99 @@
+""" Streaming Per-Project Report and Action Outputs """
+import csv
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+REPORT_FORMATS = ('jsonl', 'csv')
+REPORT_FIELDS = ('project', 'main_branch', 'compliant', 'violations', 'action', 'status',
+                 'error', 'audit_seconds', 'remediation_seconds')
+OUTPUTS = ('audited', 'compliant', 'non_compliant', 'failed', 'unchanged', 'skipped', 'deferred')
+DEFAULT_FLUSH_EVERY = 100
+DEFAULT_FLUSH_INTERVAL = 5.0
+
+
+class ReportSink:
+    """ Appends one record per project to a JSONL or CSV file as soon as it is known
+
+    Nothing is kept in memory besides the file buffer, which is flushed every few
+    records or seconds so downstream tooling can follow the file while it grows.
+    """
+    def __init__(self, path: str, fmt: str = 'jsonl', flush_every: int = DEFAULT_FLUSH_EVERY,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        """ Constructor
+
+        Args:
+            path: File the records are written to, truncated
+            fmt: One of REPORT_FORMATS
+            flush_every: Records written between flushes
+            flush_interval: Maximum seconds between flushes
+        """
+        if fmt not in REPORT_FORMATS:
+            raise ValueError(f'Unknown report format {fmt}')
+        self.path = path
+        self.fmt = fmt
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.written = 0
+        self._lock = threading.Lock()
+        self._file = open(path, 'w', encoding='utf-8', newline='')  # pylint: disable=consider-using-with
+        self._writer = None
+        if fmt == 'csv':
+            self._writer = csv.DictWriter(self._file, REPORT_FIELDS)
+            self._writer.writeheader()
+        self._flushed = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write(self, **fields):
+        """ Append the record of a project, missing fields are left empty """
+        record = {field: fields.get(field) for field in REPORT_FIELDS}
+        if record['violations'] is not None:
+            record['violations'] = ';'.join(record['violations'])
+        if record['error'] is not None:
+            record['error'] = str(record['error'])
+        for timing in ('audit_seconds', 'remediation_seconds'):
+            if record[timing] is not None:
+                record[timing] = round(record[timing], 4)
+
+        with self._lock:
+            if self._writer:
+                self._writer.writerow(record)
+            else:
+                self._file.write(json.dumps(record) + '\n')
+            self.written += 1
+            now = time.monotonic()
+            if not self.written % self.flush_every or now - self._flushed >= self.flush_interval:
+                self._file.flush()
+                self._flushed = now
+
+    def close(self):
+        """ Flush and close the file """
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def publish_outputs(report: dict, path: Optional[str] = None) -> bool:
+    """ Publish the summary counts as GitHub Action outputs
+
+    Args:
+        report: Report of a target or totals of several targets
+        path: File collecting the outputs, defaults to $GITHUB_OUTPUT
+
+    Returns:
+        Whether the outputs were written, only within a GitHub workflow
+    """
+    path = path or os.environ.get('GITHUB_OUTPUT')
+    if not path:
+        return False
+    with open(path, 'a', encoding='utf-8') as file:
+        for output in OUTPUTS:
+            file.write(f'{output}={report.get(output, 0)}\n')
+    return True
@@ -1,20 +1,34 @@
 """ Defines the Business Rules for the Projects """
+import hashlib
+import json
 import logging
+import time
+from abc import ABC, abstractmethod
+from typing import Iterable, Optional
 
 from lib.handler import SonarHandler
+from lib.inventory import to_timestamp
+from lib.remediation import DELETE_BRANCH, RENAME_MAIN_BRANCH, Action
 from lib.response import Component
 
 DEFAULT_BRANCH = 'main'
+DEFAULT_VISIBILITY = 'private'
+STALE_BRANCH_AGE = 90 * 24 * 3600
+
+# Data a rule may require about a project
+PROJECT = 'project'
+BRANCHES = 'branches'
 
 
 class ProjectBranchCompliant:
     """ Rules for a project branch configuration """
-    def __init__(self, project: Component, handler: SonarHandler):
+    def __init__(self, project: Component, handler: SonarHandler, branches=None):
         """ Constructor
 
         Args:
             project: Sonar Component
             handler: Sonar Connector
+            branches: Branches of the project when already retrieved
         """
         self.project = project
         self.handler = handler
@@ -22,7 +36,13 @@ class ProjectBranchCompliant:
 
         # Initialize branches
         project_key = self.project.key
-        self.branches = self.handler.list_project_branches(project_key)
+        if branches is None:
+            branches = self.handler.list_project_branches(project_key)
+        self.branches = branches or []
+
+        # Index the branches once so rules do not rescan them
+        self.branches_by_name = {b.name: b for b in self.branches}
+        self.main_branch = next((b for b in self.branches if b.isMain), None)
 
     @property
     def is_branch_compliant(self) -> bool:
@@ -31,13 +51,180 @@ class ProjectBranchCompliant:
         Args:
             self (Branch): List of Sonar Branch Properties
         """
-        return any(b.name == self.default_branch and b.isMain for b in self.branches)
+        return self.main_branch is not None and self.main_branch.name == self.default_branch
+
+    def remediation(self) -> list[Action]:
+        """ Mutations setting the default branch, in the order they must be applied """
+        actions = []
+        project_key = self.project.key
+        # Verify it there's a conflict with an existing main branch
+        conflict = self.branches_by_name.get(self.default_branch)
+        if conflict is not None and not conflict.isMain:
+            actions.append(Action(project_key, DELETE_BRANCH, self.default_branch))
+        actions.append(Action(project_key, RENAME_MAIN_BRANCH, self.default_branch))
+        return actions
 
     def set_main_branch(self):
         """ Sets the default branch """
-        # Verify it there's a conflict with an existing main branch
-        project_key = self.project.key
-        if any(b.name == DEFAULT_BRANCH and not b.isMain for b in self.branches):
-            logging.info("Deleting already existing main branch")
-            self.handler.delete_branch(project_key, self.default_branch)
-        self.handler.rename_main_branch(project_key, self.default_branch)
+        for action in self.remediation():
+            if action.kind == DELETE_BRANCH:
+                logging.info("Deleting already existing main branch")
+            action.apply(self.handler)
+
+
+class Snapshot:
+    """ Data of a project retrieved once and shared by every rule """
+    def __init__(self, project: Component, handler: SonarHandler, resources: Iterable[str]):
+        """ Constructor
+
+        Args:
+            project: Sonar Component
+            handler: Sonar Connector
+            resources: Data required by the rules, fetched once each
+        """
+        self.project = project
+        self.handler = handler
+        self.branches = None
+        self._branch_compliance = None
+        for resource in resources:
+            fetcher = FETCHERS.get(resource)
+            if fetcher:
+                setattr(self, resource, fetcher(project, handler))
+
+    @property
+    def branch_compliance(self) -> Optional[ProjectBranchCompliant]:
+        """ Branch configuration of the project, indexed once for every rule """
+        if self._branch_compliance is None and self.branches is not None:
+            self._branch_compliance = ProjectBranchCompliant(self.project, self.handler,
+                                                             self.branches)
+        return self._branch_compliance
+
+
+# Only the branches are fetched, no rule needs the settings of the projects yet
+FETCHERS = {
+    BRANCHES: lambda project, handler: handler.list_project_branches(project.key) or [],
+}
+
+
+class Rule(ABC):
+    """ Parent Class for all compliance rules """
+    name = None
+    requires = (PROJECT,)
+
+    @abstractmethod
+    def check(self, snapshot: Snapshot) -> bool:
+        """ Whether the project complies with the rule """
+
+    def remediation(self, snapshot: Snapshot) -> list[Action]:  # pylint: disable=unused-argument
+        """ Mutations making the project compliant, none when the rule only reports """
+        return []
+
+
+RULES = {}
+
+
+def register_rule(rule: type[Rule]) -> type[Rule]:
+    """ Make a rule available to the engine by its name """
+    RULES[rule.name] = rule
+    return rule
+
+
+@register_rule
+class MainBranchRule(Rule):
+    """ The main branch of a project is named after DEFAULT_BRANCH """
+    name = 'main_branch'
+    requires = (PROJECT, BRANCHES)
+
+    def check(self, snapshot: Snapshot) -> bool:
+        return snapshot.branch_compliance.is_branch_compliant
+
+    def remediation(self, snapshot: Snapshot) -> list[Action]:
+        return snapshot.branch_compliance.remediation()
+
+
+@register_rule
+class VisibilityRule(Rule):
+    """ Projects are not publicly visible """
+    name = 'visibility'
+    requires = (PROJECT,)
+
+    def check(self, snapshot: Snapshot) -> bool:
+        return snapshot.project.visibility in (None, DEFAULT_VISIBILITY)
+
+
+@register_rule
+class StaleBranchesRule(Rule):
+    """ Projects do not keep branches without recent analyses """
+    name = 'stale_branches'
+    requires = (PROJECT, BRANCHES)
+
+    def __init__(self, max_age: float = STALE_BRANCH_AGE):
+        self.max_age = max_age
+
+    def check(self, snapshot: Snapshot) -> bool:
+        threshold = time.time() - self.max_age
+        for branch in snapshot.branches:
+            analyzed = to_timestamp(branch.analysisDate)
+            if not branch.isMain and analyzed is not None and analyzed < threshold:
+                return False
+        return True
+
+
+def load_rules(rules: Optional[Iterable] = None) -> list[Rule]:
+    """ Rule instances out of rule names or instances, defaults to the main branch rule """
+    return [RULES[rule]() if isinstance(rule, str) else rule
+            for rule in (rules or [MainBranchRule.name])]
+
+
+def fingerprint(rules: Iterable[Rule]) -> str:
+    """ Digest of the rules and their parameters, telling when earlier verdicts are stale """
+    rules = sorted([rule.name, vars(rule)] for rule in rules)
+    return hashlib.sha256(json.dumps(rules, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class Evaluation:
+    """ Outcome of every rule over a project """
+    def __init__(self, snapshot: Snapshot, violations: list[str], actions: list[Action]):
+        self.snapshot = snapshot
+        self.violations = violations
+        self.actions = actions
+
+    @property
+    def compliant(self) -> bool:
+        """ Getter """
+        return not self.violations
+
+
+class RuleEngine:
+    """ Runs every registered rule over a single snapshot of each project
+
+    The data required by all the rules is fetched once per project, so the number
+    of calls grows with the projects and not with the rules.
+    """
+    def __init__(self, handler: SonarHandler, rules: Optional[Iterable] = None):
+        """ Constructor
+
+        Args:
+            handler: Sonar Connector
+            rules: Rule names or instances, defaults to the main branch rule
+        """
+        self.handler = handler
+        self.rules = load_rules(rules)
+        self.requires = sorted({resource for rule in self.rules for resource in rule.requires})
+
+    def evaluate(self, project: Component, snapshot: Optional[Snapshot] = None) -> Evaluation:
+        """ Check a project against every rule
+
+        Args:
+            project: Sonar Component
+            snapshot: Data already retrieved for the project, fetched when missing
+        """
+        snapshot = snapshot or Snapshot(project, self.handler, self.requires)
+        violations = []
+        actions = []
+        for rule in self.rules:
+            if rule.check(snapshot):
+                continue
+            violations.append(rule.name)
+            actions.extend(rule.remediation(snapshot))
+        return Evaluation(snapshot, violations, actions)
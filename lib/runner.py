@@ -0,0 +1,252 @@
+""" Audit and Remediation of a Single Sonar Organization """
+import logging
+import time
+from argparse import Namespace
+from contextlib import nullcontext
+from functools import partial
+from typing import Optional
+
+from lib.audit import DEFAULT_WORKERS, AuditResult, audit_projects
+from lib.checkpoint import DEFAULT_CHECKPOINT_INTERVAL, Checkpoint
+from lib.handler import SonarHandler, SonarException
+from lib.incremental import DEFAULT_FULL_SCAN_AGE, AuditState
+from lib.inventory import Inventory
+from lib.profiling import DEFAULT_PROFILE_DIR, Profiler
+from lib.remediation import SUCCEEDED, ActionResult, RemediationPlan, Remediator
+from lib.report import ReportSink
+from lib.rules import RuleEngine, fingerprint, load_rules
+from lib.scheduler import Scheduler
+
+
+def new_report(args: Namespace) -> dict:
+    """ Empty report of a target """
+    organization = getattr(args, 'organization', None)
+    return {
+        'platform': getattr(args, 'platform', None),
+        'organization': organization[-1] if isinstance(organization, list) else organization,
+        'host': getattr(args, 'host', None),
+        'port': getattr(args, 'port', None),
+        'audited': 0,
+        'compliant': 0,
+        'non_compliant': 0,
+        'failed': 0,
+        'unchanged': 0,
+        'resumed': 0,
+        'skipped': 0,
+        'deferred': 0,
+        'violations': {},
+        'remediation': {},
+        'error': None,
+    }
+
+
+def report_remediation(sink: ReportSink, results: list[ActionResult],
+                       audit: Optional[AuditResult] = None):
+    """ Write the record of a remediated project
+
+    Args:
+        sink: Per-project report
+        results: Results of the actions of a single project
+        audit: Audit that planned the actions, None when resumed from a checkpoint
+    """
+    project_key = results[0].action.project_key
+    main_branch, violations, elapsed = (audit.main_branch, audit.violations, audit.elapsed) \
+        if audit else (None, None, None)
+    failure = next((r for r in results if r.status != SUCCEEDED), None)
+    sink.write(project=project_key, main_branch=main_branch, compliant=failure is None,
+               violations=violations, action=';'.join(r.action.kind for r in results),
+               status=failure.status if failure else SUCCEEDED,
+               error=failure.error if failure else None, audit_seconds=elapsed,
+               remediation_seconds=sum(r.elapsed for r in results))
+
+
+def audit_organization(args: Namespace) -> dict:
+    """ Audit every project of an organization and remediate the non-compliant ones
+
+    Args:
+        args: Settings of the target and the run
+
+    Returns:
+        Report with the compliance and remediation counts of the target
+    """
+    started = time.monotonic()
+    report = new_report(args)
+    workers = getattr(args, 'workers', DEFAULT_WORKERS)
+
+    # Incremental audits only look at the projects analyzed since the previous run
+    state = None
+    if getattr(args, 'state_file', None):
+        state = AuditState.load(args.state_file)
+        max_age = getattr(args, 'full_scan_after', None) or DEFAULT_FULL_SCAN_AGE
+        rules = fingerprint(load_rules(getattr(args, 'rules', None)))
+        if state.needs_full_scan(getattr(args, 'full_scan', False), max_age, rules):
+            logging.info("Auditing every project")
+
+    report_file = getattr(args, 'report_file', None)
+    sink = ReportSink(report_file, getattr(args, 'report_format', None) or 'jsonl') \
+        if report_file else None
+    dry_run = getattr(args, 'dry_run', False)
+
+    # Checkpoints let an interrupted run be resumed without repeating finished work
+    checkpoint = None
+    checkpoint_file = getattr(args, 'checkpoint_file', None)
+    if checkpoint_file:
+        interval = getattr(args, 'checkpoint_interval', None) or DEFAULT_CHECKPOINT_INTERVAL
+        checkpoint = Checkpoint.load(checkpoint_file, interval) \
+            if getattr(args, 'resume', False) else Checkpoint.start(checkpoint_file, interval)
+
+    # Profiling instruments nothing unless requested
+    profiler = None
+    if getattr(args, 'profile', False):
+        profiler = Profiler(getattr(args, 'profile_dir', None) or DEFAULT_PROFILE_DIR,
+                            getattr(args, 'profile_cpu', False), getattr(args, 'profile_memory', False))
+    phase = profiler.phase if profiler else lambda name: nullcontext()
+
+    with phase('auth'):
+        sonar = SonarHandler(args)
+    with sonar, sink or nullcontext(), checkpoint or nullcontext(), \
+            profiler or nullcontext():
+        if profiler:
+            profiler.instrument(sonar)
+
+        # Search for project
+        if not sonar.authenticated:
+            logging.warning('Authentication is not set')
+            report['error'] = 'Authentication is not set'
+            return report
+
+        # A resumed run lists the projects from its checkpoint onwards
+        start = checkpoint.cursor if checkpoint else 0
+        try:
+            projects = sonar.iter_projects(start)
+        except SonarException as error:
+            logging.error("Unable to calculate Projects in %s", sonar.organization)
+            report['error'] = str(error)
+            return report
+
+        # Non-compliant projects are remediated while the next ones are audited, a dry run
+        # only collects the plan
+        plan = RemediationPlan() if dry_run else None
+        pending = RemediationPlan()
+        if checkpoint:
+            projects = checkpoint.select(projects)
+            pending.add(checkpoint.pending())
+
+        if state:
+            projects = state.select(projects, checkpoint.record_skipped if checkpoint else None)
+
+        # With a time budget the most valuable projects go first and nothing starts too late
+        scheduler = None
+        budget = getattr(args, 'time_budget', None)
+        if budget:
+            scheduler = Scheduler(budget - (time.monotonic() - started), sonar.metrics, workers,
+                                  getattr(args, 'priority', None) or 'non_compliant', state,
+                                  remediation=not dry_run)
+            scheduler.plan(pending)
+            projects = scheduler.schedule(projects)
+
+        # The projects and branches seen by the audit, exported once it is over
+        inventory_file = getattr(args, 'inventory_file', None)
+        inventory = Inventory() if inventory_file else None
+
+        def on_project(audit, results):
+            if checkpoint:
+                checkpoint.record_results(results)
+            if state and all(r.status == SUCCEEDED for r in results):
+                state.mark_compliant(results[0].action.project_key)
+            if sink:
+                report_remediation(sink, results, audit)
+
+        remediator = None if dry_run else Remediator(
+            sonar, workers, scheduler.admits_remediation if scheduler else None)
+        with remediator or nullcontext():
+            with phase('audit'):
+                for project_key in pending.projects:
+                    if remediator:
+                        remediator.submit(pending.actions(project_key), partial(on_project, None))
+                    else:
+                        plan.add(pending.actions(project_key))
+
+                engine = RuleEngine(sonar, getattr(args, 'rules', None))
+                for audit in audit_projects(projects, sonar, workers, inventory, engine):
+                    report['audited'] += 1
+                    if scheduler:
+                        scheduler.observe(audit)
+                    if audit.failed:
+                        report['failed'] += 1
+                        if sink:
+                            sink.write(project=audit.project.key, error=audit.error,
+                                       audit_seconds=audit.elapsed)
+                        continue
+                    if state:
+                        state.record(audit.project, audit.compliant)
+                    if checkpoint:
+                        checkpoint.record_audit(audit.project.key, audit.actions)
+                    if audit.compliant:
+                        report['compliant'] += 1
+                        if sink:
+                            sink.write(project=audit.project.key, main_branch=audit.main_branch,
+                                       compliant=True, audit_seconds=audit.elapsed)
+                        continue
+                    report['non_compliant'] += 1
+                    for violation in audit.violations:
+                        report['violations'][violation] = report['violations'].get(violation, 0) + 1
+                    logging.info('Project %s is not compliant with %s, planning settings',
+                                 audit.project.key, ', '.join(audit.violations))
+                    if sink and (dry_run or not audit.actions):
+                        sink.write(project=audit.project.key, main_branch=audit.main_branch,
+                                   compliant=False, violations=audit.violations,
+                                   action=';'.join(a.kind for a in audit.actions),
+                                   status='planned' if audit.actions else None,
+                                   audit_seconds=audit.elapsed)
+                    if remediator:
+                        # Its row of the report is written once remediated
+                        remediator.submit(audit.actions, partial(on_project, audit))
+                    else:
+                        plan.add(audit.actions)
+
+            if remediator:
+                # Projects audited last may still be remediated
+                with phase('remediation'):
+                    remediator.close()
+
+        if inventory is not None:
+            inventory.dump(inventory_file)
+            logging.info("Inventory of %s projects written to %s", len(inventory), inventory_file)
+        if checkpoint:
+            report['resumed'] = checkpoint.resumed
+        if scheduler:
+            report['skipped'] = len(scheduler.skipped)
+            if sink:
+                for project_key in scheduler.skipped:
+                    sink.write(project=project_key, status='skipped')
+
+        if dry_run:
+            logging.info(plan.describe())
+        else:
+            report['remediation'] = remediator.summary()
+            logging.info("Remediation summary: %s", report['remediation'])
+            if scheduler and scheduler.deferred:
+                report['deferred'] = len(scheduler.deferred)
+                logging.warning("Time budget exhausted, remediation of %s projects deferred",
+                                report['deferred'])
+
+        if state:
+            report['unchanged'] = state.unchanged
+            # Projects before the start or resumed from the checkpoint were not seen
+            state.save(complete=not start and not report['resumed'])
+            logging.info("%s projects unchanged since the previous audit", state.unchanged)
+
+        sonar.transport.log_stats()
+        metrics_file = getattr(args, 'metrics_file', None)
+        if metrics_file:
+            sonar.metrics.dump(metrics_file, getattr(args, 'metrics_format', 'json'))
+
+        if not report['audited'] and not report['unchanged'] and not report['resumed']:
+            logging.error("No projects where found for %s organization", sonar.organization)
+
+        # Work left out by the time budget is picked up by resuming
+        if checkpoint and not (scheduler and scheduler.exhausted):
+            checkpoint.finish()
+
+    return report
@@ -0,0 +1,160 @@
+""" Deadline-Aware Scheduling of Audits and Remediation """
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Iterable, Iterator, Optional
+
+from lib.audit import AuditResult
+from lib.incremental import AuditState
+from lib.inventory import to_timestamp
+from lib.metrics import Metrics
+from lib.remediation import DELETE_BRANCH, RENAME_MAIN_BRANCH, UPDATE_VISIBILITY, Action
+from lib.response import Component
+
+PRIORITIES = ('non_compliant', 'recent')
+# Seconds of the budget kept for logging out, dumping metrics and reports
+DEFAULT_RESERVE = 30.0
+# Cost of a call before any latency is observed
+DEFAULT_CALL_COST = 0.5
+# Audits queued per worker by audit_projects ahead of the one being admitted
+QUEUED_AUDITS = 2
+# Weight of the latest audit in the running estimate of the audit cost
+SMOOTHING = 0.2
+MUTATION_ENDPOINTS = {
+    DELETE_BRANCH: 'project_branches.delete_project_branch',
+    RENAME_MAIN_BRANCH: 'project_branches.rename_project_branch',
+    UPDATE_VISIBILITY: 'projects.update_project_visibility',
+}
+
+
+class Deadline:
+    """ Time left out of a budget """
+    def __init__(self, budget: float, reserve: float = DEFAULT_RESERVE):
+        """ Constructor
+
+        Args:
+            budget: Seconds the run may last, starting now
+            reserve: Seconds kept at the end of the budget
+        """
+        self.budget = budget
+        self.reserve = min(reserve, budget / 10)
+        self.started = time.monotonic()
+
+    def remaining(self) -> float:
+        """ Seconds left to start new work """
+        return self.started + self.budget - self.reserve - time.monotonic()
+
+
+class Scheduler:
+    """ Orders the projects by value and stops starting work that cannot end in time
+
+    The listing is read completely so the most valuable projects are audited first.
+    A project is only audited while the estimated time of the audits already queued
+    plus the remediation already planned fits in the remaining budget, and a project
+    is only remediated while its own mutations fit. Work already started always ends.
+    """
+    def __init__(self, budget: float, metrics: Metrics, workers: int = 1,
+                 priority: str = 'non_compliant', state: Optional[AuditState] = None,
+                 reserve: float = DEFAULT_RESERVE, remediation: bool = True):
+        """ Constructor
+
+        Args:
+            budget: Seconds the run may last, starting now
+            metrics: Latencies observed by the handler
+            workers: Number of concurrent audits and remediations
+            priority: One of PRIORITIES
+            state: Previous audits, telling which projects were not compliant
+            reserve: Seconds kept at the end of the budget
+            remediation: Whether the planned actions are applied, so their time is reserved
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f'Unknown priority {priority}')
+        self.deadline = Deadline(budget, reserve)
+        self.metrics = metrics
+        self.workers = max(1, workers)
+        self.priority = priority
+        self.state = state
+        self.remediation = remediation
+        self.audit_cost = None
+        self.planned = Counter()
+        self.skipped = []
+        self.deferred = []
+        self._lock = threading.Lock()
+
+    @property
+    def exhausted(self) -> bool:
+        """ Whether any work was left out """
+        return bool(self.skipped or self.deferred)
+
+    def _rank(self, project: Component) -> tuple:
+        """ Sort key, lowest first """
+        analyzed = to_timestamp(project.lastAnalysisDate) or 0.0
+        if self.priority == 'recent':
+            return (-analyzed,)
+        previous = self.state.projects.get(project.key) if self.state else None
+        # Known violations first, then never audited projects, then compliant ones
+        standing = 1 if previous is None else 2 if previous.get('compliant') else 0
+        return standing, -analyzed
+
+    def order(self, projects: Iterable[Component]) -> list[Component]:
+        """ Projects by decreasing value """
+        return sorted(projects, key=self._rank)
+
+    def call_cost(self, endpoint: Optional[str] = None) -> float:
+        """ Mean latency of an endpoint, or of every endpoint when unknown """
+        return self.metrics.mean(endpoint) or self.metrics.mean() or DEFAULT_CALL_COST
+
+    def mutation_cost(self, actions: Iterable[Action]) -> float:
+        """ Estimated seconds to apply actions one after another """
+        return sum(self.call_cost(MUTATION_ENDPOINTS.get(a.kind)) for a in actions)
+
+    def remediation_cost(self) -> float:
+        """ Estimated seconds to apply every planned action """
+        with self._lock:
+            planned = [(kind, count) for kind, count in self.planned.items() if count > 0]
+        serial = sum(count * self.call_cost(MUTATION_ENDPOINTS.get(kind))
+                     for kind, count in planned)
+        return serial / self.workers
+
+    def admits_audit(self) -> bool:
+        """ Whether one more audit, behind the queued ones, ends in time """
+        cost = (QUEUED_AUDITS + 1) * (self.audit_cost or self.call_cost())
+        return self.deadline.remaining() > cost + self.remediation_cost()
+
+    def schedule(self, projects: Iterable[Component]) -> Iterator[Component]:
+        """ Stream the projects by decreasing value until the budget runs out """
+        ordered = self.order(projects)
+        for index, project in enumerate(ordered):
+            if not self.admits_audit():
+                self.skipped.extend(p.key for p in ordered[index:])
+                logging.warning("Time budget exhausted, %s projects left unaudited",
+                                len(self.skipped))
+                return
+            yield project
+
+    def observe(self, audit: AuditResult):
+        """ Refine the estimates with a finished audit """
+        with self._lock:
+            if audit.elapsed is not None:
+                self.audit_cost = audit.elapsed if self.audit_cost is None else \
+                    SMOOTHING * audit.elapsed + (1 - SMOOTHING) * self.audit_cost
+        if not audit.failed and not audit.compliant:
+            self.plan(audit.actions)
+
+    def plan(self, actions: Iterable[Action]):
+        """ Account for actions waiting for remediation, none on a dry run """
+        if not self.remediation:
+            return
+        with self._lock:
+            self.planned.update(action.kind for action in actions)
+
+    def admits_remediation(self, actions: list[Action]) -> bool:
+        """ Whether the actions of a project end in time, deferring them otherwise """
+        with self._lock:
+            self.planned.subtract(action.kind for action in actions)
+        if self.deadline.remaining() > self.mutation_cost(actions):
+            return True
+        with self._lock:
+            self.deferred.append(actions[0].project_key)
+        return False
@@ -0,0 +1,129 @@
+""" Sharded Audit of Several Organizations and Instances """
+import json
+import logging
+import os
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from lib.logs import collect_worker_logging, forward_logging
+from lib.runner import audit_organization, new_report
+
+TARGET_FIELDS = ('platform', 'organization', 'host', 'port')
+COUNTERS = ('audited', 'compliant', 'non_compliant', 'failed', 'unchanged', 'resumed',
+            'skipped', 'deferred')
+
+
+def load_targets(path: str) -> list[dict]:
+    """ Read the list of targets to audit
+
+    The file holds a JSON list of objects with a 'platform' and, depending on it,
+    an 'organization' or a 'host' and 'port'. An optional 'token_env' names the
+    environment variable holding the token of the target instead of SONAR_TOKEN.
+    """
+    with open(path, encoding='utf-8') as file:
+        targets = json.load(file)
+
+    if not isinstance(targets, list) or not all(isinstance(t, dict) for t in targets):
+        raise ValueError(f'{path} must contain a list of targets')
+    for target in targets:
+        if 'platform' not in target:
+            raise ValueError(f'Target without platform in {path}: {target}')
+    return targets
+
+
+def target_settings(target: dict, args: Namespace, workers: int, index: int) -> Namespace:
+    """ Settings of a single target, inheriting the run settings """
+    settings = Namespace(**vars(args))
+    for field in TARGET_FIELDS:
+        setattr(settings, field, target.get(field))
+    settings.token_env = target.get('token_env')
+    settings.workers = workers
+    # Keep the per-target files apart
+    for option in ('metrics_file', 'state_file', 'report_file', 'checkpoint_file',
+                   'profile_dir', 'record', 'replay', 'inventory_file'):
+        if getattr(settings, option, None):
+            setattr(settings, option, f'{getattr(settings, option)}.{index}')
+    return settings
+
+
+def audit_target(settings: Namespace) -> dict:
+    """ Audit a target in a worker process, never raising """
+    # Worker processes are reused, the token of a target must not leak to the next one
+    token = os.environ.get('SONAR_TOKEN')
+    try:
+        if settings.token_env:
+            os.environ['SONAR_TOKEN'] = os.environ.get(settings.token_env, '')
+        return audit_organization(settings)
+    except Exception as error:  # pylint: disable=broad-except
+        logging.error("Unable to audit %s %s: %s", settings.platform,
+                      settings.organization or settings.host, error)
+        report = new_report(settings)
+        report['error'] = str(error)
+        return report
+    finally:
+        if token is None:
+            os.environ.pop('SONAR_TOKEN', None)
+        else:
+            os.environ['SONAR_TOKEN'] = token
+
+
+def merge_reports(reports: list[dict]) -> dict:
+    """ Single report out of the reports of every target """
+    totals = {counter: sum(r[counter] for r in reports) for counter in COUNTERS}
+    totals['errors'] = sum(1 for r in reports if r['error'])
+
+    violations = {}
+    remediation = {}
+    for report in reports:
+        for rule, count in report['violations'].items():
+            violations[rule] = violations.get(rule, 0) + count
+        for kind, statuses in report['remediation'].items():
+            merged = remediation.setdefault(kind, {})
+            for status, count in statuses.items():
+                merged[status] = merged.get(status, 0) + count
+    totals['violations'] = violations
+    totals['remediation'] = remediation
+
+    return {'targets': reports, 'totals': totals}
+
+
+def run_targets(targets: list[dict], args: Namespace, processes: Optional[int] = None,
+                total_workers: Optional[int] = None) -> dict:
+    """ Shard the targets across a pool of processes, one SonarHandler per target
+
+    Args:
+        targets: Targets as read by load_targets
+        args: Settings shared by every target
+        processes: Size of the process pool, defaults to the number of CPUs
+        total_workers: Concurrent audits across every process, defaults to the workers of each target
+
+    Returns:
+        Merged report of every target, in the order of the targets
+    """
+    processes = max(1, min(processes or os.cpu_count() or 1, len(targets) or 1))
+    if total_workers:
+        # Every process runs at least one worker
+        processes = min(processes, total_workers)
+    workers = max(1, total_workers // processes) if total_workers else args.workers
+    shards = [target_settings(t, args, workers, i) for i, t in enumerate(targets)]
+
+    # Workers log through this process, so records go to the same handlers, async or not
+    records, listener = collect_worker_logging()
+    try:
+        with ProcessPoolExecutor(max_workers=processes, initializer=forward_logging,
+                                 initargs=(records,)) as executor:
+            futures = [executor.submit(audit_target, settings) for settings in shards]
+            reports = []
+            for settings, future in zip(shards, futures):
+                try:
+                    reports.append(future.result())
+                except Exception as error:  # pylint: disable=broad-except
+                    # The worker process itself died
+                    report = new_report(settings)
+                    report['error'] = str(error)
+                    reports.append(report)
+    finally:
+        listener.stop()
+
+    return merge_reports(reports)
@@ -0,0 +1,213 @@
+""" Local Stand-In for the Sonar Web API """
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from lib.tests.test_utils import BRANCH_PAYLOAD, COMPONENT_PAYLOAD
+
+MAX_PAGE_SIZE = 500
+
+
+class StubSonarServer:
+    """ Synthetic Sonar organization served over HTTP on a random local port
+
+    Branches are generated on demand out of the project index, so organizations of
+    tens of thousands of projects with hundreds of branches each stay cheap.
+    """
+
+    def __init__(self, projects: int = 10, branches: int = 2, compliant_every: int = 2,
+                 latency: float = 0.0, error_rate: float = 0.0, throttle_rate: float = 0.0,
+                 page_size: int = MAX_PAGE_SIZE, total: bool = True, seed: int = 0):
+        """ Constructor
+
+        Args:
+            projects: Number of projects of the organization
+            branches: Number of branches of every project
+            compliant_every: One project out of this many already has 'main' as its main branch
+            latency: Seconds added to every response
+            error_rate: Share of the requests failing with a server error
+            throttle_rate: Share of the requests throttled with a 429 and a Retry-After
+            page_size: Largest page served by the project search
+            total: Whether the project search tells the total of its paging
+            seed: Seed of the injected failures
+        """
+        self.branch_count = branches
+        self.compliant_every = compliant_every
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.page_size = page_size
+        self.total = total
+        self.requests = Counter()
+        self.lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._keys = [f'my-org_project-{i}' for i in range(projects)]
+        self._index = {key: i for i, key in enumerate(self._keys)}
+        # Branches of the projects mutated through the API
+        self._mutated = {}
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """ Base URL of the server """
+        host, port = self.server.server_address
+        return f'http://{host}:{port}'
+
+    @property
+    def port(self) -> int:
+        """ Port of the server """
+        return self.server.server_address[1]
+
+    @property
+    def projects(self) -> list[str]:
+        """ Keys of every project """
+        return list(self._keys)
+
+    def component(self, index: int) -> dict:
+        """ Project payload of the project at an index """
+        return dict(COMPONENT_PAYLOAD, key=self._keys[index], name=f'project-{index}')
+
+    def branches(self, project_key: str) -> list[dict]:
+        """ Branch payloads of a project """
+        if project_key in self._mutated:
+            return self._mutated[project_key]
+        index = self._index[project_key]
+        compliant = self.compliant_every and index % self.compliant_every == 0
+        main = 'main' if compliant else 'master'
+        return [dict(BRANCH_PAYLOAD, name=main, isMain=True)] + [
+            dict(BRANCH_PAYLOAD, name=f'feature-{b}', isMain=False, type='SHORT')
+            for b in range(1, self.branch_count)
+        ]
+
+    def main_branch(self, project_key: str) -> str:
+        """ Name of the main branch of a project """
+        return next(b['name'] for b in self.branches(project_key) if b['isMain'])
+
+    def start(self):
+        """ Serve in a background thread """
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """ Stop serving """
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, typ, val, tra):
+        self.stop()
+
+    # Routes
+    def route(self, method: str, path: str, params: dict):
+        """ Status, JSON body and extra headers answering a request """
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self.lock:
+            self.requests[path] += 1
+            draw = self._random.random()
+            if draw < self.throttle_rate:
+                return 429, {'errors': [{'msg': 'Too many requests'}]}, {'Retry-After': '0'}
+            if draw < self.throttle_rate + self.error_rate:
+                return 500, {'errors': [{'msg': 'Internal error'}]}, {}
+
+            handler = ROUTES.get((method, path))
+            if handler is None:
+                return 404, {'errors': [{'msg': f'Unknown url : {path}'}]}, {}
+            return handler(self, params) + ({},)
+
+    def _validate(self, _):
+        return 200, {'valid': True}
+
+    def _logout(self, _):
+        return 204, None
+
+    def _search_projects(self, params):
+        page = int(params.get('p', 1))
+        size = min(int(params.get('ps', 100)), self.page_size)
+        start = (page - 1) * size
+        components = [self.component(i) for i in range(start, min(start + size, len(self._keys)))]
+        paging = {'pageIndex': page, 'pageSize': size}
+        if self.total:
+            paging['total'] = len(self._keys)
+        return 200, {'paging': paging, 'components': components}
+
+    def _list_branches(self, params):
+        if params.get('project') not in self._index:
+            return 404, {'errors': [{'msg': 'Project not found'}]}
+        return 200, {'branches': self.branches(params['project'])}
+
+    def _delete_branch(self, params):
+        project_key = params.get('project')
+        if project_key not in self._index:
+            return 404, {'errors': [{'msg': 'Project not found'}]}
+        self._mutated[project_key] = [
+            b for b in self.branches(project_key) if b['name'] != params.get('branch') or b['isMain']]
+        return 204, None
+
+    def _rename_branch(self, params):
+        project_key = params.get('project')
+        if project_key not in self._index:
+            return 404, {'errors': [{'msg': 'Project not found'}]}
+        branches = self.branches(project_key)
+        for branch in branches:
+            if branch['isMain']:
+                branch['name'] = params.get('name')
+        self._mutated[project_key] = branches
+        return 204, None
+
+    def _handler(self):
+        """ Request handler bound to this server """
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """ HTTP/1.1 keep-alive handler delegating to the stub routes """
+            protocol_version = 'HTTP/1.1'
+
+            def _answer(self, method, params):
+                url = urlparse(self.path)
+                params.update({k: v[-1] for k, v in parse_qs(url.query).items()})
+                status, payload, headers = stub.route(method, url.path, params)
+                body = json.dumps(payload).encode() if payload is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                """ Read endpoints """
+                self._answer('GET', {})
+
+            def do_POST(self):  # pylint: disable=invalid-name
+                """ Mutating endpoints, with form encoded parameters """
+                length = int(self.headers.get('Content-Length') or 0)
+                form = parse_qs(self.rfile.read(length).decode()) if length else {}
+                self._answer('POST', {k: v[-1] for k, v in form.items()})
+
+            def log_message(self, *args):  # pylint: disable=arguments-differ
+                """ Silence the server """
+
+        return Handler
+
+
+ROUTES = {
+    ('GET', '/api/authentication/validate'): StubSonarServer._validate,
+    ('POST', '/api/authentication/logout'): StubSonarServer._logout,
+    ('GET', '/api/projects/search'): StubSonarServer._search_projects,
+    ('GET', '/api/project_branches/list'): StubSonarServer._list_branches,
+    ('POST', '/api/project_branches/delete'): StubSonarServer._delete_branch,
+    ('POST', '/api/project_branches/rename'): StubSonarServer._rename_branch,
+}
@@ -0,0 +1,168 @@
+""" Test Cases for async_handler.py """
+import asyncio
+import socket
+import unittest
+from argparse import Namespace
+
+import aiohttp
+from sonarqube.utils.exceptions import ServerError
+
+from lib.async_handler import AsyncSonarHandler
+from lib.audit import audit_projects_async, set_main_branch_async
+from lib.handler import SonarException
+from lib.response import Branch, Component
+from lib.tests.stub_server import StubSonarServer
+
+
+class AsyncSonarHandlerTestCase(unittest.TestCase):
+    """ Test Cases for AsyncSonarHandler against a local stub server """
+
+    def setUp(self) -> None:
+        self.server = StubSonarServer(projects=12, branches=3).start()
+        self.attrs = Namespace(platform='sonarqube', host='127.0.0.1', port=self.server.port,
+                               concurrency=4)
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def test_invalid_client(self):
+        """ Verify an invalid sonar client """
+        with self.assertRaises(TypeError):
+            AsyncSonarHandler(Namespace(platform='invalid'))
+
+    def test_context_manager(self):
+        """ Verify the authentication and logout calls """
+        async def run():
+            async with AsyncSonarHandler(self.attrs) as handler:
+                self.assertTrue(handler.authenticated)
+
+        asyncio.run(run())
+        self.assertEqual(1, self.server.requests['/api/authentication/validate'])
+        self.assertEqual(1, self.server.requests['/api/authentication/logout'])
+
+    def test_list_projects(self):
+        """ Verify every page of projects is retrieved """
+        async def run():
+            async with AsyncSonarHandler(self.attrs) as handler:
+                return await handler.list_projects()
+
+        projects = asyncio.run(run())
+        self.assertEqual(12, len(projects))
+        self.assertTrue(all(isinstance(p, Component) for p in projects))
+
+    def test_list_projects_capped_pages(self):
+        """ Verify the page size returned by the server is followed """
+        self.server.page_size = 5
+
+        async def run():
+            async with AsyncSonarHandler(self.attrs) as handler:
+                return await handler.list_projects()
+
+        self.assertEqual(12, len(asyncio.run(run())))
+        self.assertEqual(3, self.server.requests['/api/projects/search'])
+
+    def test_list_projects_no_total(self):
+        """ Verify the pages are followed until a short one without a total """
+        self.server.total = False
+        self.server.page_size = 5
+
+        async def run():
+            async with AsyncSonarHandler(self.attrs) as handler:
+                return await handler.list_projects()
+
+        self.assertEqual(12, len(asyncio.run(run())))
+        self.assertEqual(3, self.server.requests['/api/projects/search'])
+
+    def test_call_outside_context(self):
+        """ Verify a request outside of the context manager fails clearly """
+        handler = AsyncSonarHandler(self.attrs)
+        with self.assertRaises(SonarException):
+            asyncio.run(handler.list_project_branches('my-org_project-0'))
+
+    def test_list_projects_no_organization(self):
+        """ Verify Sonar Cloud demands an organization """
+        handler = AsyncSonarHandler(Namespace(platform='sonarcloud'))
+        with self.assertRaises(SonarException):
+            asyncio.run(handler.iter_projects().__anext__())
+
+    def test_list_project_branches(self):
+        """ Verify branches are decoded """
+        async def run():
+            async with AsyncSonarHandler(self.attrs) as handler:
+                return await handler.list_project_branches('my-org_project-0')
+
+        branches = asyncio.run(run())
+        self.assertEqual(3, len(branches))
+        self.assertTrue(all(isinstance(b, Branch) for b in branches))
+
+    def test_audit_and_remediate(self):
+        """ Verify the asynchronous audit keeps the order and fixes non-compliant projects """
+        async def run():
+            async with AsyncSonarHandler(self.attrs) as handler:
+                results = [r async for r in audit_projects_async(
+                    handler.iter_projects(), handler, window=5)]
+                for result in results:
+                    if not result.compliant:
+                        await set_main_branch_async(result.rule, handler)
+                return results
+
+        results = asyncio.run(run())
+        self.assertEqual(list(self.server.projects), [r.project.key for r in results])
+        self.assertEqual(6, sum(not r.compliant for r in results))
+        self.assertTrue(all(self.server.main_branch(k) == 'main' for k in self.server.projects))
+
+    def test_transient_failures(self):
+        """ Verify throttled and failed requests are retried """
+        self.server.throttle_rate = 0.2
+        self.server.error_rate = 0.2
+
+        async def run():
+            async with AsyncSonarHandler(self.attrs) as handler:
+                handler.retries = 20
+                return await handler.list_projects()
+
+        self.assertEqual(12, len(asyncio.run(run())))
+
+    def test_write_not_retried(self):
+        """ Verify a failed mutation is raised at once, it may have been applied """
+        async def run():
+            async with AsyncSonarHandler(self.attrs) as handler:
+                handler.retries = 5
+                self.server.error_rate = 1.0
+                try:
+                    await handler.rename_main_branch('my-org_project-1', 'main')
+                finally:
+                    self.server.error_rate = 0.0
+
+        with self.assertRaises(ServerError):
+            asyncio.run(run())
+        self.assertEqual(1, self.server.requests['/api/project_branches/rename'])
+
+    def test_enter_failure(self):
+        """ Verify the session is closed when the credentials cannot be checked """
+        with socket.socket() as closed:
+            closed.bind(('127.0.0.1', 0))
+            port = closed.getsockname()[1]
+        handler = AsyncSonarHandler(Namespace(platform='sonarqube', host='127.0.0.1', port=port,
+                                              retries=0))
+
+        async def run():
+            async with handler:
+                pass
+
+        with self.assertRaises(aiohttp.ClientConnectionError):
+            asyncio.run(run())
+        self.assertTrue(handler.session.closed)
+
+    def test_cancel_on_exit(self):
+        """ Verify pending tasks are cancelled on exit """
+        async def run():
+            async with AsyncSonarHandler(self.attrs) as handler:
+                task = handler.create_task(asyncio.sleep(60))
+            return task
+
+        self.assertTrue(asyncio.run(run()).cancelled())
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
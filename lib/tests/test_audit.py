@@ -0,0 +1,72 @@
+""" Test Cases for audit.py """
+import unittest
+from unittest.mock import create_autospec
+
+from sonarqube.utils.exceptions import ValidationError
+
+from lib.audit import audit_project, audit_projects
+from lib.handler import SonarHandler
+from lib.response import Branch, Component
+from lib.tests.test_utils import COMPONENT_PAYLOAD, BRANCH_PAYLOAD
+
+
+class AuditProjectsTestCase(unittest.TestCase):
+    """ Test Cases for audit_projects """
+
+    def setUp(self) -> None:
+        self.projects = [
+            Component(dict(COMPONENT_PAYLOAD, key=f'my-org_project-{i}')) for i in range(10)
+        ]
+        self.handler = create_autospec(SonarHandler)
+        self.handler.list_project_branches.return_value = [Branch(BRANCH_PAYLOAD)]
+
+    def test_audit_project(self):
+        """ Verify a compliant project is reported as such """
+        result = audit_project(self.projects[0], self.handler)
+        self.assertFalse(result.failed)
+        self.assertTrue(result.compliant)
+
+    def test_audit_project_error(self):
+        """ Verify an error is captured instead of raised """
+        self.handler.list_project_branches.side_effect = ValidationError('boom')
+        result = audit_project(self.projects[0], self.handler)
+        self.assertTrue(result.failed)
+        self.assertIsNone(result.rule)
+
+    def test_audit_projects_order(self):
+        """ Verify results keep the input order regardless of the workers """
+        for workers in (1, 4):
+            with self.subTest(workers):
+                results = list(audit_projects(self.projects, self.handler, workers))
+                self.assertEqual([p.key for p in self.projects], [r.project.key for r in results])
+
+    def test_audit_projects_isolation(self):
+        """ Verify a failing project does not prevent the others from being audited """
+        def branches(project_key):
+            if project_key.endswith('-3'):
+                raise ValidationError('boom')
+            return [Branch(BRANCH_PAYLOAD)]
+
+        self.handler.list_project_branches.side_effect = branches
+        results = list(audit_projects(self.projects, self.handler, 4))
+
+        self.assertEqual(1, sum(r.failed for r in results))
+        self.assertTrue(results[3].failed)
+        self.assertTrue(all(r.compliant for r in results if not r.failed))
+
+    def test_audit_projects_lazy(self):
+        """ Verify projects are pulled from the input only as the results are consumed """
+        consumed = []
+
+        def stream():
+            for project in self.projects:
+                consumed.append(project)
+                yield project
+
+        results = audit_projects(stream(), self.handler, 2)
+        next(results)
+        self.assertLess(len(consumed), len(self.projects))
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
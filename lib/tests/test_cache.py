@@ -0,0 +1,106 @@
+""" Test Cases for cache.py """
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from lib.cache import MISS, ResponseCache
+
+SEARCH = 'project_branches.search_project_branches'
+RENAME = 'project_branches.rename_project_branch'
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    """ Test Cases for ResponseCache """
+
+    def setUp(self) -> None:
+        self.cache = ResponseCache(max_entries=2)
+        self.branches = {'branches': [{'name': 'main', 'isMain': True}]}
+
+    def test_read_endpoints(self):
+        """ Verify only read endpoints are kept """
+        self.cache.store(SEARCH, {'project': 'a'}, self.branches)
+        self.assertEqual(self.branches, self.cache.get(SEARCH, {'project': 'a'}))
+        self.assertIs(MISS, self.cache.get(SEARCH, {'project': 'b'}))
+
+        self.cache.store('unknown.endpoint', {}, 'value')
+        self.assertIs(MISS, self.cache.get('unknown.endpoint', {}))
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+
+    def test_lru(self):
+        """ Verify the least recently used entry is evicted """
+        for project in ('a', 'b'):
+            self.cache.store(SEARCH, {'project': project}, self.branches)
+        self.cache.get(SEARCH, {'project': 'a'})
+        self.cache.store(SEARCH, {'project': 'c'}, self.branches)
+
+        self.assertIs(MISS, self.cache.get(SEARCH, {'project': 'b'}))
+        self.assertIsNot(MISS, self.cache.get(SEARCH, {'project': 'a'}))
+
+    def test_ttl(self):
+        """ Verify entries expire """
+        cache = ResponseCache(ttls={SEARCH: 10})
+        with patch('lib.cache.time.time', return_value=1000):
+            cache.store(SEARCH, {'project': 'a'}, self.branches)
+        with patch('lib.cache.time.time', return_value=1011):
+            self.assertIs(MISS, cache.get(SEARCH, {'project': 'a'}))
+
+    def test_generator(self):
+        """ Verify a streamed response is cached once consumed """
+        response = self.cache.store('projects.search_projects', {}, (p for p in [1, 2]))
+        self.assertIs(MISS, self.cache.get('projects.search_projects', {}))
+        self.assertEqual([1, 2], list(response))
+        self.assertEqual([1, 2], self.cache.get('projects.search_projects', {}))
+
+    def test_invalidate(self):
+        """ Verify a mutation drops the entries of its project """
+        self.cache.store(SEARCH, {'project': 'a'}, self.branches)
+        self.cache.store(SEARCH, {'project': 'b'}, self.branches)
+        self.cache.store(RENAME, {'project': 'a', 'name': 'main'}, b'')
+
+        self.assertIs(MISS, self.cache.get(SEARCH, {'project': 'a'}))
+        self.assertIsNot(MISS, self.cache.get(SEARCH, {'project': 'b'}))
+
+    def test_invalidate_creation(self):
+        """ Verify creating a project drops the listings """
+        self.cache.store('projects.search_projects', {}, [{'key': 'a'}])
+        self.cache.store('projects.create_project', {'project': 'b', 'name': 'B'}, b'')
+        self.assertIs(MISS, self.cache.get('projects.search_projects', {}))
+
+    def test_disk(self):
+        """ Verify entries survive across instances and are invalidated on disk """
+        with tempfile.TemporaryDirectory() as directory:
+            ResponseCache(directory=directory).store(SEARCH, {'project': 'a'}, self.branches)
+
+            cache = ResponseCache(directory=directory)
+            self.assertEqual(self.branches, cache.get(SEARCH, {'project': 'a'}))
+
+            cache.store(RENAME, {'project': 'a', 'name': 'main'}, b'')
+            self.assertIs(MISS, ResponseCache(directory=directory).get(SEARCH, {'project': 'a'}))
+
+    def test_disk_size(self):
+        """ Verify the on-disk tier is bounded """
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResponseCache(directory=directory, max_bytes=200)
+            for project in range(10):
+                cache.store(SEARCH, {'project': str(project)}, self.branches)
+            self.assertLessEqual(cache._disk_bytes, 200)  # pylint: disable=protected-access
+
+    def test_disk_size_overwrite(self):
+        """ Verify overwriting an entry accounts for the bytes on disk once """
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResponseCache(directory=directory)
+            for _ in range(3):
+                cache.store(SEARCH, {'project': 'a'}, {'branches': [{'name': 'mäin'}]})
+            size = sum(entry.stat().st_size for entry in os.scandir(directory))
+            self.assertEqual(size, cache._disk_bytes)  # pylint: disable=protected-access
+
+    def test_namespace(self):
+        """ Verify entries are scoped to their namespace """
+        with tempfile.TemporaryDirectory() as directory:
+            ResponseCache(directory=directory, namespace='x').store(SEARCH, {}, self.branches)
+            self.assertIs(MISS, ResponseCache(directory=directory, namespace='y').get(SEARCH, {}))
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,96 @@
+""" Test Cases for cassette.py """
+import os
+import tempfile
+import unittest
+
+from lib.cassette import RECORD, REPLAY, Cassette, CassetteMiss
+
+SEARCH = 'project_branches.search_project_branches'
+RENAME = 'project_branches.rename_project_branch'
+
+
+class CassetteTestCase(unittest.TestCase):
+    """ Test Cases for Cassette """
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'sonar.jsonl.gz')
+        self.branches = {'branches': [{'name': 'main', 'isMain': True}]}
+
+    def test_record_replay(self):
+        """ Verify recorded responses are answered by call """
+        cassette = Cassette(self.path, RECORD)
+        self.assertIs(self.branches, cassette.record(SEARCH, {'project': 'a'}, self.branches))
+        cassette.record(SEARCH, {'project': 'b'}, {'branches': []})
+        cassette.record(SEARCH, {'project': 'a'}, self.branches)
+        cassette.close()
+        self.assertEqual(2, cassette.recorded)
+
+        cassette = Cassette(self.path, REPLAY)
+        self.assertEqual(self.branches, cassette.replay(SEARCH, {'project': 'a'}))
+        self.assertEqual({'branches': []}, cassette.replay(SEARCH, {'project': 'b'}))
+        with self.assertRaises(CassetteMiss):
+            cassette.replay(SEARCH, {'project': 'c'})
+
+    def test_generator(self):
+        """ Verify a streamed response is recorded once consumed """
+        cassette = Cassette(self.path, RECORD)
+        response = cassette.record('projects.search_projects', {}, (p for p in [{'key': 'a'}]))
+        self.assertEqual(0, cassette.recorded)
+        self.assertEqual([{'key': 'a'}], list(response))
+        cassette.close()
+
+        cassette = Cassette(self.path, REPLAY)
+        self.assertEqual([{'key': 'a'}], cassette.replay('projects.search_projects', {}))
+
+    def test_generator_partial(self):
+        """ Verify a stream left unfinished is recorded as far as it was consumed """
+        cassette = Cassette(self.path, RECORD)
+        items = [{'key': key} for key in 'abc']
+        abandoned = cassette.record('projects.search_projects', {}, (p for p in items))
+        self.assertEqual(items[0], next(abandoned))
+        abandoned.close()
+        unfinished = cassette.record('projects.search_projects', {'p': 2}, (p for p in items))
+        self.assertEqual(items[:2], [next(unfinished), next(unfinished)])
+        cassette.close()
+        self.assertEqual(2, cassette.recorded)
+
+        cassette = Cassette(self.path, REPLAY)
+        self.assertEqual(items[:1], cassette.replay('projects.search_projects', {}))
+        self.assertEqual(items[:2], cassette.replay('projects.search_projects', {'p': 2}))
+
+    def test_generator_longest(self):
+        """ Verify the longest stream of a call is recorded, whatever ended first """
+        cassette = Cassette(self.path, RECORD)
+        items = [{'key': key} for key in 'abc']
+        partial = cassette.record('projects.search_projects', {}, (p for p in items))
+        next(partial)
+        partial.close()
+        self.assertEqual(items, list(cassette.record('projects.search_projects', {},
+                                                     (p for p in items))))
+        cassette.close()
+        self.assertEqual(1, cassette.recorded)
+
+        cassette = Cassette(self.path, REPLAY)
+        self.assertEqual(items, cassette.replay('projects.search_projects', {}))
+
+    def test_writes(self):
+        """ Verify mutations are never recorded nor applied on replay """
+        cassette = Cassette(self.path, RECORD)
+        cassette.record(RENAME, {'project': 'a', 'name': 'main'}, {'ok': True})
+        cassette.record('unknown.endpoint', {}, b'binary')
+        cassette.close()
+        self.assertEqual(0, cassette.recorded)
+
+        cassette = Cassette(self.path, REPLAY)
+        self.assertIsNone(cassette.replay(RENAME, {'project': 'a', 'name': 'main'}))
+
+    def test_mode(self):
+        """ Verify unknown modes are rejected """
+        with self.assertRaises(ValueError):
+            Cassette(self.path, 'rewind')
+
+
+if __name__ == '__main__':
+    unittest.main()
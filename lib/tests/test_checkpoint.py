@@ -0,0 +1,95 @@
+""" Test Cases for checkpoint.py """
+import os
+import tempfile
+import unittest
+
+from lib.checkpoint import Checkpoint
+from lib.remediation import (DELETE_BRANCH, FAILED, RENAME_MAIN_BRANCH, SUCCEEDED, Action,
+                             ActionResult)
+from lib.response import Component
+
+
+def new_projects(count: int) -> list[Component]:
+    """ Components with sequential keys """
+    return [Component({'key': f'project-{i}'}) for i in range(count)]
+
+
+class CheckpointTestCase(unittest.TestCase):
+    """ Test Cases for Checkpoint """
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.path = os.path.join(self.directory.name, 'checkpoint.json')
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def interrupted_run(self):
+        """ Run auditing three projects and applying the delete of one, then dying """
+        delete = Action('project-1', DELETE_BRANCH, 'main')
+        rename = Action('project-1', RENAME_MAIN_BRANCH, 'main')
+        with self.assertRaises(KeyboardInterrupt), Checkpoint.start(self.path) as checkpoint:
+            for project in checkpoint.select(new_projects(3)):
+                checkpoint.record_audit(project.key, [delete, rename] if project.key == 'project-1'
+                                        else [])
+            checkpoint.record_results([ActionResult(delete, SUCCEEDED),
+                                       ActionResult(rename, FAILED)])
+            raise KeyboardInterrupt
+
+    def test_resume(self):
+        """ Verify audited projects are skipped and applied mutations are not repeated """
+        self.interrupted_run()
+
+        checkpoint = Checkpoint.load(self.path)
+        self.assertEqual(3, checkpoint.cursor)
+        remaining = [p.key for p in checkpoint.select(new_projects(5)[checkpoint.cursor:])]
+        self.assertEqual(['project-3', 'project-4'], remaining)
+        self.assertEqual([Action('project-1', RENAME_MAIN_BRANCH, 'main')], checkpoint.pending())
+
+    def test_cursor(self):
+        """ Verify the cursor only moves past projects handled without a gap """
+        checkpoint = Checkpoint.start(self.path)
+        checkpoint.audited['project-1'] = []
+        listed = checkpoint.select(new_projects(5))
+        first, third, fourth = next(listed), next(listed), next(listed)
+        self.assertEqual(0, checkpoint.cursor)
+
+        checkpoint.record_audit(third.key, [])
+        checkpoint.record_skipped(fourth)
+        self.assertEqual(0, checkpoint.cursor)
+        checkpoint.record_audit(first.key, [])
+        self.assertEqual(4, checkpoint.cursor)
+        self.assertEqual(1, checkpoint.resumed)
+
+    def test_journal(self):
+        """ Verify applied mutations survive without a save of the checkpoint """
+        delete = Action('project-1', DELETE_BRANCH, 'main')
+        checkpoint = Checkpoint.start(self.path, interval=3600)
+        checkpoint.record_audit('project-1', [delete])
+        checkpoint.record_results([ActionResult(delete, SUCCEEDED)])
+        with open(checkpoint.journal_path, 'a', encoding='utf-8') as file:
+            file.write('["project-2", "del')
+
+        resumed = Checkpoint.load(self.path)
+        self.assertEqual([], resumed.unapplied([delete]))
+
+    def test_finish(self):
+        """ Verify a completed run leaves nothing to resume """
+        self.interrupted_run()
+        with Checkpoint.load(self.path) as checkpoint:
+            checkpoint.finish()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(checkpoint.journal_path))
+        self.assertEqual({}, Checkpoint.load(self.path).audited)
+
+    def test_start_discards_previous(self):
+        """ Verify a new run does not inherit the progress of an older one """
+        self.interrupted_run()
+        Checkpoint.start(self.path)
+        checkpoint = Checkpoint.load(self.path)
+        self.assertEqual({}, checkpoint.audited)
+        self.assertEqual(set(), checkpoint.applied)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+""" Test Cases for credentials.py """
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from lib import credentials
+from lib.credentials import CredentialCache
+from lib.response import Validate
+
+
+class CredentialCacheTestCase(unittest.TestCase):
+    """ Test Cases for CredentialCache """
+
+    def setUp(self) -> None:
+        credentials.clear()
+
+    def test_process_cache(self):
+        """ Verify successful validations are reused within the process """
+        cache = CredentialCache()
+        self.assertIsNone(cache.get('fingerprint'))
+        cache.put('fingerprint', Validate({'valid': True}))
+        self.assertTrue(CredentialCache().get('fingerprint').valid)
+
+    def test_invalid_not_cached(self):
+        """ Verify failed validations are always checked again """
+        cache = CredentialCache()
+        cache.put('fingerprint', Validate({'valid': False}))
+        self.assertIsNone(cache.get('fingerprint'))
+
+    def test_ttl(self):
+        """ Verify validations expire """
+        cache = CredentialCache(ttl=10)
+        with patch('lib.credentials.time.time', return_value=1000):
+            cache.put('fingerprint', Validate({'valid': True}))
+        with patch('lib.credentials.time.time', return_value=1011):
+            self.assertIsNone(cache.get('fingerprint'))
+
+    def test_file_cache(self):
+        """ Verify validations are reused across runs """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'credentials.json')
+            CredentialCache(path=path).put('fingerprint', Validate({'valid': True}))
+            credentials.clear()
+            self.assertTrue(CredentialCache(path=path).get('fingerprint').valid)
+            self.assertIsNone(CredentialCache().get('fingerprint'))
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
@@ -1,5 +1,7 @@
 """ Test Cases for handler.py """
 import json
+import os
+import tempfile
 import unittest
 from argparse import Namespace
 from unittest.mock import patch
@@ -7,11 +9,15 @@ from unittest.mock import patch
 from sonarqube import SonarQubeClient, SonarCloudClient
 from sonarqube.cloud import SonarCloudProjects
 from sonarqube.community import SonarQubeAuth, SonarQubeProjectBranches
+from sonarqube.utils.exceptions import ServerError
 
+from lib import credentials
 from lib.handler import SonarHandler, SonarException
 from lib.response import Branch, Component
 from lib.rules import DEFAULT_BRANCH
+from lib.tests.stub_server import StubSonarServer
 from lib.tests.test_utils import VALID_PAYLOAD, COMPONENT_PAYLOAD, BRANCH_PAYLOAD
+from lib.utils import SONARCLOUD_URL
 
 
 class SonarHandlerTestCase(unittest.TestCase):
@@ -82,6 +88,23 @@ class SonarHandlerTestCase(unittest.TestCase):
         expected = f"http://{host}:{port}"
         self.assertEqual(handler.url, expected)
 
+    @patch.object(SonarQubeAuth, 'check_credentials')
+    def test_pooled_transport(self, check_credentials_mock):
+        """ Verify the client session goes through a pool sized after the workers """
+        check_credentials_mock.return_value = json.dumps(VALID_PAYLOAD)
+
+        attrs = Namespace(platform='sonarcloud', workers=4, connect_timeout=1, read_timeout=2)
+        handler = SonarHandler(attrs)
+
+        self.assertEqual(4, handler.transport.pool_size)
+        self.assertEqual((1, 2), handler.transport.timeout)
+        self.assertIs(handler.transport, handler.client.session.get_adapter(SONARCLOUD_URL))
+        self.assertEqual(0, handler.pool_stats()['connections'])
+
+        # Prefetched pages hold connections besides the workers
+        attrs = Namespace(platform='sonarcloud', workers=4, prefetch_pages=3)
+        self.assertEqual(7, SonarHandler(attrs).transport.pool_size)
+
     @patch.object(SonarQubeAuth, 'check_credentials')
     def test_list_projects_no_organization(self, check_credentials_mock):
         """ Test List Projects call """
@@ -108,6 +131,62 @@ class SonarHandlerTestCase(unittest.TestCase):
         self.assertEqual(items, len(projects))
         self.assertTrue(all(isinstance(p, Component) for p in projects))
 
+    @patch.object(SonarQubeAuth, 'check_credentials')
+    @patch.object(SonarCloudProjects, 'search_projects')
+    def test_iter_projects(self, search_projects_mock, check_credentials_mock):
+        """ Test projects are streamed one at a time """
+        items = 2
+        check_credentials_mock.return_value = json.dumps(VALID_PAYLOAD)
+        search_projects_mock.return_value = (COMPONENT_PAYLOAD for _ in range(items))
+
+        handler = SonarHandler(self.cloud_settings)
+        projects = handler.iter_projects()
+        # Nothing is requested until the stream is consumed
+        self.assertFalse(search_projects_mock.called)
+        self.assertIsInstance(next(projects), Component)
+        self.assertEqual(items - 1, len(list(projects)))
+
+    def test_prefetch_pages(self):
+        """ Verify pages fetched concurrently are yielded in order, from any start """
+        with StubSonarServer(projects=1234, page_size=500) as stub:
+            attrs = Namespace(platform='sonarqube', host='127.0.0.1', port=stub.port,
+                              prefetch_pages=4, rate_limit=0)
+            handler = SonarHandler(attrs)
+            keys = [project.key for project in handler.iter_projects()]
+            self.assertEqual(stub.projects, keys)
+            self.assertEqual(3, stub.requests['/api/projects/search'])
+
+            resumed = [project.key for project in handler.iter_projects(start=700)]
+            self.assertEqual(stub.projects[700:], resumed)
+
+        # Servers capping the page size below the requested one
+        with StubSonarServer(projects=1234, page_size=100) as stub:
+            attrs = Namespace(platform='sonarqube', host='127.0.0.1', port=stub.port,
+                              prefetch_pages=4, rate_limit=0)
+            handler = SonarHandler(attrs)
+            keys = [project.key for project in handler.iter_projects()]
+            self.assertEqual(stub.projects, keys)
+
+            resumed = [project.key for project in handler.iter_projects(start=750)]
+            self.assertEqual(stub.projects[750:], resumed)
+
+    def test_cassette(self):
+        """ Verify a recorded listing is replayed without any request """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'sonar.jsonl.gz')
+            with StubSonarServer(projects=600) as stub:
+                attrs = Namespace(platform='sonarqube', host='127.0.0.1', port=stub.port,
+                                  prefetch_pages=2, rate_limit=0, record=path)
+                with SonarHandler(attrs) as handler:
+                    recorded = [project.key for project in handler.iter_projects()]
+
+            # The server is gone
+            attrs = Namespace(platform='sonarqube', host='127.0.0.1', port=stub.port,
+                              prefetch_pages=2, rate_limit=0, replay=path)
+            with SonarHandler(attrs) as handler:
+                self.assertTrue(handler.authenticated)
+                self.assertEqual(recorded, [project.key for project in handler.iter_projects()])
+
     @patch.object(SonarQubeAuth, 'check_credentials')
     @patch.object(SonarQubeProjectBranches, 'search_project_branches')
     def test_list_project_branches(self, search_project_branches_mock, check_credentials_mock):
@@ -123,6 +202,33 @@ class SonarHandlerTestCase(unittest.TestCase):
         self.assertEqual(1, len(branches))
         self.assertTrue(all(isinstance(b, Branch) for b in branches))
 
+    @patch.object(SonarQubeAuth, 'check_credentials')
+    @patch.object(SonarCloudProjects, 'create_project')
+    def test_create_project(self, create_project_mock, check_credentials_mock):
+        """ Test calls to create_project """
+        check_credentials_mock.return_value = json.dumps(VALID_PAYLOAD)
+        create_project_mock.return_value = {'project': {'key': self.project_key}}
+
+        handler = SonarHandler(self.cloud_settings)
+        handler.create_project(self.project_key, 'Project', 'private')
+
+        # Verify the organization is given on SonarCloud
+        create_project_mock.assert_called_once_with(project=self.project_key, name='Project',
+                                                    visibility='private', organization='my-org')
+
+    @patch.object(SonarQubeAuth, 'check_credentials')
+    @patch.object(SonarCloudProjects, 'update_project_visibility')
+    def test_update_visibility(self, update_project_visibility_mock, check_credentials_mock):
+        """ Test calls to update_visibility """
+        check_credentials_mock.return_value = json.dumps(VALID_PAYLOAD)
+        update_project_visibility_mock.return_value = b''
+
+        handler = SonarHandler(self.cloud_settings)
+        handler.update_visibility(self.project_key, 'private')
+
+        update_project_visibility_mock.assert_called_once_with(project=self.project_key,
+                                                               visibility='private')
+
     @patch.object(SonarQubeAuth, 'check_credentials')
     @patch.object(SonarQubeProjectBranches, 'delete_project_branch')
     def test_delete_branch(self, search_project_branches_mock, check_credentials_mock):
@@ -149,6 +255,56 @@ class SonarHandlerTestCase(unittest.TestCase):
         # Verify an empty response is generated
         self.assertEqual(b'', response)
 
+    @patch.object(SonarQubeAuth, 'check_credentials')
+    @patch.object(SonarQubeProjectBranches, 'rename_project_branch')
+    def test_call_write_not_retried(self, rename_project_branch_mock, check_credentials_mock):
+        """ A failed mutation is raised at once, it may have been applied """
+        check_credentials_mock.return_value = json.dumps(VALID_PAYLOAD)
+        rename_project_branch_mock.side_effect = ServerError('busy')
+
+        handler = SonarHandler(Namespace(platform='sonarcloud', organization='my-org', retries=2))
+        with self.assertRaises(ServerError):
+            handler.rename_main_branch(self.project_key, DEFAULT_BRANCH)
+        self.assertEqual(1, rename_project_branch_mock.call_count)
+
+    @patch.object(SonarQubeAuth, 'check_credentials')
+    @patch.object(SonarQubeProjectBranches, 'rename_project_branch')
+    @patch.object(SonarQubeProjectBranches, 'search_project_branches')
+    def test_call_cache(self, search_project_branches_mock, rename_project_branch_mock,
+                        check_credentials_mock):
+        """ Read calls are cached until a mutation of the project """
+        check_credentials_mock.return_value = json.dumps(VALID_PAYLOAD)
+        search_project_branches_mock.return_value = {'branches': [BRANCH_PAYLOAD]}
+        rename_project_branch_mock.return_value = b''
+
+        handler = SonarHandler(Namespace(platform='sonarcloud', organization='my-org', cache=True))
+        handler.list_project_branches(self.project_key)
+        handler.list_project_branches(self.project_key)
+        self.assertEqual(1, search_project_branches_mock.call_count)
+
+        handler.rename_main_branch(self.project_key, DEFAULT_BRANCH)
+        handler.list_project_branches(self.project_key)
+        self.assertEqual(2, search_project_branches_mock.call_count)
+
+    @patch.object(SonarQubeAuth, 'check_credentials')
+    @patch.object(SonarQubeAuth, 'logout_user')
+    def test_fast_start(self, logout_user_mock, check_credentials_mock):
+        """ Fast start reuses the credential check and skips the logout """
+        check_credentials_mock.return_value = json.dumps(VALID_PAYLOAD)
+        credentials.clear()
+
+        attrs = Namespace(platform='sonarcloud', organization='my-org', fast_start=True)
+        with SonarHandler(attrs) as handler:
+            self.assertTrue(handler.authenticated)
+        with SonarHandler(attrs) as handler:
+            self.assertTrue(handler.authenticated)
+            # The client is only built once it is needed
+            self.assertIsNone(handler._client)  # pylint: disable=protected-access
+            self.assertIn('import', handler.startup)
+
+        self.assertEqual(1, check_credentials_mock.call_count)
+        self.assertFalse(logout_user_mock.called)
+
 
 if __name__ == '__main__':  # pragma: no cover
     unittest.main()
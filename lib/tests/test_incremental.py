@@ -0,0 +1,80 @@
+""" Test Cases for incremental.py """
+import os
+import tempfile
+import unittest
+
+from lib.incremental import AuditState
+from lib.response import Component
+from lib.tests.test_utils import COMPONENT_PAYLOAD
+
+
+class AuditStateTestCase(unittest.TestCase):
+    """ Test Cases for AuditState """
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.path = os.path.join(self.directory.name, 'state.json')
+        self.projects = [Component(dict(COMPONENT_PAYLOAD, key=f'project-{i}')) for i in range(4)]
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def run_audit(self, projects, compliant=True, **kargs):
+        """ Simulate an audit, returning the keys of the audited projects """
+        state = AuditState.load(self.path)
+        state.needs_full_scan(**kargs)
+        audited = []
+        for project in state.select(projects):
+            audited.append(project.key)
+            state.record(project, compliant)
+        state.save()
+        return audited
+
+    def test_first_run_is_full(self):
+        """ Verify every project is audited without a previous state """
+        self.assertEqual(4, len(self.run_audit(self.projects)))
+
+    def test_unchanged_projects_skipped(self):
+        """ Verify only new or analyzed projects are audited again """
+        self.run_audit(self.projects)
+        analyzed = Component(dict(COMPONENT_PAYLOAD, key='project-1',
+                                  lastAnalysisDate='2022-10-11T10:00:00+0200'))
+        revised = Component(dict(COMPONENT_PAYLOAD, key='project-2', revision='abc'))
+        new = Component(dict(COMPONENT_PAYLOAD, key='project-9'))
+
+        projects = [self.projects[0], analyzed, revised, self.projects[3], new]
+        audited = self.run_audit(projects)
+        self.assertEqual(['project-1', 'project-2', 'project-9'], audited)
+
+        state = AuditState.load(self.path)
+        self.assertEqual(5, len(state.projects))
+
+    def test_non_compliant_projects_audited(self):
+        """ Verify projects left non-compliant are audited again """
+        self.run_audit(self.projects, compliant=False)
+        self.assertEqual(4, len(self.run_audit(self.projects)))
+        self.assertEqual(0, len(self.run_audit(self.projects)))
+
+    def test_full_scan(self):
+        """ Verify a full scan on demand or after the maximum age """
+        self.run_audit(self.projects)
+        self.assertEqual(4, len(self.run_audit(self.projects, forced=True)))
+        self.assertEqual(4, len(self.run_audit(self.projects, max_age=-1)))
+        self.assertEqual(0, len(self.run_audit(self.projects)))
+
+    def test_rules_changed(self):
+        """ Verify every project is audited again under different rules """
+        self.run_audit(self.projects, rules='main_branch')
+        self.assertEqual(0, len(self.run_audit(self.projects, rules='main_branch')))
+        self.assertEqual(4, len(self.run_audit(self.projects, rules='visibility')))
+        self.assertEqual(0, len(self.run_audit(self.projects, rules='visibility')))
+
+    def test_removed_projects_dropped(self):
+        """ Verify projects no longer listed are forgotten """
+        self.run_audit(self.projects)
+        self.run_audit(self.projects[:2])
+        self.assertEqual({'project-0', 'project-1'}, set(AuditState.load(self.path).projects))
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
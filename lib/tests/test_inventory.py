@@ -0,0 +1,85 @@
+""" Test Cases for inventory.py """
+import json
+import os
+import tempfile
+import unittest
+
+from lib.inventory import Inventory, ProjectRecord
+from lib.response import Branch, Component
+from lib.tests.test_utils import COMPONENT_PAYLOAD, BRANCH_PAYLOAD
+
+
+class InventoryTestCase(unittest.TestCase):
+    """ Test Cases for Inventory """
+
+    def setUp(self) -> None:
+        self.inventory = Inventory()
+        dates = ['2022-10-08T10:00:00+0000', '2022-10-09T10:00:00+0000', '2022-10-10T10:00:00+0000']
+        for i, date in enumerate(dates):
+            self.inventory.add_project(Component(dict(
+                COMPONENT_PAYLOAD, key=f'project-{i}', lastAnalysisDate=date,
+                visibility='public' if i else 'private')))
+        self.inventory.add_branches('project-0', [
+            Branch(dict(BRANCH_PAYLOAD, name='master', isMain=True)),
+            Branch(dict(BRANCH_PAYLOAD, name='main', isMain=False)),
+        ])
+
+    def test_records_are_compact(self):
+        """ Verify records do not carry a __dict__ """
+        record = self.inventory.project('project-0')
+        self.assertIsInstance(record, ProjectRecord)
+        self.assertFalse(hasattr(record, '__dict__'))
+
+    def test_lookups(self):
+        """ Verify lookups by key and branch name """
+        self.assertEqual(3, len(self.inventory))
+        self.assertIn('project-1', self.inventory)
+        self.assertIsNone(self.inventory.project('unknown'))
+        self.assertEqual('master', self.inventory.main_branch('project-0').name)
+        self.assertFalse(self.inventory.branch('project-0', 'main').isMain)
+        self.assertEqual(2, len(self.inventory.branches('project-0')))
+        self.assertIsNone(self.inventory.main_branch('project-1'))
+
+    def test_by_visibility(self):
+        """ Verify the visibility index """
+        self.assertEqual(['project-0'], [p.key for p in self.inventory.by_visibility('private')])
+        self.assertEqual(2, len(self.inventory.by_visibility('public')))
+
+    def test_analyzed_between(self):
+        """ Verify range queries over the last analysis date """
+        keys = [p.key for p in self.inventory.analyzed_between('2022-10-09T10:00:00+0000')]
+        self.assertEqual(['project-1', 'project-2'], keys)
+        keys = [p.key for p in self.inventory.analyzed_between(end='2022-10-09T10:00:00+0000')]
+        self.assertEqual(['project-0', 'project-1'], keys)
+
+    def test_replace_project(self):
+        """ Verify indexes follow an updated project """
+        self.inventory.add_project(Component(dict(
+            COMPONENT_PAYLOAD, key='project-0', visibility='public',
+            lastAnalysisDate='2022-10-11T10:00:00+0000')))
+        self.assertEqual([], self.inventory.by_visibility('private'))
+        self.assertEqual('project-0', self.inventory.analyzed_between()[-1].key)
+        self.assertEqual(3, len(self.inventory.analyzed_between()))
+
+        self.inventory.remove_project('project-0')
+        self.assertNotIn('project-0', self.inventory)
+        self.assertIsNone(self.inventory.main_branch('project-0'))
+
+    def test_dump(self):
+        """ Verify the export by last analysis with the branches of every project """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'inventory.json')
+            self.inventory.dump(path)
+            with open(path, encoding='utf-8') as file:
+                document = json.load(file)
+
+        self.assertEqual({'private': 1, 'public': 2}, document['visibility'])
+        first = document['projects'][0]
+        self.assertEqual(['project-0', 'project-1', 'project-2'],
+                         [p['key'] for p in document['projects']])
+        self.assertEqual(('master', ['main', 'master']), (first['main_branch'], first['branches']))
+        self.assertEqual('2022-10-08T10:00:00+0000', first['lastAnalysisDate'])
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,134 @@
+""" Test Cases for logs.py """
+import json
+import logging
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import patch
+
+from lib.logs import (EndpointSampler, JsonFormatter, collect_worker_logging, forward_logging,
+                      install_async_logging, install_logging)
+
+
+def new_record(message: str = 'message', endpoint: str = None, args: tuple = ()) -> logging.LogRecord:
+    """ LogRecord as created by logging.info """
+    record = logging.LogRecord('root', logging.INFO, __file__, 1, message, args, None)
+    if endpoint:
+        record.endpoint = endpoint
+    return record
+
+
+def log_in_worker(message: str) -> None:
+    """ Task of a worker process """
+    logging.getLogger('worker').warning('%s', message)
+
+
+class CollectingHandler(logging.Handler):
+    """ Keeps the formatted records """
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+class JsonFormatterTestCase(unittest.TestCase):
+    """ Test Cases for JsonFormatter """
+
+    def test_format(self):
+        """ Verify records become single line JSON with their extra attributes """
+        line = JsonFormatter().format(new_record('%s(%s)', 'projects.search', ('f', {'p': 1})))
+        document = json.loads(line)
+        self.assertNotIn('\n', line)
+        self.assertEqual(document['level'], 'INFO')
+        self.assertEqual(document['message'], "f({'p': 1})")
+        self.assertEqual(document['endpoint'], 'projects.search')
+
+
+class EndpointSamplerTestCase(unittest.TestCase):
+    """ Test Cases for EndpointSampler """
+
+    def test_sample(self):
+        """ Verify one out of every N records of each endpoint passes """
+        sampler = EndpointSampler(sample=3)
+        kept = [sampler.filter(new_record(endpoint='a')) for _ in range(6)]
+        self.assertEqual(kept, [True, False, False, True, False, False])
+        self.assertTrue(sampler.filter(new_record(endpoint='b')))
+
+    def test_rate(self):
+        """ Verify records of an endpoint are capped per second """
+        sampler = EndpointSampler(rate=2)
+        with patch('lib.logs.time.monotonic', return_value=10.0):
+            kept = [sampler.filter(new_record(endpoint='a')) for _ in range(4)]
+        self.assertEqual(kept, [True, True, False, False])
+        with patch('lib.logs.time.monotonic', return_value=11.0):
+            self.assertTrue(sampler.filter(new_record(endpoint='a')))
+
+    def test_other_records(self):
+        """ Verify records without endpoint are never dropped """
+        sampler = EndpointSampler(sample=100, rate=1)
+        self.assertTrue(all(sampler.filter(new_record()) for _ in range(5)))
+
+
+class AsyncLoggingTestCase(unittest.TestCase):
+    """ Test Cases for install_async_logging """
+
+    def test_flush_on_stop(self):
+        """ Verify every queued record is written once the listener stops """
+        logger = logging.getLogger('test_logs')
+        logger.propagate = False
+        handler = CollectingHandler()
+        listener = install_async_logging(logger, [handler], EndpointSampler(sample=2))
+        try:
+            for index in range(10):
+                logger.warning('call %s', index, extra={'endpoint': 'a'})
+            logger.warning('done')
+        finally:
+            listener.stop()
+            logger.handlers.clear()
+        self.assertEqual(handler.lines, ['call 0', 'call 2', 'call 4', 'call 6', 'call 8', 'done'])
+
+
+class InstallLoggingTestCase(unittest.TestCase):
+    """ Test Cases for install_logging """
+
+    def test_same_sample(self):
+        """ Verify every handler sees the same sampled records, sync or async """
+        expected = ['call 0', 'call 3', 'call 6', 'call 9', 'done']
+        for async_logging in (False, True):
+            logger = logging.getLogger(f'test_logs.{async_logging}')
+            logger.propagate = False
+            handlers = [CollectingHandler(), CollectingHandler()]
+            listener = install_logging(logger, handlers, sample=3, async_logging=async_logging)
+            try:
+                for index in range(12):
+                    logger.warning('call %s', index, extra={'endpoint': 'a'})
+                logger.warning('done')
+            finally:
+                if listener:
+                    listener.stop()
+                logger.handlers.clear()
+            self.assertEqual([expected, expected], [h.lines for h in handlers])
+
+
+class WorkerLoggingTestCase(unittest.TestCase):
+    """ Test Cases for forward_logging """
+
+    def test_forward(self):
+        """ Verify the records of worker processes reach the handlers of the parent """
+        root = logging.getLogger()
+        handler = CollectingHandler()
+        root.addHandler(handler)
+        records, listener = collect_worker_logging()
+        try:
+            with ProcessPoolExecutor(max_workers=1, initializer=forward_logging,
+                                     initargs=(records,)) as executor:
+                executor.submit(log_in_worker, 'from worker').result()
+        finally:
+            listener.stop()
+            root.removeHandler(handler)
+        self.assertEqual(handler.lines, ['from worker'])
+
+
+if __name__ == '__main__':
+    unittest.main()
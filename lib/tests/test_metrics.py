@@ -0,0 +1,74 @@
+""" Test Cases for metrics.py """
+import json
+import os
+import tempfile
+import unittest
+
+from lib.metrics import EndpointStats, Metrics
+
+SEARCH = 'project_branches.search_project_branches'
+
+
+class MetricsTestCase(unittest.TestCase):
+    """ Test Cases for Metrics """
+
+    def setUp(self) -> None:
+        self.metrics = Metrics()
+
+    def test_track(self):
+        """ Verify requests, errors and bytes are accounted by endpoint """
+        with self.metrics.attribute(SEARCH):
+            self.assertEqual(SEARCH, self.metrics.current)
+            with self.metrics.track(SEARCH):
+                self.assertEqual(1, self.metrics.in_flight)
+            self.metrics.record_bytes(100)
+        self.assertIsNone(self.metrics.current)
+
+        with self.assertRaises(ValueError):
+            with self.metrics.track(SEARCH):
+                raise ValueError()
+
+        self.metrics.record_error(SEARCH)
+        self.metrics.record_cached(SEARCH)
+        # Bytes outside a call are not attributed
+        self.metrics.record_bytes(100)
+
+        stats = self.metrics.snapshot()
+        self.assertEqual(0, stats['in_flight'])
+        self.assertEqual(1, stats['max_in_flight'])
+        endpoint = stats['endpoints'][SEARCH]
+        self.assertEqual((2, 2, 1, 100), (endpoint['calls'], endpoint['errors'],
+                                          endpoint['cached'], endpoint['bytes']))
+        self.assertIsNotNone(endpoint['p99'])
+
+    def test_percentiles(self):
+        """ Verify percentiles over the observed latencies """
+        stats = EndpointStats()
+        self.assertIsNone(stats.percentile(50))
+        for latency in range(1, 101):
+            stats.observe(latency / 1000)
+        self.assertEqual(0.05, stats.percentile(50))
+        self.assertEqual(0.095, stats.percentile(95))
+        self.assertEqual(0.099, stats.percentile(99))
+
+    def test_prometheus(self):
+        """ Verify the Prometheus exposition format """
+        with self.metrics.track(SEARCH):
+            pass
+        text = self.metrics.to_prometheus()
+        self.assertIn(f'sonar_endpoint_calls_total{{endpoint="{SEARCH}"}} 1', text)
+        self.assertIn(f'sonar_endpoint_latency_seconds_bucket{{endpoint="{SEARCH}",le="+Inf"}} 1', text)
+
+    def test_dump(self):
+        """ Verify the statistics are written to a file """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics.json')
+            self.metrics.dump(path)
+            with open(path, encoding='utf-8') as file:
+                self.assertIn('endpoints', json.load(file))
+            with self.assertRaises(ValueError):
+                self.metrics.dump(path, 'xml')
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
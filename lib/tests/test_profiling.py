@@ -0,0 +1,97 @@
+""" Test Cases for profiling.py """
+import json
+import os
+import pstats
+import tempfile
+import threading
+import tracemalloc
+import unittest
+from unittest.mock import MagicMock
+
+import lib.handler
+from lib.profiling import Profiler
+
+
+class ProfilerTestCase(unittest.TestCase):
+    """ Test Cases for Profiler """
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+
+    def test_phase(self):
+        """ Verify every call of a phase is timed """
+        profiler = Profiler(self.directory)
+        for _ in range(3):
+            with profiler.phase('listing'):
+                pass
+        with self.assertRaises(ValueError):
+            with profiler.phase('auth'):
+                raise ValueError('Boom')
+
+        self.assertEqual(3, profiler.phases['listing'].calls)
+        self.assertEqual(1, profiler.phases['auth'].calls)
+        self.assertGreaterEqual(profiler.phases['listing'].total, profiler.phases['listing'].maximum)
+
+    def test_phase_threads(self):
+        """ Verify phases entered from several threads are all counted """
+        profiler = Profiler(self.directory)
+        timed = profiler.timed(lambda: None, 'branches')
+        threads = [threading.Thread(target=lambda: [timed() for _ in range(100)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(400, profiler.phases['branches'].calls)
+
+    def test_timed_iterator(self):
+        """ Verify producing every item is timed, the items are unchanged """
+        profiler = Profiler(self.directory)
+        listing = profiler.timed_iterator(lambda start: iter(range(start, 5)), 'listing')
+        self.assertEqual([2, 3, 4], list(listing(2)))
+        # The call plus one per item plus the exhaustion
+        self.assertEqual(5, profiler.phases['listing'].calls)
+
+    def test_instrument(self):
+        """ Verify the handler is only instrumented while profiling """
+        handler = MagicMock()
+        handler.list_project_branches.return_value = ['main']
+        handler.iter_projects.return_value = iter(['project'])
+        decode = lib.handler.decode
+        with Profiler(self.directory) as profiler:
+            profiler.instrument(handler)
+            self.assertEqual(['main'], handler.list_project_branches('project'))
+            self.assertEqual(['project'], list(handler.iter_projects()))
+            lib.handler.decode({'key': 'project'}, dict)
+            self.assertIsNot(decode, lib.handler.decode)
+
+        self.assertIs(decode, lib.handler.decode)
+        self.assertEqual(1, profiler.phases['branches'].calls)
+        self.assertEqual(1, profiler.phases['decode'].calls)
+        self.assertIn('listing', profiler.phases)
+
+    def test_dump(self):
+        """ Verify the summary and the raw profiles are written """
+        tracing = tracemalloc.is_tracing()
+        profiler = Profiler(self.directory, cpu=True, memory=True)
+        with profiler.phase('audit'):
+            with profiler.phase('decode'):
+                sum(range(1000))
+        profiler.dump()
+        if not tracing:
+            tracemalloc.stop()
+
+        files = set(os.listdir(self.directory))
+        self.assertEqual({'summary.txt', 'summary.json', 'audit.pstats', 'audit.tracemalloc'},
+                         files)
+        with open(os.path.join(self.directory, 'summary.json'), encoding='utf-8') as file:
+            summary = json.load(file)
+        self.assertEqual(1, summary['decode']['calls'])
+        # Nested phases are only timed
+        self.assertIsNone(summary['decode']['memory'])
+        self.assertIsNotNone(summary['audit']['memory'])
+        self.assertTrue(pstats.Stats(os.path.join(self.directory, 'audit.pstats')).stats)
+        self.assertIn('decode', profiler.summary())
+
+
+if __name__ == '__main__':
+    unittest.main()
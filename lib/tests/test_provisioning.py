@@ -0,0 +1,102 @@
+""" Test Cases for provisioning.py """
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import create_autospec
+
+from sonarqube.utils.exceptions import ClientError
+
+from lib.handler import SonarHandler
+from lib.provisioning import (CREATED, EXISTING, FAILED, PARTIAL, UPDATED, load_manifest,
+                              provision, summarize)
+from lib.response import Branch, Component
+
+
+class ProvisioningTestCase(unittest.TestCase):
+    """ Test Cases for the provisioning of projects """
+
+    def setUp(self) -> None:
+        self.handler = create_autospec(SonarHandler)
+        self.handler.iter_projects.return_value = iter([Component({'key': 'existing'})])
+        self.projects = [
+            {'key': 'existing'},
+            {'key': 'new', 'name': 'New', 'visibility': 'private', 'main_branch': 'main'},
+            {'key': 'bare'},
+        ]
+
+    def write_manifest(self, projects) -> str:
+        """ Path of a manifest holding the projects """
+        handle, path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(handle, 'w', encoding='utf-8') as file:
+            json.dump(projects, file)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_load_manifest(self):
+        """ Verify the manifest is validated """
+        self.assertEqual(self.projects, load_manifest(self.write_manifest(self.projects)))
+        for projects in ({'key': 'a'}, [{'name': 'a'}], [{'key': 'a'}, {'key': 'a'}],
+                         [{'key': 'a', 'visibility': 'secret'}], [{'key': 'a', 'owner': 'me'}]):
+            with self.assertRaises(ValueError):
+                load_manifest(self.write_manifest(projects))
+
+    def test_provision(self):
+        """ Verify only the missing projects are created, listing the projects once """
+        results = provision(self.projects, self.handler)
+
+        self.assertEqual([EXISTING, CREATED, CREATED], [r.status for r in results])
+        self.handler.iter_projects.assert_called_once_with()
+        self.assertEqual(2, self.handler.create_project.call_count)
+        self.handler.create_project.assert_any_call('new', 'New', 'private')
+        self.handler.create_project.assert_any_call('bare', 'bare', None)
+        # Only projects with a main branch in the manifest are renamed
+        self.handler.rename_main_branch.assert_called_once_with('new', 'main')
+
+    def test_provision_concurrently(self):
+        """ Verify a failure is reported without stopping the other projects """
+        projects = [{'key': f'project-{i}'} for i in range(20)]
+
+        def create_project(key, *_):
+            if key == 'project-3':
+                raise ClientError('Forbidden')
+
+        self.handler.create_project.side_effect = create_project
+        seen = []
+
+        results = provision(projects, self.handler, workers=4, on_project=seen.append)
+
+        self.assertEqual([p['key'] for p in projects], [r.key for r in results])
+        self.assertEqual(FAILED, results[3].status)
+        self.assertEqual(20, len(seen))
+        self.assertEqual({CREATED: 19, PARTIAL: 0, UPDATED: 0, EXISTING: 0, FAILED: 1},
+                         summarize(results))
+
+    def test_provision_main_branch(self):
+        """ Verify a failed rename is reported apart and completed by the next run """
+        projects = [{'key': 'new', 'main_branch': 'main'}]
+        self.handler.rename_main_branch.side_effect = ClientError('Forbidden')
+
+        result, = provision(projects, self.handler)
+        self.assertEqual(PARTIAL, result.status)
+
+        # The project exists on the next run, only its main branch is set
+        self.handler.iter_projects.return_value = iter([Component({'key': 'new'})])
+        self.handler.list_project_branches.return_value = [
+            Branch({'name': 'master', 'isMain': True})]
+        self.handler.rename_main_branch.side_effect = None
+        result, = provision(projects, self.handler)
+        self.assertEqual(UPDATED, result.status)
+        self.assertEqual(1, self.handler.create_project.call_count)
+
+        # Nothing left to do once the main branch matches
+        self.handler.iter_projects.return_value = iter([Component({'key': 'new'})])
+        self.handler.list_project_branches.return_value = [
+            Branch({'name': 'main', 'isMain': True})]
+        result, = provision(projects, self.handler)
+        self.assertEqual(EXISTING, result.status)
+        self.assertEqual(2, self.handler.rename_main_branch.call_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
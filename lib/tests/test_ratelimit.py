@@ -0,0 +1,75 @@
+""" Test Cases for ratelimit.py """
+import time
+import unittest
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+from lib.ratelimit import MIN_RATE, RateLimiter, backoff, parse_retry_after
+
+
+class RateLimiterTestCase(unittest.TestCase):
+    """ Test Cases for RateLimiter """
+
+    def test_burst(self):
+        """ Verify a full bucket does not block """
+        limiter = RateLimiter(rate=100, burst=5)
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+        self.assertLess(time.monotonic() - start, 0.05)
+
+    def test_rate(self):
+        """ Verify an empty bucket waits for new tokens """
+        limiter = RateLimiter(rate=50, burst=1)
+        start = time.monotonic()
+        for _ in range(6):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_throttle(self):
+        """ Verify throttling halves the rate and honours Retry-After """
+        limiter = RateLimiter(rate=100)
+        limiter.on_throttle(0.1)
+        self.assertEqual(50, limiter.rate)
+
+        start = time.monotonic()
+        limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_recovery(self):
+        """ Verify the rate grows back up to the configured maximum """
+        limiter = RateLimiter(rate=2)
+        for _ in range(5):
+            limiter.on_throttle()
+        self.assertEqual(MIN_RATE, limiter.rate)
+        for _ in range(100):
+            limiter.on_success()
+        self.assertEqual(2, limiter.rate)
+
+
+class HelpersTestCase(unittest.TestCase):
+    """ Test Cases for the backoff helpers """
+
+    def test_parse_retry_after(self):
+        """ Verify Retry-After in seconds and as a date """
+        self.assertEqual(3.0, parse_retry_after('3'))
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
+        later = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+        self.assertAlmostEqual(30, parse_retry_after(later), delta=2)
+        # -0000 tells no zone, parsed as a naive date
+        naive = format_datetime(datetime.now(timezone.utc).replace(tzinfo=None)
+                                + timedelta(seconds=30))
+        self.assertTrue(naive.endswith('-0000'))
+        self.assertAlmostEqual(30, parse_retry_after(naive), delta=2)
+
+    def test_backoff(self):
+        """ Verify delays are bounded by the exponential envelope """
+        delays = list(backoff(retries=6, base=1, cap=10))
+        self.assertEqual(6, len(delays))
+        for attempt, delay in enumerate(delays):
+            self.assertLessEqual(delay, min(10, 2 ** attempt))
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,134 @@
+""" Test Cases for reconcile.py """
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import create_autospec, patch
+
+from sonarqube.utils.exceptions import ClientError
+
+from lib.handler import SonarHandler
+from lib.reconcile import (ReconcileState, Reconciler, Setting, fingerprint,
+                           load_desired_state)
+from lib.remediation import DELETE_BRANCH, RENAME_MAIN_BRANCH, UPDATE_VISIBILITY
+from lib.response import Branch, Component
+
+
+class ReconcilerTestCase(unittest.TestCase):
+    """ Test Cases for Reconciler """
+
+    def setUp(self) -> None:
+        self.components = {
+            'synced': Component({'key': 'synced', 'visibility': 'private'}),
+            'public': Component({'key': 'public', 'visibility': 'public'}),
+            'master': Component({'key': 'master', 'visibility': 'private'}),
+        }
+        self.branches = {
+            'synced': [Branch({'name': 'main', 'isMain': True})],
+            'public': [Branch({'name': 'main', 'isMain': True})],
+            'master': [Branch({'name': 'master', 'isMain': True}),
+                       Branch({'name': 'main', 'isMain': False})],
+        }
+        self.handler = create_autospec(SonarHandler)
+        self.handler.iter_projects.side_effect = lambda keys: \
+            iter([self.components[k] for k in keys if k in self.components])
+        self.handler.list_project_branches.side_effect = self.branches.get
+        self.desired = {key: {'visibility': 'private', 'main_branch': 'main'}
+                        for key in self.components}
+
+    def test_load_desired_state(self):
+        """ Verify the defaults are merged into the settings of every project """
+        handle, path = tempfile.mkstemp(suffix='.json')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(handle, 'w', encoding='utf-8') as file:
+            json.dump({'defaults': {'visibility': 'private', 'main_branch': 'main'},
+                       'projects': {'a': {}, 'b': {'visibility': 'public'}}}, file)
+
+        desired = load_desired_state(path)
+        self.assertEqual({'visibility': 'private', 'main_branch': 'main'}, desired['a'])
+        self.assertEqual({'visibility': 'public', 'main_branch': 'main'}, desired['b'])
+
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({'projects': {'a': {'quality_gate': 'strict'}}}, file)
+        with self.assertRaises(ValueError):
+            load_desired_state(path)
+
+    def test_setting_abstract(self):
+        """ Verify a setting must tell its value and the mutations changing it """
+        class ReadOnly(Setting):
+            """ Setting without mutations """
+            def current(self, snapshot):
+                return None
+
+        with self.assertRaises(TypeError):
+            ReadOnly()  # pylint: disable=abstract-class-instantiated
+
+    def test_minimal_mutations(self):
+        """ Verify only the settings that differ are written """
+        reconciler = Reconciler(self.handler, self.desired)
+        report = reconciler.reconcile()
+
+        self.assertEqual({'unchanged': 0, 'in_sync': 1, 'updated': 2, 'failed': 0, 'missing': 0},
+                         {k: v for k, v in report.items() if k != 'mutations'})
+        self.handler.update_visibility.assert_called_once_with('public', 'private')
+        self.handler.delete_branch.assert_called_once_with('master', 'main')
+        self.handler.rename_main_branch.assert_called_once_with('master', 'main')
+        self.assertEqual({DELETE_BRANCH, RENAME_MAIN_BRANCH, UPDATE_VISIBILITY},
+                         set(report['mutations']))
+
+    def test_steady_state(self):
+        """ Verify a second run over unchanged desired settings issues no call """
+        state = ReconcileState()
+        Reconciler(self.handler, self.desired, state).reconcile()
+        self.handler.reset_mock()
+
+        report = Reconciler(self.handler, self.desired, state).reconcile()
+        self.assertEqual(3, report['unchanged'])
+        self.assertEqual([], self.handler.method_calls)
+
+        # Changing the desired settings of a project reads that project only
+        self.desired['synced']['visibility'] = 'public'
+        Reconciler(self.handler, self.desired, state).reconcile()
+        self.handler.iter_projects.assert_called_once_with(keys=['synced'])
+        self.handler.update_visibility.assert_called_once_with('synced', 'public')
+
+    def test_drift(self):
+        """ Verify projects are verified again once their fingerprint is old """
+        state = ReconcileState()
+        state.record('synced', fingerprint(self.desired['synced']))
+        reconciler = Reconciler(self.handler, self.desired, state, max_age=60)
+        self.assertNotIn('synced', reconciler.pending())
+        self.assertIn('synced', reconciler.pending(forced=True))
+        verified_at = state.projects['synced']['verified_at']
+        with patch('lib.reconcile.time.time', return_value=verified_at + 61):
+            self.assertIn('synced', reconciler.pending())
+
+    def test_failures(self):
+        """ Verify failed and missing projects are read again on the next run """
+        self.desired['ghost'] = {'visibility': 'private'}
+        self.handler.update_visibility.side_effect = ClientError('Forbidden')
+        state = ReconcileState()
+
+        report = Reconciler(self.handler, self.desired, state).reconcile(workers=2)
+        self.assertEqual((1, 1), (report['failed'], report['missing']))
+        self.assertEqual({'synced', 'master'}, set(state.projects))
+
+    def test_dry_run(self):
+        """ Verify nothing is written """
+        report = Reconciler(self.handler, self.desired).reconcile(dry_run=True)
+        self.assertEqual(0, report['updated'])
+        self.handler.update_visibility.assert_not_called()
+        self.handler.rename_main_branch.assert_not_called()
+
+    def test_state_file(self):
+        """ Verify the fingerprints survive across runs """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'reconcile.json')
+            state = ReconcileState.load(path)
+            state.record('synced', 'digest')
+            state.save()
+            self.assertFalse(ReconcileState.load(path).changed('synced', 'digest'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+""" Test Cases for remediation.py """
+import unittest
+from unittest.mock import create_autospec
+
+from sonarqube.utils.exceptions import ValidationError
+
+from lib.handler import SonarHandler
+from lib.remediation import (DELETE_BRANCH, FAILED, RENAME_MAIN_BRANCH, SKIPPED, SUCCEEDED,
+                             Action, RemediationPlan, Remediator, execute, summarize)
+from lib.response import Branch, Component
+from lib.rules import ProjectBranchCompliant
+from lib.tests.test_utils import COMPONENT_PAYLOAD
+
+
+class RemediationTestCase(unittest.TestCase):
+    """ Test Cases for the remediation planner and executor """
+
+    def setUp(self) -> None:
+        self.handler = create_autospec(SonarHandler)
+        self.plan = RemediationPlan()
+        for i in range(5):
+            self.plan.add([
+                Action(f'project-{i}', DELETE_BRANCH, 'main'),
+                Action(f'project-{i}', RENAME_MAIN_BRANCH, 'main'),
+            ])
+
+    def test_plan_from_rule(self):
+        """ Verify the conflicting main branch is deleted before renaming """
+        self.handler.list_project_branches.return_value = [
+            Branch(dict(name='master', isMain=True)),
+            Branch(dict(name='main', isMain=False))
+        ]
+        rule = ProjectBranchCompliant(Component(COMPONENT_PAYLOAD), self.handler)
+        kinds = [action.kind for action in rule.remediation()]
+        self.assertEqual([DELETE_BRANCH, RENAME_MAIN_BRANCH], kinds)
+
+    def test_describe(self):
+        """ Verify the dry run output """
+        description = self.plan.describe()
+        self.assertIn('10 actions over 5 projects', description)
+        self.assertIn('project-0: delete_branch(main)', description)
+        self.assertFalse(self.handler.delete_branch.called)
+
+    def test_execute(self):
+        """ Verify every action is applied and reported in plan order """
+        for workers in (1, 3):
+            with self.subTest(workers):
+                results = execute(self.plan, self.handler, workers)
+                self.assertEqual(list(self.plan), [r.action for r in results])
+                self.assertTrue(all(r.status == SUCCEEDED for r in results))
+
+    def test_execute_failure(self):
+        """ Verify a failed delete skips the rename of the same project only """
+        def delete_branch(project_key, _):
+            if project_key == 'project-2':
+                raise ValidationError('boom')
+
+        self.handler.delete_branch.side_effect = delete_branch
+        results = execute(self.plan, self.handler, 3)
+
+        self.assertEqual([FAILED, SKIPPED], [r.status for r in results[4:6]])
+        self.assertEqual(4, self.handler.rename_main_branch.call_count)
+        summary = summarize(results)
+        self.assertEqual({SUCCEEDED: 4, FAILED: 1, SKIPPED: 0}, summary[DELETE_BRANCH])
+        self.assertEqual({SUCCEEDED: 4, FAILED: 0, SKIPPED: 1}, summary[RENAME_MAIN_BRANCH])
+
+    def test_execute_on_project(self):
+        """ Verify the results of each project are reported as soon as it is remediated """
+        remediated = []
+        execute(self.plan, self.handler, 3, remediated.append)
+        self.assertEqual(5, len(remediated))
+        for results in remediated:
+            self.assertEqual(1, len({r.action.project_key for r in results}))
+            self.assertEqual(2, len(results))
+
+    def test_remediator(self):
+        """ Verify projects are remediated as they are submitted, within a bounded window """
+        for workers in (1, 3):
+            with self.subTest(workers):
+                remediated = []
+                with Remediator(self.handler, workers) as remediator:
+                    for project_key in self.plan.projects:
+                        remediator.submit(self.plan.actions(project_key), remediated.append)
+                        pending = remediator._pending  # pylint: disable=protected-access
+                        self.assertLessEqual(len(pending), remediator.window)
+                    remediator.submit([])
+                self.assertEqual(5, len(remediated))
+                self.assertEqual({SUCCEEDED: 5, FAILED: 0, SKIPPED: 0},
+                                 remediator.summary()[RENAME_MAIN_BRANCH])
+
+    def test_remediator_admit(self):
+        """ Verify projects refused by the admission are skipped """
+        remediator = Remediator(self.handler, admit=lambda actions: False)
+        remediator.submit(self.plan.actions('project-0'))
+        remediator.close()
+        self.assertFalse(self.handler.delete_branch.called)
+        self.assertEqual({SUCCEEDED: 0, FAILED: 0, SKIPPED: 1},
+                         remediator.summary()[DELETE_BRANCH])
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,78 @@
+""" Test Cases for report.py """
+import csv
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from lib.report import REPORT_FIELDS, ReportSink, publish_outputs
+
+
+class ReportSinkTestCase(unittest.TestCase):
+    """ Test Cases for ReportSink """
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.path = os.path.join(self.directory.name, 'report')
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_jsonl(self):
+        """ Verify one JSON document per project """
+        with ReportSink(self.path) as sink:
+            sink.write(project='a', main_branch='main', compliant=True, audit_seconds=0.123456)
+            sink.write(project='b', compliant=False, violations=['main_branch', 'visibility'],
+                       error=ValueError('boom'))
+        with open(self.path, encoding='utf-8') as file:
+            records = [json.loads(line) for line in file]
+        self.assertEqual([r['project'] for r in records], ['a', 'b'])
+        self.assertEqual(list(records[0]), list(REPORT_FIELDS))
+        self.assertEqual(records[0]['audit_seconds'], 0.1235)
+        self.assertEqual(records[1]['violations'], 'main_branch;visibility')
+        self.assertEqual(records[1]['error'], 'boom')
+
+    def test_csv(self):
+        """ Verify CSV output with a header """
+        with ReportSink(self.path, 'csv') as sink:
+            sink.write(project='a', compliant=True)
+        with open(self.path, encoding='utf-8', newline='') as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual(rows, [dict({f: '' for f in REPORT_FIELDS}, project='a', compliant='True')])
+
+    def test_incremental_flush(self):
+        """ Verify records reach the file before the sink is closed """
+        with ReportSink(self.path, flush_every=2) as sink:
+            sink.write(project='a')
+            sink.write(project='b')
+            with open(self.path, encoding='utf-8') as file:
+                self.assertEqual(len(file.readlines()), 2)
+
+    def test_unknown_format(self):
+        """ Verify unsupported formats are refused """
+        self.assertRaises(ValueError, ReportSink, self.path, 'xml')
+
+
+class PublishOutputsTestCase(unittest.TestCase):
+    """ Test Cases for publish_outputs """
+
+    def test_outputs(self):
+        """ Verify the counts are appended as GitHub Action outputs """
+        with tempfile.NamedTemporaryFile('w+', encoding='utf-8') as file:
+            report = {'audited': 3, 'compliant': 2, 'non_compliant': 1, 'failed': 0}
+            self.assertTrue(publish_outputs(report, file.name))
+            lines = file.read().splitlines()
+        self.assertEqual(lines, ['audited=3', 'compliant=2', 'non_compliant=1', 'failed=0',
+                                 'unchanged=0', 'skipped=0', 'deferred=0'])
+
+    def test_outside_workflow(self):
+        """ Verify nothing happens without GITHUB_OUTPUT """
+        environ = dict(os.environ)
+        environ.pop('GITHUB_OUTPUT', None)
+        with patch.dict(os.environ, environ, clear=True):
+            self.assertFalse(publish_outputs({'audited': 1}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,8 +3,10 @@ import unittest
 from unittest.mock import create_autospec
 
 from lib.handler import SonarHandler
+from lib.remediation import RENAME_MAIN_BRANCH
 from lib.response import Component, Branch
-from lib.rules import ProjectBranchCompliant
+from lib.rules import (RULES, MainBranchRule, ProjectBranchCompliant, Rule, RuleEngine,
+                       StaleBranchesRule, VisibilityRule, fingerprint, load_rules)
 from lib.tests.test_utils import COMPONENT_PAYLOAD, BRANCH_PAYLOAD
 
 
@@ -48,5 +50,58 @@ class ProjectBranchCompliantTestCase(unittest.TestCase):
         self.assertTrue(self.handler.rename_main_branch.called)
 
 
+class RuleEngineTestCase(unittest.TestCase):
+    """ Test Cases for RuleEngine """
+
+    def setUp(self) -> None:
+        self.handler = create_autospec(SonarHandler)
+        self.handler.list_project_branches.return_value = [
+            Branch(dict(BRANCH_PAYLOAD, name='master', isMain=True)),
+            Branch(dict(BRANCH_PAYLOAD, name='feature', isMain=False)),
+        ]
+        self.project = Component(dict(COMPONENT_PAYLOAD, visibility='public'))
+
+    def test_registry(self):
+        """ Verify the rules are registered by name """
+        self.assertIs(MainBranchRule, RULES['main_branch'])
+        self.assertIs(VisibilityRule, RULES['visibility'])
+        self.assertIs(StaleBranchesRule, RULES['stale_branches'])
+        with self.assertRaises(TypeError):
+            Rule()  # pylint: disable=abstract-class-instantiated
+
+    def test_fingerprint(self):
+        """ Verify the fingerprint follows the rules and their parameters, not their order """
+        default = fingerprint(load_rules())
+        self.assertEqual(default, fingerprint(load_rules(['main_branch'])))
+        self.assertEqual(fingerprint(load_rules(['visibility', 'main_branch'])),
+                         fingerprint(load_rules(['main_branch', 'visibility'])))
+        self.assertNotEqual(default, fingerprint(load_rules(['main_branch', 'visibility'])))
+        self.assertNotEqual(fingerprint([StaleBranchesRule()]), fingerprint([StaleBranchesRule(1)]))
+
+    def test_default_rules(self):
+        """ Verify the main branch rule is evaluated by default """
+        evaluation = RuleEngine(self.handler).evaluate(self.project)
+        self.assertFalse(evaluation.compliant)
+        self.assertEqual(['main_branch'], evaluation.violations)
+        self.assertEqual([RENAME_MAIN_BRANCH], [a.kind for a in evaluation.actions])
+
+    def test_shared_fetch(self):
+        """ Verify the branches are fetched once for every rule """
+        engine = RuleEngine(self.handler, ['main_branch', 'visibility', StaleBranchesRule(0)])
+        evaluation = engine.evaluate(self.project)
+
+        self.assertEqual(1, self.handler.list_project_branches.call_count)
+        self.assertEqual(['main_branch', 'visibility', 'stale_branches'], evaluation.violations)
+        # The branch configuration is indexed once, whatever reads it
+        self.assertIs(evaluation.snapshot.branch_compliance, evaluation.snapshot.branch_compliance)
+
+    def test_project_only(self):
+        """ Verify rules over the project alone do not fetch branches """
+        evaluation = RuleEngine(self.handler, ['visibility']).evaluate(Component(COMPONENT_PAYLOAD))
+        self.assertTrue(evaluation.compliant)
+        self.assertFalse(self.handler.list_project_branches.called)
+        self.assertIsNone(evaluation.snapshot.branch_compliance)
+
+
 if __name__ == '__main__':  # pragma: no cover
     unittest.main()
@@ -0,0 +1,137 @@
+""" Test Cases for scheduler.py """
+import unittest
+from unittest.mock import patch
+
+from lib.audit import AuditResult
+from lib.incremental import AuditState
+from lib.metrics import Metrics
+from lib.remediation import DELETE_BRANCH, RENAME_MAIN_BRANCH, Action
+from lib.response import Component
+from lib.scheduler import Deadline, Scheduler
+
+
+def new_project(key: str, analyzed: str = None) -> Component:
+    """ Component analyzed on the given day of January 2023 """
+    date = f'2023-01-{analyzed}T00:00:00+0000' if analyzed else None
+    return Component({'key': key, 'lastAnalysisDate': date})
+
+
+class SchedulerTestCase(unittest.TestCase):
+    """ Test Cases for Scheduler """
+
+    def setUp(self) -> None:
+        self.metrics = Metrics()
+        self.now = 1000.0
+        clock = patch('lib.scheduler.time.monotonic', side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def observe(self, endpoint: str, latency: float, calls: int = 1):
+        """ Record calls of an endpoint """
+        for _ in range(calls):
+            self.metrics._stats(endpoint).observe(latency)  # pylint: disable=protected-access
+
+    def test_deadline(self):
+        """ Verify the reserve is kept out of the budget """
+        deadline = Deadline(100, reserve=5)
+        self.now += 20
+        self.assertEqual(75, deadline.remaining())
+        # The reserve never takes more than a tenth of the budget
+        self.assertEqual(10, Deadline(100, reserve=30).reserve)
+
+    def test_order_recent(self):
+        """ Verify the most recently analyzed projects go first """
+        scheduler = Scheduler(100, self.metrics, priority='recent')
+        projects = [new_project('a', '01'), new_project('b'), new_project('c', '09')]
+        self.assertEqual(['c', 'a', 'b'], [p.key for p in scheduler.order(projects)])
+
+    def test_order_non_compliant(self):
+        """ Verify known violations go first, then unknown projects, then compliant ones """
+        state = AuditState('state.json', projects={'a': {'compliant': True},
+                                                   'b': {'compliant': False}})
+        scheduler = Scheduler(100, self.metrics, state=state)
+        projects = [new_project('a', '09'), new_project('b', '01'), new_project('c', '05'),
+                    new_project('d', '07')]
+        self.assertEqual(['b', 'd', 'c', 'a'], [p.key for p in scheduler.order(projects)])
+
+    def test_schedule_stops_before_deadline(self):
+        """ Verify no audit starts once the queued ones would not end in time """
+        self.observe('project_branches.search_project_branches', 1.0)
+        scheduler = Scheduler(20, self.metrics, workers=2, reserve=0)
+        projects = [new_project(str(i)) for i in range(100)]
+
+        audited = []
+        for project in scheduler.schedule(projects):
+            audited.append(project.key)
+            self.now += 1
+            scheduler.observe(AuditResult(project, compliant=True, elapsed=1.0))
+
+        # Every audit leaves two more queued behind it
+        self.assertEqual(17, len(audited))
+        self.assertEqual(83, len(scheduler.skipped))
+        self.assertEqual(audited + scheduler.skipped, [p.key for p in projects])
+        self.assertTrue(scheduler.exhausted)
+
+    def test_planned_remediation_reserved(self):
+        """ Verify the remediation already planned shortens the audits """
+        self.observe('project_branches.rename_project_branch', 5.0)
+        scheduler = Scheduler(100, self.metrics, reserve=0)
+        project = new_project('a')
+        actions = [Action('a', RENAME_MAIN_BRANCH, 'main')] * 10
+        scheduler.observe(AuditResult(project, compliant=False, actions=actions, elapsed=1.0))
+
+        self.assertEqual(50, scheduler.remediation_cost())
+        self.now += 46
+        self.assertTrue(scheduler.admits_audit())
+        self.now += 2
+        self.assertFalse(scheduler.admits_audit())
+
+    def test_dry_run_reserves_nothing(self):
+        """ Verify nothing is reserved for a remediation that will not run """
+        self.observe('project_branches.rename_project_branch', 5.0)
+        scheduler = Scheduler(100, self.metrics, reserve=0, remediation=False)
+        actions = [Action('a', RENAME_MAIN_BRANCH, 'main')] * 10
+        scheduler.observe(AuditResult(new_project('a'), compliant=False, actions=actions,
+                                      elapsed=1.0))
+
+        self.assertEqual(0, scheduler.remediation_cost())
+        self.now += 48
+        self.assertTrue(scheduler.admits_audit())
+
+    def test_admits_remediation(self):
+        """ Verify a project only starts remediation when its mutations fit """
+        self.observe('project_branches.delete_project_branch', 2.0)
+        self.observe('project_branches.rename_project_branch', 3.0)
+        scheduler = Scheduler(10, self.metrics, reserve=0)
+        actions = [Action('a', DELETE_BRANCH, 'main'), Action('a', RENAME_MAIN_BRANCH, 'main')]
+        scheduler.plan(actions)
+
+        self.assertTrue(scheduler.admits_remediation(actions))
+        self.assertEqual(0, scheduler.remediation_cost())
+        self.now += 6
+        self.assertFalse(scheduler.admits_remediation(actions))
+        self.assertEqual(['a'], scheduler.deferred)
+
+    def test_unknown_priority(self):
+        """ Verify unsupported priorities are refused """
+        self.assertRaises(ValueError, Scheduler, 10, self.metrics, priority='random')
+
+
+class MetricsMeanTestCase(unittest.TestCase):
+    """ Test Cases for Metrics.mean """
+
+    def test_mean(self):
+        """ Verify the mean latency of an endpoint and of every endpoint """
+        metrics = Metrics()
+        self.assertIsNone(metrics.mean())
+        with patch('lib.metrics.time.perf_counter', side_effect=[0, 1, 0, 3, 0, 2]):
+            for endpoint in ('a', 'a', 'b'):
+                with metrics.track(endpoint):
+                    pass
+        self.assertEqual(2, metrics.mean('a'))
+        self.assertEqual(2, metrics.mean())
+        self.assertIsNone(metrics.mean('c'))
+
+
+if __name__ == '__main__':
+    unittest.main()
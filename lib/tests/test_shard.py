@@ -0,0 +1,99 @@
+""" Test Cases for shard.py """
+import json
+import os
+import tempfile
+import unittest
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import patch
+
+from lib.shard import load_targets, merge_reports, run_targets, target_settings
+from lib.runner import new_report
+
+
+def report_token(settings: Namespace) -> dict:
+    """ Report of a target holding the token it was audited with """
+    report = new_report(settings)
+    report['token'] = os.environ.get('SONAR_TOKEN')
+    return report
+
+
+class ShardTestCase(unittest.TestCase):
+    """ Test Cases for the sharded audit """
+
+    def setUp(self) -> None:
+        self.args = Namespace(platform='sonarcloud', organization=None, workers=1,
+                              metrics_file='metrics.json', dry_run=True)
+        self.targets = [
+            {'platform': 'sonarcloud', 'organization': 'org-a', 'token_env': 'ORG_A_TOKEN'},
+            {'platform': 'sonarqube', 'host': 'sonar.local', 'port': 9000},
+        ]
+
+    def test_load_targets(self):
+        """ Verify the targets file is validated """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'targets.json')
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump(self.targets, file)
+            self.assertEqual(self.targets, load_targets(path))
+
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump([{'organization': 'org-a'}], file)
+            with self.assertRaises(ValueError):
+                load_targets(path)
+
+    def test_target_settings(self):
+        """ Verify a target overrides the run settings """
+        settings = target_settings(self.targets[1], self.args, 4, 1)
+        self.assertEqual(('sonarqube', 'sonar.local', 9000), (settings.platform, settings.host, settings.port))
+        self.assertIsNone(settings.organization)
+        self.assertEqual(4, settings.workers)
+        self.assertEqual('metrics.json.1', settings.metrics_file)
+        self.assertTrue(settings.dry_run)
+
+    def test_merge_reports(self):
+        """ Verify counts are added across targets """
+        reports = [new_report(Namespace(platform='sonarcloud', organization=[f'org-{i}']))
+                   for i in range(2)]
+        reports[0].update(audited=3, compliant=1, non_compliant=2,
+                          remediation={'rename_main_branch': {'succeeded': 2}})
+        reports[1].update(audited=1, failed=1, error='boom',
+                          remediation={'rename_main_branch': {'succeeded': 1, 'failed': 1}})
+
+        totals = merge_reports(reports)['totals']
+        self.assertEqual((4, 1, 2, 1, 1), (totals['audited'], totals['compliant'],
+                                           totals['non_compliant'], totals['failed'],
+                                           totals['errors']))
+        self.assertEqual({'succeeded': 3, 'failed': 1}, totals['remediation']['rename_main_branch'])
+        self.assertEqual('org-1', reports[1]['organization'])
+
+    def test_run_targets_isolation(self):
+        """ Verify failing targets are reported without stopping the others """
+        targets = [{'platform': 'invalid'}, {'platform': 'unknown'}]
+        report = run_targets(targets, self.args, processes=2, total_workers=4)
+        self.assertEqual(['invalid', 'unknown'], [t['platform'] for t in report['targets']])
+        self.assertEqual(2, report['totals']['errors'])
+
+    def test_run_targets_total_workers(self):
+        """ Verify the processes are capped by the total workers """
+        targets = [{'platform': 'invalid'}] * 4
+        with patch('lib.shard.ProcessPoolExecutor', wraps=ProcessPoolExecutor) as executor:
+            run_targets(targets, self.args, processes=4, total_workers=2)
+        self.assertEqual(2, executor.call_args.kwargs['max_workers'])
+
+    @patch.dict(os.environ, {'ORG_A_TOKEN': 'secretA'})
+    def test_run_targets_tokens(self):
+        """ Verify a reused worker process does not leak the token of a target to the next """
+        os.environ.pop('SONAR_TOKEN', None)
+        targets = [
+            {'platform': 'sonarcloud', 'organization': 'a', 'token_env': 'ORG_A_TOKEN'},
+            {'platform': 'sonarcloud', 'organization': 'b'},
+        ]
+        # Forked workers inherit the patch
+        with patch('lib.shard.audit_organization', report_token):
+            report = run_targets(targets, self.args, processes=1)
+        self.assertEqual(['secretA', None], [t['token'] for t in report['targets']])
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,167 @@
+""" Test Cases for transport.py """
+import socket
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from requests import Session
+from requests.exceptions import ConnectionError as RequestsConnectionError
+
+from lib.metrics import Metrics
+from lib.ratelimit import RateLimiter
+from lib.transport import PooledTransport
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """ Minimal HTTP/1.1 server answering an empty JSON object """
+    protocol_version = 'HTTP/1.1'
+    throttled = 0
+    status = 429
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """ Answer every request, failing the first ones with the status if requested """
+        body = b'{}'
+        if KeepAliveHandler.throttled:
+            KeepAliveHandler.throttled -= 1
+            self.send_response(KeepAliveHandler.status)
+            self.send_header('Retry-After', '0')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_POST = do_GET
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        """ Silence the server """
+
+
+class PooledTransportTestCase(unittest.TestCase):
+    """ Test Cases for PooledTransport """
+
+    def setUp(self) -> None:
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/'
+
+    def tearDown(self) -> None:
+        KeepAliveHandler.throttled = 0
+        KeepAliveHandler.status = 429
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connection_reuse(self):
+        """ Verify sequential requests share a single connection """
+        transport = PooledTransport(pool_size=2, connect_timeout=1, read_timeout=1)
+        session = Session()
+        transport.mount(session)
+
+        for _ in range(5):
+            session.get(self.url).raise_for_status()
+
+        stats = transport.stats()
+        self.assertEqual(5, stats['requests'])
+        self.assertEqual(1, stats['connections'])
+        self.assertEqual(0.8, stats['reuse_ratio'])
+        self.assertEqual(1, stats['open_connections'])
+
+    def test_throttled_retry(self):
+        """ Verify throttled requests are retried and slow the limiter down """
+        KeepAliveHandler.throttled = 2
+        limiter = RateLimiter(rate=100)
+        transport = PooledTransport(limiter=limiter, retries=3)
+        session = Session()
+        transport.mount(session)
+
+        self.assertEqual(200, session.get(self.url).status_code)
+        self.assertEqual(3, transport.stats()['requests'])
+        self.assertLess(limiter.rate, 100)
+
+    def test_throttled_exhausted(self):
+        """ Verify the throttled response is returned once the retries are exhausted """
+        KeepAliveHandler.throttled = 5
+        transport = PooledTransport(retries=1)
+        session = Session()
+        transport.mount(session)
+
+        self.assertEqual(429, session.get(self.url).status_code)
+        KeepAliveHandler.throttled = 0
+
+    @patch('lib.transport.time.sleep')
+    def test_server_error_read(self, sleep_mock):
+        """ Verify reads are retried after server errors """
+        KeepAliveHandler.throttled, KeepAliveHandler.status = 2, 500
+        transport = PooledTransport(retries=3)
+        session = Session()
+        transport.mount(session)
+
+        self.assertEqual(200, session.get(self.url).status_code)
+        self.assertEqual(3, transport.stats()['requests'])
+        self.assertEqual(2, sleep_mock.call_count)
+
+    @patch('lib.transport.time.sleep')
+    def test_server_error_write(self, _):
+        """ Verify writes are not retried once the server may have processed them """
+        transport = PooledTransport(retries=3)
+        session = Session()
+        transport.mount(session)
+
+        for status in (500, 503):
+            KeepAliveHandler.throttled, KeepAliveHandler.status = 1, status
+            self.assertEqual(status, session.post(self.url).status_code)
+        self.assertEqual(2, transport.stats()['requests'])
+
+        # Throttled writes were rejected and are sent again
+        KeepAliveHandler.throttled, KeepAliveHandler.status = 1, 429
+        self.assertEqual(200, session.post(self.url).status_code)
+        self.assertEqual(4, transport.stats()['requests'])
+
+    @patch('lib.transport.time.sleep')
+    def test_unsent_write(self, sleep_mock):
+        """ Verify writes are retried when the connection could not be established """
+        with socket.socket() as closed:
+            closed.bind(('127.0.0.1', 0))
+            port = closed.getsockname()[1]
+        transport = PooledTransport(retries=2)
+        session = Session()
+        transport.mount(session)
+
+        with self.assertRaises(RequestsConnectionError):
+            session.post(f'http://127.0.0.1:{port}/')
+        self.assertEqual(3, transport.stats()['requests'])
+        self.assertEqual(2, sleep_mock.call_count)
+
+    def test_metrics(self):
+        """ Verify every attempt is timed by endpoint, known by its path outside a call """
+        KeepAliveHandler.throttled = 1
+        metrics = Metrics()
+        transport = PooledTransport(retries=1, metrics=metrics)
+        session = Session()
+        transport.mount(session)
+
+        with metrics.attribute('projects.search_projects'):
+            session.get(self.url)
+        session.get(self.url + 'api/server/version')
+
+        endpoints = metrics.snapshot()['endpoints']
+        search = endpoints['projects.search_projects']
+        self.assertEqual((2, 1, 4), (search['calls'], search['errors'], search['bytes']))
+        self.assertEqual(1, endpoints['api/server/version']['calls'])
+
+    def test_timeouts(self):
+        """ Verify the configured timeouts are applied """
+        transport = PooledTransport(connect_timeout=1, read_timeout=2)
+        self.assertEqual((1, 2), transport.timeout)
+
+    def test_empty_stats(self):
+        """ Verify statistics before any request """
+        stats = PooledTransport().stats()
+        self.assertEqual(0, stats['requests'])
+        self.assertEqual(0.0, stats['reuse_ratio'])
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
@@ -1,8 +1,9 @@
 """ Test Cases for utils.py """
+import json
 import unittest
 
 from lib.response import Validate, Component, Branch
-from lib.utils import from_json
+from lib.utils import decode, from_json
 
 VALID_PAYLOAD = {'valid': True}
 COMPONENT_PAYLOAD = {
@@ -66,5 +67,34 @@ class TestFromJson(unittest.TestCase):
         self.assertIsInstance(str(value), str)
 
 
+class TestDecode(unittest.TestCase):
+    """ Test Case for decode """
+
+    def test_decode_object(self):
+        """ Test Case for a single object """
+        value = decode(VALID_PAYLOAD, Validate)
+        self.assertIsInstance(value, Validate)
+        self.assertTrue(value.valid)
+
+    def test_decode_document(self):
+        """ Test Case for a JSON document """
+        value = decode(json.dumps(VALID_PAYLOAD), Validate)
+        self.assertIsInstance(value, Validate)
+
+    def test_decode_list(self):
+        """ Test Case for a list of objects """
+        value = decode([BRANCH_PAYLOAD, BRANCH_PAYLOAD], Branch)
+        self.assertEqual(2, len(value))
+        self.assertTrue(all(isinstance(b, Branch) for b in value))
+        # Nested values are kept as provided
+        self.assertEqual(BRANCH_PAYLOAD['commit'], value[0].commit)
+
+    def test_decode_schema(self):
+        """ Test Case for a payload which key probing would misclassify """
+        payload = dict(BRANCH_PAYLOAD, key='k', qualifier='TRK', valid=True)
+        value = decode(payload, Branch)
+        self.assertIsInstance(value, Branch)
+
+
 if __name__ == '__main__':  # pragma: no cover
     unittest.main()
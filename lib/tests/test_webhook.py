@@ -0,0 +1,146 @@
+""" Test Cases for webhook.py """
+import hashlib
+import hmac
+import json
+import threading
+import time
+import unittest
+from http.client import HTTPConnection
+from unittest.mock import create_autospec
+
+from lib.handler import SonarHandler
+from lib.response import Branch, Component
+from lib.rules import RuleEngine
+from lib.webhook import (HEALTH_PATH, SIGNATURE_HEADER, WEBHOOK_PATH, DebouncedQueue,
+                         WebhookServer, verify_signature)
+
+
+def wait_for(condition, timeout: float = 5.0):
+    """ Poll until a condition holds """
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class DebouncedQueueTestCase(unittest.TestCase):
+    """ Test Cases for DebouncedQueue """
+
+    def setUp(self) -> None:
+        self.runs = []
+        self.lock = threading.Lock()
+
+    def task(self, key):
+        """ Record a run """
+        with self.lock:
+            self.runs.append(key)
+
+    def test_burst_collapses(self):
+        """ Verify a burst of submissions of a key runs it once """
+        queue = DebouncedQueue(self.task, delay=0.1, workers=2)
+        queue.start()
+        try:
+            for _ in range(10):
+                queue.submit('a')
+            queue.submit('b')
+            self.assertTrue(wait_for(lambda: len(self.runs) == 2))
+            time.sleep(0.2)
+        finally:
+            queue.stop()
+        self.assertEqual(['a', 'b'], sorted(self.runs))
+        self.assertEqual(9, queue.stats['collapsed'])
+
+    def test_submitted_while_running(self):
+        """ Verify a key submitted while running runs again afterwards, never concurrently """
+        started = threading.Event()
+        release = threading.Event()
+        active = []
+
+        def task(key):
+            active.append(key)
+            self.assertEqual(1, len(active))
+            started.set()
+            release.wait(5)
+            self.runs.append(key)
+            active.remove(key)
+
+        queue = DebouncedQueue(task, delay=0, workers=4)
+        queue.start()
+        try:
+            queue.submit('a')
+            self.assertTrue(started.wait(5))
+            queue.submit('a')
+            time.sleep(0.1)
+            release.set()
+            self.assertTrue(wait_for(lambda: len(self.runs) == 2))
+        finally:
+            queue.stop()
+        self.assertEqual(2, queue.stats['processed'])
+
+
+class WebhookServerTestCase(unittest.TestCase):
+    """ Test Cases for WebhookServer """
+
+    def setUp(self) -> None:
+        self.handler = create_autospec(SonarHandler)
+        self.handler.list_project_branches.return_value = [Branch(dict(name='master', isMain=True))]
+        self.handler.iter_projects.side_effect = lambda keys: iter(
+            [Component(dict(key='my-org_project', name='project', visibility='private'))])
+        self.server = WebhookServer(self.handler, RuleEngine(self.handler), port=0,
+                                    secret='secret', debounce=0.05)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+
+    def post(self, payload: dict, secret: str = 'secret') -> int:
+        """ Send a webhook, signed with the secret """
+        body = json.dumps(payload).encode()
+        signature = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+        connection = HTTPConnection('127.0.0.1', self.server.port)
+        connection.request('POST', WEBHOOK_PATH, body, {SIGNATURE_HEADER: signature})
+        status = connection.getresponse().status
+        connection.close()
+        return status
+
+    def test_webhooks_remediate_project(self):
+        """ Verify a burst of webhooks audits and remediates the project once """
+        payload = {'status': 'SUCCESS', 'project': {'key': 'my-org_project', 'name': 'project'}}
+        for _ in range(5):
+            self.assertEqual(202, self.post(payload))
+
+        self.assertTrue(wait_for(lambda: self.server.health().get('processed') == 1))
+        self.handler.iter_projects.assert_called_once_with(keys=['my-org_project'])
+        self.handler.list_project_branches.assert_called_once_with('my-org_project')
+        self.handler.rename_main_branch.assert_called_once_with('my-org_project', 'main')
+
+        connection = HTTPConnection('127.0.0.1', self.server.port)
+        connection.request('GET', HEALTH_PATH)
+        health = json.loads(connection.getresponse().read())
+        connection.close()
+        self.assertEqual(4, health['collapsed'])
+        self.assertEqual(0, health['pending'])
+
+    def test_deleted_project(self):
+        """ Verify webhooks of a project gone from the server are dropped """
+        self.assertEqual(202, self.post({'project': {'key': 'my-org_deleted'}}))
+
+        self.assertTrue(wait_for(lambda: self.server.health().get('processed') == 1))
+        self.handler.list_project_branches.assert_not_called()
+
+    def test_invalid_signature(self):
+        """ Verify unsigned webhooks are rejected """
+        self.assertEqual(401, self.post({'project': {'key': 'a'}}, secret='other'))
+        self.assertEqual(0, len(self.server.queue))
+
+    def test_failed_analysis(self):
+        """ Verify failed analyses are acknowledged but not audited """
+        self.assertEqual(200, self.post({'status': 'FAILED', 'project': {'key': 'a'}}))
+        self.assertEqual(0, len(self.server.queue))
+
+    def test_verify_signature(self):
+        """ Verify signatures are only required with a secret """
+        self.assertTrue(verify_signature(b'{}', None, None))
+        self.assertFalse(verify_signature(b'{}', None, 'secret'))
+
+
+if __name__ == '__main__':
+    unittest.main()
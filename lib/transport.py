@@ -0,0 +1,165 @@
+""" Pooled Keep-Alive HTTP Transport """
+import logging
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError as RequestsConnectionError, ConnectTimeout, Timeout
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+from lib.metrics import Metrics
+from lib.ratelimit import DEFAULT_RETRIES, RateLimiter, backoff, parse_retry_after
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 60.0
+THROTTLED_STATUS = (429, 503)
+# Requests without side effects, safe to send again whatever happened to the previous attempt
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def _unsent(error: Exception) -> bool:
+    """ Whether a failed request never reached the server """
+    if isinstance(error, ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+class PooledTransport(HTTPAdapter):
+    """ HTTP adapter keeping a bounded pool of keep-alive connections per host """
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 limiter: Optional[RateLimiter] = None, retries: int = DEFAULT_RETRIES,
+                 metrics: Optional[Metrics] = None):
+        """ Constructor
+
+        Args:
+            pool_size: Maximum number of connections kept alive per host, usually the concurrency
+            connect_timeout: Seconds to wait while establishing a connection
+            read_timeout: Seconds to wait for a response
+            limiter: Rate limiter shared by every request, if any
+            retries: Attempts left to a failed request before giving up
+            metrics: Registry timing every request and its bytes by endpoint, if any
+        """
+        self.pool_size = max(1, pool_size)
+        self.timeout = (connect_timeout, read_timeout)
+        self.limiter = limiter
+        self.retries = retries
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._requests = 0
+        # Block instead of opening throwaway connections once the pool is exhausted
+        super().__init__(pool_connections=self.pool_size, pool_maxsize=self.pool_size,
+                         pool_block=True)
+
+    def mount(self, session: Session):
+        """ Route every request of a session through this transport """
+        session.headers['Connection'] = 'keep-alive'
+        for prefix in ('https://', 'http://'):
+            session.mount(prefix, self)
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+        """ Apply the configured timeouts and rate, retrying the failures safe to retry
+
+        Reads are retried after server errors, connection errors and timeouts. Writes
+        are only retried when the server did not process them: throttled with a 429
+        or never sent because the connection could not be established. This is the
+        only layer retrying requests, every attempt comes out of the same budget.
+        """
+        kwargs['timeout'] = self.timeout
+        idempotent = request.method in IDEMPOTENT_METHODS
+        # Requests issued outside a handler call are known by their path
+        endpoint = (self.metrics.current or urlsplit(request.url).path.strip('/')) \
+            if self.metrics else None
+        delays = backoff(self.retries)
+        while True:
+            if self.limiter:
+                self.limiter.acquire()
+            with self._lock:
+                self._requests += 1
+            try:
+                response = self._attempt(request, endpoint, **kwargs)
+            except (RequestsConnectionError, Timeout) as error:
+                delay = next(delays, None) if idempotent or _unsent(error) else None
+                if delay is None:
+                    raise
+                logging.warning("%s %s failed with %s, retrying in %.2fs", request.method,
+                                request.url, error, delay)
+                time.sleep(delay)
+                continue
+
+            status = response.status_code
+            throttled = status == 429 or (status in THROTTLED_STATUS and idempotent)
+            if not throttled and not (status >= 500 and idempotent):
+                if self.limiter:
+                    self.limiter.on_success()
+                return response
+
+            retry_after = parse_retry_after(response.headers.get('Retry-After')) \
+                if throttled else None
+            if throttled and self.limiter:
+                self.limiter.on_throttle(retry_after)
+            delay = next(delays, None)
+            if delay is None:
+                return response
+
+            logging.warning("%s %s answered %s, retrying", request.method, request.url, status)
+            response.close()
+            if retry_after is None:
+                time.sleep(delay)
+            elif not self.limiter:
+                time.sleep(retry_after)
+
+    def _attempt(self, request, endpoint, **kwargs):
+        """ Send a request once, timing it apart from the limiter and backoff waits """
+        if not self.metrics:
+            return super().send(request, **kwargs)
+        with self.metrics.track(endpoint):
+            response = super().send(request, **kwargs)
+        self.metrics.record_bytes(len(response.content or b''), endpoint)
+        if response.status_code >= 400:
+            self.metrics.record_error(endpoint)
+        return response
+
+    def stats(self) -> dict:
+        """ Statistics of the connection pools
+
+        Returns:
+            requests: Requests sent through the transport
+            connections: Connections established since the transport was created
+            reuse_ratio: Share of requests served by an already established connection
+            open_connections: Connections currently idle in the pools or in use
+        """
+        connections = 0
+        open_connections = 0
+        pools = self.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            connections += pool.num_connections
+            queued = list(pool.pool.queue) if pool.pool else []
+            idle = sum(1 for conn in queued if conn is not None and conn.sock is not None)
+            in_use = pool.pool.maxsize - len(queued) if pool.pool else 0
+            open_connections += idle + in_use
+
+        with self._lock:
+            requests = self._requests
+
+        reuse_ratio = 1 - connections / requests if requests else 0.0
+        return {
+            'requests': requests,
+            'connections': connections,
+            'reuse_ratio': round(max(reuse_ratio, 0.0), 4),
+            'open_connections': open_connections,
+        }
+
+    def log_stats(self):
+        """ Log the statistics of the connection pools """
+        logging.info("Connection pool: %s", self.stats())
@@ -1,8 +1,9 @@
 """ Sonar Utilities"""
+import json
 from enum import Enum
 
 
-from lib.response import Component, Validate, Branch
+from lib.response import Component, Validate, Branch, SonarObject
 SONARCLOUD_URL = 'https://sonarcloud.io'
 
 
@@ -21,3 +22,17 @@ def from_json(json_obj):
     if 'key' in json_obj and 'name' in json_obj and 'qualifier' in json_obj:
         return Component(json_obj)
     return json_obj
+
+
+def decode(payload, schema: type[SonarObject]):
+    """ Build the objects declared by an endpoint straight from the client response
+
+    Args:
+        payload: Response as returned by the client, either decoded or as a JSON document
+        schema: SonarObject subclass describing every item in the payload
+    """
+    if isinstance(payload, (str, bytes)):
+        payload = json.loads(payload)
+    if isinstance(payload, list):
+        return [schema(item) for item in payload]
+    return schema(payload)
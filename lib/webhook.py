@@ -0,0 +1,300 @@
+""" Event-Driven Audits of the Projects Named by Sonar Webhooks """
+import hashlib
+import hmac
+import heapq
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+from lib.audit import AuditResult, audit_project
+from lib.handler import SonarHandler
+from lib.remediation import RemediationPlan, execute, summarize
+from lib.response import Component
+from lib.rules import RuleEngine
+
+DEFAULT_DEBOUNCE = 5.0
+DEFAULT_WEBHOOK_PORT = 8080
+WEBHOOK_PATH = '/webhook'
+HEALTH_PATH = '/health'
+SIGNATURE_HEADER = 'X-Sonar-Webhook-HMAC-SHA256'
+MAX_PAYLOAD = 1024 * 1024
+
+
+class DebouncedQueue:
+    """ Runs a task per key once the key stopped being submitted for a while
+
+    Every submission of a pending key pushes its run back, so a burst collapses into
+    a single run. A key is never run twice at once: submitted while running, it runs
+    again once the current run ends and the delay elapsed.
+    """
+    def __init__(self, task: Callable[[str], None], delay: float = DEFAULT_DEBOUNCE,
+                 workers: int = 1):
+        """ Constructor
+
+        Args:
+            task: Called with each key
+            delay: Seconds without submissions before a key runs
+            workers: Number of keys run concurrently
+        """
+        self.task = task
+        self.delay = delay
+        self.stats = Counter()
+        self._due = {}
+        self._heap = []
+        self._running = set()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._threads = [threading.Thread(target=self._work, name=f'webhook-{i}', daemon=True)
+                         for i in range(max(1, workers))]
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._due)
+
+    def start(self):
+        """ Start the workers """
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """ Let the workers finish the keys being run, dropping the pending ones """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def submit(self, key: str):
+        """ Schedule a key, pushing back its pending run if any """
+        with self._condition:
+            self.stats['submitted'] += 1
+            if key in self._due:
+                self.stats['collapsed'] += 1
+            due = time.monotonic() + self.delay
+            self._due[key] = due
+            heapq.heappush(self._heap, (due, key))
+            self._condition.notify()
+
+    def _next(self) -> Optional[str]:
+        """ Wait for a key to be due, None once stopped """
+        with self._condition:
+            while not self._stopped:
+                now = time.monotonic()
+                while self._heap:
+                    due, key = self._heap[0]
+                    # Entries pushed back by a later submission are stale
+                    if self._due.get(key) != due:
+                        heapq.heappop(self._heap)
+                    elif key in self._running:
+                        # Retried by the worker running it
+                        heapq.heappop(self._heap)
+                    else:
+                        break
+                if self._heap and self._heap[0][0] <= now:
+                    _, key = heapq.heappop(self._heap)
+                    del self._due[key]
+                    self._running.add(key)
+                    return key
+                self._condition.wait(self._heap[0][0] - now if self._heap else None)
+            return None
+
+    def _done(self, key: str):
+        """ Release a key, queuing it again if it was submitted meanwhile """
+        with self._condition:
+            self._running.discard(key)
+            if key in self._due:
+                heapq.heappush(self._heap, (self._due[key], key))
+            self._condition.notify()
+
+    def _work(self):
+        """ Worker loop """
+        while True:
+            key = self._next()
+            if key is None:
+                return
+            try:
+                self.task(key)
+                self.stats['processed'] += 1
+            except Exception as error:  # pylint: disable=broad-except
+                self.stats['failed'] += 1
+                logging.error("Unable to process %s: %s", key, error)
+            finally:
+                self._done(key)
+
+
+def remediate_project(project: Component, handler: SonarHandler, engine: RuleEngine,
+                      dry_run: bool = False) -> AuditResult:
+    """ Audit a single project and apply its remediation
+
+    Args:
+        project: Sonar Component named by the webhook
+        handler: Sonar Connector
+        engine: Rules to evaluate
+        dry_run: Only log the remediation
+    """
+    cache = getattr(handler, 'cache', None)
+    if cache:
+        # The analysis just changed the project, anything cached about it is stale
+        cache.invalidate(project.key)
+
+    audit = audit_project(project, handler, engine=engine)
+    if audit.compliant:
+        logging.info("Project %s is compliant", project.key)
+    if audit.failed or audit.compliant:
+        return audit
+
+    plan = RemediationPlan()
+    plan.add(audit.actions)
+    logging.info(plan.describe())
+    if not dry_run:
+        logging.info("Remediation of %s: %s", project.key, summarize(execute(plan, handler)))
+    return audit
+
+
+def verify_signature(body: bytes, signature: Optional[str], secret: Optional[str]) -> bool:
+    """ Check the HMAC Sonar computes over the payload with the webhook secret """
+    if not secret:
+        return True
+    if not signature:
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+class WebhookServer:
+    """ Local HTTP endpoint receiving the 'analysis completed' webhooks of Sonar
+
+    A webhook only queues the project it names, the audit and the remediation run
+    later on the debounced queue, over a single warm SonarHandler.
+    """
+    def __init__(self, handler: SonarHandler, engine: RuleEngine, host: str = '127.0.0.1',
+                 port: int = DEFAULT_WEBHOOK_PORT, secret: Optional[str] = None,
+                 debounce: float = DEFAULT_DEBOUNCE, workers: int = 1, dry_run: bool = False):
+        """ Constructor
+
+        Args:
+            handler: Authenticated Sonar Connector, shared by every audit
+            engine: Rules to evaluate
+            host: Interface to listen on
+            port: Port to listen on, 0 for any free port
+            secret: Webhook secret, signatures are required when set
+            debounce: Seconds without webhooks for a project before it is audited
+            workers: Number of projects audited concurrently
+            dry_run: Only log the remediation
+        """
+        self.handler = handler
+        self.engine = engine
+        self.secret = secret
+        self.dry_run = dry_run
+        self.queue = DebouncedQueue(self._audit, debounce, workers)
+        self.server = ThreadingHTTPServer((host, port), self._request_handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        """ Port the server listens on """
+        return self.server.server_address[1]
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        """ Serve in a background thread """
+        self.queue.start()
+        self._thread = threading.Thread(target=self.server.serve_forever, name='webhook-server',
+                                        daemon=True)
+        self._thread.start()
+        logging.info("Listening for webhooks on port %s", self.port)
+
+    def serve_forever(self):
+        """ Serve in the current thread until shutdown """
+        self.queue.start()
+        logging.info("Listening for webhooks on port %s", self.port)
+        self.server.serve_forever()
+
+    def stop(self):
+        """ Stop accepting webhooks and let the running audits finish """
+        if self._thread:
+            self.server.shutdown()
+            self._thread = None
+        self.server.server_close()
+        self.queue.stop()
+
+    def receive(self, payload: dict) -> bool:
+        """ Queue the project named by a webhook payload
+
+        Returns:
+            Whether the payload named a project with a successful analysis
+        """
+        key = (payload.get('project') or {}).get('key')
+        if not key or payload.get('status', 'SUCCESS') != 'SUCCESS':
+            return False
+        self.queue.submit(key)
+        return True
+
+    def _audit(self, key: str):
+        """ Task of the queue, auditing the project as the server currently knows it """
+        project = next((project for project in self.handler.iter_projects(keys=[key])
+                        if project.key == key), None)
+        if project is None:
+            logging.warning("Project %s no longer exists, webhook dropped", key)
+            return
+        remediate_project(project, self.handler, self.engine, self.dry_run)
+
+    def health(self) -> dict:
+        """ Counters of the webhooks and audits """
+        return dict(self.queue.stats, pending=len(self.queue))
+
+    def _request_handler(self):
+        """ Request handler class bound to this server """
+        webhooks = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """ Webhook and health endpoints """
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                logging.debug(format, *args)
+
+            def _reply(self, status: int, payload: Optional[dict] = None):
+                body = json.dumps(payload).encode() if payload is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                if self.path != HEALTH_PATH:
+                    self._reply(404)
+                    return
+                self._reply(200, webhooks.health())
+
+            def do_POST(self):  # pylint: disable=invalid-name
+                length = int(self.headers.get('Content-Length') or 0)
+                if self.path != WEBHOOK_PATH or length > MAX_PAYLOAD:
+                    self._reply(404 if self.path != WEBHOOK_PATH else 413)
+                    return
+                body = self.rfile.read(length)
+                if not verify_signature(body, self.headers.get(SIGNATURE_HEADER), webhooks.secret):
+                    logging.warning("Rejecting webhook with an invalid signature")
+                    self._reply(401)
+                    return
+                try:
+                    payload = json.loads(body)
+                except ValueError:
+                    self._reply(400)
+                    return
+                accepted = isinstance(payload, dict) and webhooks.receive(payload)
+                self._reply(202 if accepted else 200, {'queued': accepted})
+
+        return Handler
@@ -2,42 +2,107 @@
 Sonar CLI helper
 """
 import argparse
+import json
 import logging
 from logging.handlers import RotatingFileHandler
 import sys
 from argparse import ArgumentError, Namespace
-
-from lib.handler import SonarHandler, SonarException
-from lib.rules import ProjectBranchCompliant
+from typing import Optional
+
+from lib.audit import DEFAULT_WORKERS
+from lib.cache import DEFAULT_CACHE_SIZE
+from lib.checkpoint import DEFAULT_CHECKPOINT_INTERVAL
+from lib.credentials import DEFAULT_CREDENTIALS_TTL
+from lib.incremental import DEFAULT_FULL_SCAN_AGE
+from lib.logs import LOG_FORMATS, JsonFormatter, install_logging
+from lib.metrics import METRICS_FORMATS
+from lib.profiling import DEFAULT_PROFILE_DIR
+from lib.provisioning import provision_organization
+from lib.reconcile import reconcile_organization
+from lib.ratelimit import DEFAULT_RATE, DEFAULT_RETRIES
+from lib.report import REPORT_FORMATS, publish_outputs
+from lib.rules import RULES, MainBranchRule
+from lib.runner import audit_organization
+from lib.scheduler import PRIORITIES
+from lib.shard import load_targets, run_targets
+from lib.transport import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
 from lib.utils import SonarPlatform
 
 SONAR_PLATFORMS = list(p.value for p in SonarPlatform)
 
 
-def setup_logger():
-    """ Install logger for main and libraries """
+def setup_logger(log_format: str = 'text', async_logging: bool = False,
+                 sample: int = 1, rate: Optional[float] = None):
+    """ Install logger for main and libraries
+
+    Args:
+        log_format: Either 'text' or 'json' lines
+        async_logging: Write records from a background thread instead of the caller
+        sample: Keep one out of this many per-call records of each endpoint
+        rate: Maximum per-call records per second of each endpoint
+    """
     logger = logging.getLogger()
     logger.setLevel(logging.INFO)
 
+    if log_format == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - [%(levelname)s] - %(message)s')
+
     # Add log file
-    logger.addHandler(RotatingFileHandler('main.log', maxBytes=2000000, backupCount=10))
+    file_handler = RotatingFileHandler('main.log', maxBytes=2000000, backupCount=10)
+    if log_format == 'json':
+        file_handler.setFormatter(formatter)
 
     # Add stdout
     stream_handler = logging.StreamHandler(sys.stdout)
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - [%(levelname)s] - %(message)s')
     stream_handler.setFormatter(formatter)
-    logger.addHandler(stream_handler)
+
+    return install_logging(logger, [file_handler, stream_handler], sample, rate, async_logging)
 
 
 def validate(args: Namespace):
     """ Inputs Rules """
     # Whenever sonarcloud is enabled an organization is mandatory
-    if args.platform == SonarPlatform.SONARCLOUD.value and not args.organization:
+    if args.platform == SonarPlatform.SONARCLOUD.value and \
+            not (args.organization or getattr(args, 'targets', None)):
         msg = "Usage of SonarCloud demands an organization to be provided"
         logging.error(msg)
         raise ArgumentError(None, msg)
 
+    if args.workers < 1:
+        msg = "The number of workers must be a positive integer"
+        logging.error(msg)
+        raise ArgumentError(None, msg)
+
+    if getattr(args, 'resume', False) and not args.checkpoint_file:
+        msg = "Resuming a run demands a checkpoint file to be provided"
+        logging.error(msg)
+        raise ArgumentError(None, msg)
+
+    if (getattr(args, 'profile_cpu', False) or getattr(args, 'profile_memory', False)) and \
+            not getattr(args, 'profile', False):
+        msg = "Profiling the CPU or the memory demands --profile"
+        logging.error(msg)
+        raise ArgumentError(None, msg)
+
+    if getattr(args, 'record', None) and getattr(args, 'replay', None):
+        msg = "A cassette is either recorded or replayed"
+        logging.error(msg)
+        raise ArgumentError(None, msg)
+
+    if getattr(args, 'provision', None) and getattr(args, 'targets', None):
+        msg = "Provisioning demands a single organization or instance, not targets"
+        logging.error(msg)
+        raise ArgumentError(None, msg)
+
+    if getattr(args, 'reconcile', None) and \
+            (getattr(args, 'targets', None) or getattr(args, 'provision', None)):
+        msg = "Reconciling demands a single organization or instance, without provisioning"
+        logging.error(msg)
+        raise ArgumentError(None, msg)
+
 
 def main():
     """ Entry Point """
@@ -45,40 +110,133 @@ def main():
     parser.add_argument('--platform', dest='platform', action='store', default='sonarcloud',
                         choices=SONAR_PLATFORMS)
     parser.add_argument('--organization', dest='organization', action='store', nargs=1)
+    parser.add_argument('--workers', dest='workers', action='store', type=int,
+                        default=DEFAULT_WORKERS, help='Number of projects audited concurrently')
+    parser.add_argument('--rules', dest='rules', action='store', nargs='+',
+                        default=[MainBranchRule.name], choices=sorted(RULES),
+                        help='Compliance rules evaluated over every project')
+    parser.add_argument('--dry-run', dest='dry_run', action='store_true',
+                        help='Print the remediation plan without applying it')
+    parser.add_argument('--connect-timeout', dest='connect_timeout', action='store', type=float,
+                        default=DEFAULT_CONNECT_TIMEOUT, help='Seconds to establish a connection')
+    parser.add_argument('--read-timeout', dest='read_timeout', action='store', type=float,
+                        default=DEFAULT_READ_TIMEOUT, help='Seconds to wait for a response')
+    parser.add_argument('--rate-limit', dest='rate_limit', action='store', type=float,
+                        default=DEFAULT_RATE, help='Maximum requests per second, 0 to disable')
+    parser.add_argument('--retries', dest='retries', action='store', type=int,
+                        default=DEFAULT_RETRIES, help='Retries of throttled or failed requests')
+    parser.add_argument('--prefetch-pages', dest='prefetch_pages', action='store', type=int,
+                        default=0, help='Pages of the project search fetched concurrently')
+    parser.add_argument('--cache', dest='cache', action='store_true',
+                        help='Cache the responses of read endpoints')
+    parser.add_argument('--cache-dir', dest='cache_dir', action='store',
+                        help='Folder keeping cached responses across runs')
+    parser.add_argument('--cache-size', dest='cache_size', action='store', type=int,
+                        default=DEFAULT_CACHE_SIZE, help='Responses kept in memory')
+    parser.add_argument('--metrics-file', dest='metrics_file', action='store',
+                        help='File where the endpoint metrics are written at the end of the run')
+    parser.add_argument('--metrics-format', dest='metrics_format', action='store', default='json',
+                        choices=METRICS_FORMATS)
+    parser.add_argument('--fast-start', dest='fast_start', action='store_true',
+                        help='Build the client lazily, reuse recent credential checks and skip logout')
+    parser.add_argument('--logout', dest='logout', action=argparse.BooleanOptionalAction,
+                        help='Logout on exit, the default unless --fast-start is set')
+    parser.add_argument('--credentials-cache', dest='credentials_cache', action='store',
+                        help='File keeping credential checks across runs in fast start')
+    parser.add_argument('--credentials-ttl', dest='credentials_ttl', action='store', type=float,
+                        default=DEFAULT_CREDENTIALS_TTL, help='Seconds a credential check is trusted')
+    parser.add_argument('--state-file', dest='state_file', action='store',
+                        help='File keeping the audit state, enabling incremental audits')
+    parser.add_argument('--full-scan', dest='full_scan', action='store_true',
+                        help='Audit every project even when an audit state is available')
+    parser.add_argument('--full-scan-after', dest='full_scan_after', action='store', type=float,
+                        default=DEFAULT_FULL_SCAN_AGE, help='Seconds after which a full scan is due')
+    parser.add_argument('--targets', dest='targets', action='store',
+                        help='JSON file listing the platforms, organizations and hosts to audit')
+    parser.add_argument('--processes', dest='processes', action='store', type=int,
+                        help='Processes auditing targets in parallel, defaults to the CPUs')
+    parser.add_argument('--total-workers', dest='total_workers', action='store', type=int,
+                        help='Concurrent audits across every process')
+    parser.add_argument('--summary-file', dest='summary_file', action='store',
+                        help='File where the JSON report of the run is written')
+    parser.add_argument('--time-budget', dest='time_budget', action='store', type=float,
+                        help='Seconds the run may last, work that cannot end in time is skipped')
+    parser.add_argument('--priority', dest='priority', action='store', default='non_compliant',
+                        choices=PRIORITIES, help='Projects audited first under a time budget')
+    parser.add_argument('--checkpoint-file', dest='checkpoint_file', action='store',
+                        help='File where the progress of the run is stored periodically')
+    parser.add_argument('--checkpoint-interval', dest='checkpoint_interval', action='store',
+                        type=float, default=DEFAULT_CHECKPOINT_INTERVAL,
+                        help='Seconds between two checkpoints of the audits')
+    parser.add_argument('--resume', dest='resume', action='store_true',
+                        help='Continue from the checkpoint of an unfinished run')
+    parser.add_argument('--report-file', dest='report_file', action='store',
+                        help='File where one record per project is streamed')
+    parser.add_argument('--inventory-file', dest='inventory_file', action='store',
+                        help='File where the audited projects and branches are written')
+    parser.add_argument('--report-format', dest='report_format', action='store', default='jsonl',
+                        choices=REPORT_FORMATS)
+    parser.add_argument('--log-format', dest='log_format', action='store', default='text',
+                        choices=LOG_FORMATS)
+    parser.add_argument('--async-logging', dest='async_logging', action='store_true',
+                        help='Write logs from a background thread')
+    parser.add_argument('--log-sample', dest='log_sample', action='store', type=int, default=1,
+                        help='Log one out of this many calls of each endpoint')
+    parser.add_argument('--log-rate', dest='log_rate', action='store', type=float,
+                        help='Maximum logged calls per second of each endpoint')
+    parser.add_argument('--profile', dest='profile', action='store_true',
+                        help='Time every phase of the run and write a summary')
+    parser.add_argument('--profile-dir', dest='profile_dir', action='store',
+                        default=DEFAULT_PROFILE_DIR, help='Folder of the profile summary and raw files')
+    parser.add_argument('--profile-cpu', dest='profile_cpu', action='store_true',
+                        help='Capture a cProfile of every phase, requires --profile')
+    parser.add_argument('--profile-memory', dest='profile_memory', action='store_true',
+                        help='Capture a tracemalloc snapshot after every phase, requires --profile')
+    parser.add_argument('--record', dest='record', action='store',
+                        help='Cassette file where every read response is recorded')
+    parser.add_argument('--replay', dest='replay', action='store',
+                        help='Cassette file answering every call, without network')
+    parser.add_argument('--provision', dest='provision', action='store',
+                        help='JSON manifest of the projects to create instead of auditing')
+    parser.add_argument('--reconcile', dest='reconcile', action='store',
+                        help='JSON desired settings of the projects to apply instead of auditing')
+    parser.add_argument('--reconcile-state', dest='reconcile_state', action='store',
+                        help='File where the fingerprint of the applied settings is stored')
     args = parser.parse_args()
 
-    # Start Loggers
-    setup_logger()
-
-    # Validate inputs
-    validate(args)
-
-    with SonarHandler(args) as sonar:
-        # Search for project
-        if not sonar.authenticated:
-            logging.warning('Authentication is not set')
-            return
-
-        try:
-            projects = sonar.list_projects()
-        except SonarException:
-            logging.error("Unable to calculate Projects in %s", sonar.organization)
-
-        if not projects:
-            logging.error("No projects where found for %s organization", sonar.organization)
-            return
-
-        # Calculate non-compliant projects
-        branch_audit_projects = [ProjectBranchCompliant(project, sonar) for project in projects]
-        for deviated in filter(lambda p: not p.is_branch_compliant, branch_audit_projects):
-            project_key = deviated.project.key
-            logging.info('Project %s is not compliant, modifying settings', project_key)
-            try:
-                deviated.set_main_branch()
-            except SonarException:
-                logging.error('Unable to set main branch for %s', project_key)
-    # Happy ending
-    logging.info("Finish")
+    # Start Loggers, the listener of async logging is flushed once the run is over
+    listener = setup_logger(args.log_format, args.async_logging, args.log_sample, args.log_rate)
+    try:
+        # Validate inputs
+        validate(args)
+
+        if args.provision:
+            # Onboarding of new projects
+            report = provision_organization(args)
+        elif args.reconcile:
+            # Settings of existing projects
+            report = reconcile_organization(args)
+        elif args.targets:
+            # Several organizations and instances sharded across processes
+            report = run_targets(load_targets(args.targets), args, args.processes,
+                                 args.total_workers)
+            logging.info("Audit totals: %s", report['totals'])
+            for target in filter(lambda t: t['error'], report['targets']):
+                logging.error("Target %s %s failed: %s", target['platform'],
+                              target['organization'] or target['host'], target['error'])
+            publish_outputs(report['totals'])
+        else:
+            report = audit_organization(args)
+            publish_outputs(report)
+
+        if args.summary_file:
+            with open(args.summary_file, 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=2)
+        # Happy ending
+        logging.info("Finish")
+    finally:
+        if listener:
+            listener.stop()
 
 
 if __name__ == "__main__":